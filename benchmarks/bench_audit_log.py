@@ -0,0 +1,54 @@
+"""
+Audit Log Benchmark
+Author: Gabriel Demetrios Lafis
+
+Writes N audit records (default 200k) from 1000 concurrent writers, each
+waiting for its record to be fsynced, then measures a per-user query
+over the whole log and a narrow time-range query.
+
+Usage:
+    python -m benchmarks.bench_audit_log [records]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+
+from src.utils.audit import AuditLog
+
+WRITERS = 1000
+USERS = 10_000
+
+
+async def run(count: int):
+    log = AuditLog(tempfile.mkdtemp(), segment_bytes=16 << 20)
+
+    async def writer(offset: int):
+        for i in range(offset, count, WRITERS):
+            await log.write("login", user_id=i % USERS, actor=f"user{i % USERS}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(WRITERS)))
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_user = log.query(user_id=42, limit=count)
+    user_ms = (time.perf_counter() - start) * 1000
+
+    middle = log.query(limit=count // 2)[-1]["ts"]
+    start = time.perf_counter()
+    window = log.query(since=middle, until=middle + 0.001, limit=count)
+    range_ms = (time.perf_counter() - start) * 1000
+    log.close()
+
+    print(f"records:            {count:>12,}")
+    print(f"segments:           {len(log.segments):>12,}")
+    print(f"durable writes/s:   {count / elapsed:>12,.0f}")
+    print(f"records per fsync:  {count / log.fsyncs:>12.1f}")
+    print(f"query by user:      {user_ms:>12.2f} ms ({len(by_user)} records)")
+    print(f"query 1 ms window:  {range_ms:>12.2f} ms ({len(window)} records)")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
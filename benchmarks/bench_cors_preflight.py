@@ -0,0 +1,88 @@
+"""
+CORS Preflight Benchmark
+Author: Gabriel Demetrios Lafis
+
+Sends N CORS preflights (default 5k) straight into the gateway's ASGI
+app, where the outermost CORS layer answers them, and N more with that
+layer skipped, so they cross tracing, IP filtering, the concurrency
+limiter, the breaker, the rate limiter, logging and routing as they
+did when CORS was the innermost middleware. Reports the time per
+preflight for each.
+
+Usage:
+    python -m benchmarks.bench_cors_preflight [requests]
+"""
+
+import asyncio
+import sys
+import time
+
+from src.main import app
+from src.middleware.cors import CORSMiddleware
+
+PATH = "/api/v1/trading/orders"
+HEADERS = [
+    (b"host", b"bench"),
+    (b"origin", b"http://localhost:3000"),
+    (b"access-control-request-method", b"POST"),
+    (b"access-control-request-headers", b"authorization, content-type"),
+]
+
+
+async def _preflight(asgi, client: int) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "OPTIONS",
+        "scheme": "http",
+        "path": PATH,
+        "raw_path": PATH.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": HEADERS,
+        # One address per request keeps the rate limiter out of the way
+        "client": (f"10.{client >> 16 & 255}.{client >> 8 & 255}.{client & 255}", 1),
+        "server": ("bench", 80),
+        "app": app,
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await asgi(scope, receive, send)
+    return status[0]
+
+
+async def _measure(asgi, count: int):
+    start = time.perf_counter()
+    statuses = set()
+    for i in range(count):
+        statuses.add(await _preflight(asgi, i))
+    return (time.perf_counter() - start) / count * 1e6, statuses
+
+
+async def run(count: int):
+    app.middleware_stack = app.build_middleware_stack()
+    cors = app.middleware_stack
+    while not isinstance(cors, CORSMiddleware):
+        cors = cors.app
+    # Warm both paths (route compilation, policy compilation)
+    await _measure(cors, 100)
+    await _measure(cors.app, 100)
+
+    short, short_status = await _measure(cors, count)
+    full, full_status = await _measure(cors.app, count)
+    print(f"preflights:               {count:>10,}")
+    print(f"answered by CORS layer:   {short:>10.1f} us  (status {short_status})")
+    print(f"through the full stack:   {full:>10.1f} us  (status {full_status})")
+    print(f"speedup:                  {full / short:>10.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000))
@@ -0,0 +1,70 @@
+"""
+Token Introspection Benchmark
+Author: Gabriel Demetrios Lafis
+
+Measures /api/v1/auth/introspect throughput (tokens per second) at
+batch sizes of 1, 100 and 1000, with a cold verified-token cache
+(signature checked) and a warm one (cache hit + revocation check).
+The auth router is mounted on its own so gateway rate limits do not
+interfere with the measurement.
+
+Usage:
+    python -m benchmarks.bench_introspect
+"""
+
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.auth import jwt_handler
+from src.auth.jwt_handler import JWTHandler
+from src.auth.service_auth import service_credentials
+from src.routes import auth_routes
+
+BATCH_SIZES = (1, 100, 1_000)
+TOKENS_PER_RUN = 5_000
+AUTH = ("bench-service", "bench-secret")
+
+
+def _tokens(count: int, offset: int):
+    return [
+        JWTHandler.create_access_token(
+            {
+                "user_id": offset + i,
+                "username": "bench",
+                "email": "bench@example.com",
+                "is_admin": False,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def _run(client: TestClient, tokens, size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(tokens), size):
+        response = client.post("/introspect", json={"tokens": tokens[i : i + size]}, auth=AUTH)
+        assert response.status_code == 200
+    return len(tokens) / (time.perf_counter() - start)
+
+
+def run():
+    service_credentials.add(*AUTH)
+    app = FastAPI()
+    app.include_router(auth_routes.router)
+    client = TestClient(app)
+
+    print(f"{'batch':>6} {'cold tokens/s':>14} {'warm tokens/s':>14}")
+    for n, size in enumerate(BATCH_SIZES):
+        # Fewer round trips for batch size 1 keep the run short.
+        count = min(TOKENS_PER_RUN, 500 * size)
+        tokens = _tokens(count, n * TOKENS_PER_RUN)
+        jwt_handler._verified_tokens.clear()
+        cold = _run(client, tokens, size)
+        warm = _run(client, tokens, size)
+        print(f"{size:>6} {cold:>14,.0f} {warm:>14,.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,67 @@
+"""
+JWT Signing Benchmark
+Author: Gabriel Demetrios Lafis
+
+Compares sign and verify cost for HS256, RS256 and EdDSA using the key
+ring's cached key objects, plus RS256 with the PEM re-parsed on every
+call to show what caching the key objects saves.
+
+Usage:
+    python -m benchmarks.bench_jwt_signing
+"""
+
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+
+from src.auth.keys import SigningKey
+
+PAYLOAD = {
+    "user_id": 1,
+    "username": "bench",
+    "email": "bench@example.com",
+    "is_admin": False,
+    "type": "access",
+}
+ITERATIONS = 2_000
+
+
+def _rate(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return iterations / (time.perf_counter() - start)
+
+
+def run():
+    print(f"{'algorithm':<22} {'sign/s':>10} {'verify/s':>10}")
+    for algorithm in ("HS256", "RS256", "EdDSA"):
+        key = SigningKey.generate(algorithm)
+        token = jwt.encode(PAYLOAD, key.signing, algorithm=key.algorithm)
+        sign = _rate(
+            lambda: jwt.encode(PAYLOAD, key.signing, algorithm=key.algorithm),
+            ITERATIONS,
+        )
+        verify = _rate(
+            lambda: jwt.decode(token, key.verifying, algorithms=[key.algorithm]),
+            ITERATIONS,
+        )
+        print(f"{algorithm:<22} {sign:>10,.0f} {verify:>10,.0f}")
+
+    # Baseline: key material handed to PyJWT as PEM on every call (the
+    # private key is re-parsed and validated each time, so sign is slow)
+    key = SigningKey.generate("RS256")
+    private_pem = key.to_pem()
+    public_pem = key.verifying.public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    token = jwt.encode(PAYLOAD, key.signing, algorithm="RS256")
+    sign = _rate(lambda: jwt.encode(PAYLOAD, private_pem, algorithm="RS256"), ITERATIONS // 40)
+    verify = _rate(lambda: jwt.decode(token, public_pem, algorithms=["RS256"]), ITERATIONS)
+    print(f"{'RS256 (PEM per call)':<22} {sign:>10,.0f} {verify:>10,.0f}")
+
+
+if __name__ == "__main__":
+    run()
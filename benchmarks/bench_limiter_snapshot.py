@@ -0,0 +1,61 @@
+"""
+Rate-Limiter Snapshot Benchmark
+Author: Gabriel Demetrios Lafis
+
+Fills a local rate-limit backend with N buckets (default 1M), then
+measures writing the snapshot, opening it in a fresh backend (the
+startup cost of a warm restore) and seeding buckets from it on first
+use.
+
+Usage:
+    python -m benchmarks.bench_limiter_snapshot [buckets]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from src.middleware.rate_limit_backend import LocalBackend
+from src.middleware.rate_limit_policy import Limit
+from src.middleware.rate_limit_snapshot import LimiterSnapshots
+
+LIMIT = Limit(60, 60)
+LOOKUPS = 100_000
+
+
+async def run(count: int):
+    path = os.path.join(tempfile.mkdtemp(), "limits.snap")
+    backend = LocalBackend()
+    snapshots = LimiterSnapshots(path)
+    snapshots.attach(backend)
+    for i in range(count):
+        backend._bucket(f"user:{i}:0", LIMIT)
+
+    start = time.perf_counter()
+    await snapshots.save()
+    save = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / 1e6
+
+    restarted = LocalBackend()
+    start = time.perf_counter()
+    LimiterSnapshots(path).attach(restarted)
+    load = time.perf_counter() - start
+
+    lookups = min(LOOKUPS, count)
+    start = time.perf_counter()
+    for i in range(lookups):
+        await restarted.charge([(f"user:{i}:0", LIMIT)], 1)
+    seeded = lookups / (time.perf_counter() - start)
+
+    print(f"buckets:            {count:>12,}")
+    print(f"snapshot size:      {size_mb:>12.1f} MB")
+    print(f"save:               {save * 1000:>12.1f} ms")
+    print(f"open (restore):     {load * 1000:>12.2f} ms")
+    print(f"first-use seeding:  {seeded:>12,.0f} buckets/s")
+    print(f"restored:           {restarted.restored:>12,}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,62 @@
+"""
+Stream Fan-out Benchmark
+Author: Gabriel Demetrios Lafis
+
+Measures publish-to-delivery latency of StreamHub market-data fan-out
+with many concurrently waiting subscribers.
+
+Usage:
+    python -m benchmarks.bench_stream_fanout [subscribers] [ticks]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from src.trading.streaming import CHANNEL_MARKET, StreamHub
+
+
+async def _consume(sub, latencies: list, ticks: int):
+    received = 0
+    while received < ticks:
+        batch = await sub.next_batch(timeout=5.0)
+        now = time.perf_counter()
+        for message in batch:
+            latencies.append(now - message["data"]["sent"])
+            received += 1
+        if not batch:
+            return
+
+
+async def run(subscribers: int, ticks: int):
+    hub = StreamHub(max_subscribers=subscribers)
+    subs = [hub.subscribe(i, frozenset({CHANNEL_MARKET})) for i in range(subscribers)]
+
+    latencies: list = []
+    consumers = [asyncio.create_task(_consume(s, latencies, ticks)) for s in subs]
+    await asyncio.sleep(0)
+
+    publish_times = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        hub.publish_market("AAPL", {"price": 100.0, "sent": start})
+        publish_times.append(time.perf_counter() - start)
+        # Let every consumer drain before the next tick, so ticks are
+        # measured individually rather than conflated.
+        await asyncio.sleep(0.05)
+
+    await asyncio.gather(*consumers)
+
+    latencies.sort()
+    print(f"subscribers={subscribers} ticks={ticks} deliveries={len(latencies)}")
+    print(f"  publish call      mean={statistics.mean(publish_times) * 1e3:8.3f} ms")
+    print(f"  delivery latency  p50={latencies[len(latencies) // 2] * 1e3:8.3f} ms")
+    print(f"                    p99={latencies[int(len(latencies) * 0.99)] * 1e3:8.3f} ms")
+    print(f"                    max={latencies[-1] * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    n_subs = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(run(n_subs, n_ticks))
@@ -0,0 +1,125 @@
+"""
+Multi-Worker Benchmark
+Author: Gabriel Demetrios Lafis
+
+Starts the gateway through the launcher with 1 worker and then with N
+(default: CPU count), and drives GET /health with keep-alive load from
+separate client processes. Reports requests per second and latency
+percentiles for each. The rate limit is raised so every request
+reaches the handler.
+
+Usage:
+    python -m benchmarks.bench_workers [workers] [seconds]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+CLIENT_PROCESSES = 4
+CONNECTIONS_PER_CLIENT = 16
+REQUEST = b"GET /health HTTP/1.1\r\nHost: bench\r\n\r\n"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _connection(port: int, until: float, latencies: list, errors: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        writer.write(REQUEST)
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        if not head.startswith(b"HTTP/1.1 200"):
+            errors.append(head.split(b"\r\n")[0])
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+def _client(port: int, seconds: float, queue):
+    latencies, errors = [], []
+
+    async def run():
+        until = time.perf_counter() + seconds
+        await asyncio.gather(
+            *(_connection(port, until, latencies, errors) for _ in range(CONNECTIONS_PER_CLIENT))
+        )
+
+    asyncio.run(run())
+    queue.put((latencies, len(errors)))
+
+
+def _wait_ready(port: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Gateway did not start")
+
+
+def measure(workers: int, seconds: float):
+    port = _free_port()
+    env = dict(os.environ, RATE_LIMIT_REQUESTS_PER_MINUTE="100000000")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.launcher", "--workers", str(workers)]
+        + ["--host", "127.0.0.1", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(port)
+        # Let every worker come up before measuring
+        time.sleep(2.0 * workers)
+        queue = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=_client, args=(port, seconds, queue))
+            for _ in range(CLIENT_PROCESSES)
+        ]
+        for client in clients:
+            client.start()
+        results = [queue.get() for _ in clients]
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(count for _, count in results)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    rps = len(latencies) / seconds
+    print(
+        f"{workers:>7} {rps:>12,.0f} {p50:>10.2f} {p99:>10.2f} {errors:>8,}",
+        flush=True,
+    )
+
+
+def run(workers: int, seconds: float):
+    print(f"CPUs: {os.cpu_count()}, clients: {CLIENT_PROCESSES}x{CONNECTIONS_PER_CLIENT}")
+    print(f"{'workers':>7} {'req/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'non-200':>8}")
+    for count in sorted({1, workers}):
+        measure(count, seconds)
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 10.0,
+    )
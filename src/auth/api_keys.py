@@ -0,0 +1,246 @@
+"""
+API Keys
+Author: Gabriel Demetrios Lafis
+
+Long-lived credentials for machine clients. Only a keyed HMAC-SHA256
+digest of each key is stored, and the digest is the index of the key
+table, so resolving a key is one HMAC plus one dict lookup, with no
+bcrypt and no JWT on the request path. No plaintext key is kept, not
+even in a cache, and revocation applies to the very next call.
+
+Each key carries scopes (checked by `require_scope`) and a rate-limit
+tier that sets its own per-minute budget in the rate limiter.
+
+When API_KEYS_FILE is set, created and revoked keys are appended to
+that file (one JSON record per line, digests only) and every worker
+tails it, so keys survive restarts and work on every worker. A key
+unknown to a worker triggers an immediate read of new records; other
+revocations are picked up within `sync_interval` seconds. The file
+needs the same API_KEY_HMAC_SECRET in every process that reads it.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+API_KEY_HEADER = "X-API-Key"
+API_KEY_PREFIX = "sfg_"
+
+SCOPES = frozenset({"trading:read", "trading:write", "users:read", "auth:read"})
+# Requests per minute per tier
+TIERS = {"standard": 600, "professional": 3_000, "institutional": 12_000}
+# How often workers look for keys created or revoked by other workers
+_SYNC_INTERVAL_SECONDS = 1.0
+
+
+class ApiKey:
+    """A stored API key (never the plaintext)."""
+
+    __slots__ = (
+        "key_id",
+        "name",
+        "user",
+        "scopes",
+        "tier",
+        "created_at",
+        "active",
+        "principal",
+    )
+
+    def __init__(
+        self,
+        key_id: str,
+        name: str,
+        user: Dict,
+        scopes,
+        tier: str,
+        created_at: Optional[str] = None,
+    ):
+        self.key_id = key_id
+        self.name = name
+        self.user = {field: user[field] for field in ("user_id", "username", "email")}
+        self.scopes: FrozenSet[str] = frozenset(scopes)
+        self.tier = tier
+        self.created_at = created_at or datetime.now(timezone.utc).isoformat()
+        self.active = True
+        # Same shape as an access-token payload, plus scopes.
+        self.principal = {
+            "user_id": user["user_id"],
+            "username": user["username"],
+            "email": user["email"],
+            "is_admin": False,
+            "type": "access",
+            "auth": "api_key",
+            "key_id": key_id,
+            "scopes": sorted(self.scopes),
+            "tier": tier,
+        }
+
+    @property
+    def requests_per_minute(self) -> int:
+        return TIERS[self.tier]
+
+    def to_dict(self) -> Dict:
+        return {
+            "key_id": self.key_id,
+            "name": self.name,
+            "user_id": self.user["user_id"],
+            "scopes": sorted(self.scopes),
+            "tier": self.tier,
+            "created_at": self.created_at,
+            "active": self.active,
+        }
+
+
+class ApiKeyStore:
+    """HMAC-indexed API key table, optionally shared through a file."""
+
+    def __init__(
+        self,
+        pepper: bytes,
+        path: Optional[str] = None,
+        sync_interval: float = _SYNC_INTERVAL_SECONDS,
+    ):
+        self._pepper = pepper
+        self.path = path
+        self.sync_interval = sync_interval
+        self._by_digest: Dict[bytes, ApiKey] = {}
+        self._by_id: Dict[str, ApiKey] = {}
+        self._offset = 0
+        self._next_sync = 0.0
+        self.lookups = 0
+        if path:
+            self._tail()
+
+    def _digest(self, raw_key: str) -> bytes:
+        return hmac.new(self._pepper, raw_key.encode(), hashlib.sha256).digest()
+
+    def create(
+        self, user: Dict, name: str, scopes: Iterable[str], tier: str = "standard"
+    ) -> Tuple[str, ApiKey]:
+        """Issue a key; the plaintext is returned once and never stored."""
+        scopes = frozenset(scopes)
+        if not scopes <= SCOPES:
+            raise ValueError(f"Unknown scopes: {sorted(scopes - SCOPES)}")
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier: {tier}")
+
+        key_id = secrets.token_hex(6)
+        raw_key = f"{API_KEY_PREFIX}{key_id}_{secrets.token_urlsafe(32)}"
+        record = ApiKey(key_id, name, user, scopes, tier)
+        digest = self._digest(raw_key)
+        self._insert(digest, record)
+        self._append({"op": "create", "digest": digest.hex(), **record.to_dict(), **record.user})
+        return raw_key, record
+
+    def resolve(self, raw_key: str) -> Optional[ApiKey]:
+        """Return the active key record for a raw key, or None."""
+        self.lookups += 1
+        self._maybe_sync()
+        digest = self._digest(raw_key)
+        record = self._by_digest.get(digest)
+        if record is None and self.path:
+            # Possibly created by another worker since the last sync
+            self._tail()
+            record = self._by_digest.get(digest)
+        if record is None or not record.active:
+            return None
+        return record
+
+    def revoke(self, key_id: str) -> bool:
+        self._maybe_sync()
+        record = self._by_id.get(key_id)
+        if record is None:
+            return False
+        record.active = False
+        self._append({"op": "revoke", "key_id": key_id})
+        return True
+
+    def list(self) -> List[Dict]:
+        self._maybe_sync()
+        return [record.to_dict() for record in self._by_id.values()]
+
+    def _insert(self, digest: bytes, record: ApiKey):
+        self._by_digest[digest] = record
+        self._by_id[record.key_id] = record
+
+    def _append(self, entry: Dict):
+        if not self.path:
+            return
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        with os.fdopen(fd, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _maybe_sync(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now >= self._next_sync:
+            self._next_sync = now + self.sync_interval
+            self._tail()
+
+    def _tail(self):
+        """Load records appended to the shared file since the last read."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Only consume complete lines; a writer may be mid-append.
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            self._apply(json.loads(line))
+
+    def _apply(self, entry: Dict):
+        if entry["op"] == "revoke":
+            record = self._by_id.get(entry["key_id"])
+            if record is not None:
+                record.active = False
+        elif entry["key_id"] not in self._by_id:
+            record = ApiKey(
+                entry["key_id"],
+                entry["name"],
+                entry,
+                entry["scopes"],
+                entry["tier"],
+                entry["created_at"],
+            )
+            record.active = entry["active"]
+            self._insert(bytes.fromhex(entry["digest"]), record)
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._by_id),
+            "active": sum(record.active for record in self._by_id.values()),
+            "lookups": self.lookups,
+            "shared_file": self.path,
+        }
+
+
+def _pepper() -> bytes:
+    configured = os.getenv("API_KEY_HMAC_SECRET")
+    if configured:
+        return configured.encode()
+    if os.getenv("API_KEYS_FILE"):
+        logger.warning(
+            "API_KEYS_FILE is set without API_KEY_HMAC_SECRET: "
+            "keys in it will not resolve after a restart"
+        )
+    # The table is in memory, so a per-process secret is enough by default.
+    return secrets.token_bytes(32)
+
+
+api_key_store = ApiKeyStore(_pepper(), path=os.getenv("API_KEYS_FILE") or None)
+metrics.register("api_keys", api_key_store.stats)
@@ -7,43 +7,87 @@ JWT token generation and validation with security best practices.
 
 import logging
 import os
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Optional
 
 import jwt
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 from passlib.context import CryptContext
 
+from src.auth.api_keys import API_KEY_HEADER, api_key_store
+from src.auth.keys import KeyRing
+from src.auth.revocation import revocation_list
+from src.utils import metrics
+from src.utils.tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 # Configuration
 _DEFAULT_SECRET = "your-secret-key-change-in-production"
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", _DEFAULT_SECRET)
-if SECRET_KEY == _DEFAULT_SECRET:
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+# RS256/EdDSA never sign or verify with the shared secret
+if SECRET_KEY == _DEFAULT_SECRET and ALGORITHM == "HS256":
     logger.warning(
         "JWT_SECRET_KEY is using the insecure default value. "
         "Set the JWT_SECRET_KEY environment variable before deploying."
     )
 
-ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Signing keys by kid (HS256 secret, or RS256/EdDSA keys from JWT_KEYS_DIR)
+key_ring = KeyRing.from_env(ALGORITHM, SECRET_KEY, REFRESH_TOKEN_EXPIRE_DAYS * 86_400)
+metrics.register("signing_keys", key_ring.stats)
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# HTTP Bearer scheme
-security = HTTPBearer()
+# HTTP Bearer scheme, or an API key for machine clients
+security = HTTPBearer(auto_error=False)
+api_key_header = APIKeyHeader(name=API_KEY_HEADER, auto_error=False)
+
+# Verified-token cache: token -> decoded payload, evicted LRU and never
+# trusted past the token's own expiry.
+_VERIFIED_CACHE_SIZE = 10_000
+_verified_tokens: "OrderedDict[str, Dict]" = OrderedDict()
+# Tokens signed with a removed key must not verify from the cache
+key_ring.on_remove.append(_verified_tokens.clear)
+
+
+def _encode(payload: Dict) -> str:
+    key = key_ring.signing_key()
+    return jwt.encode(payload, key.signing, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
+def _decode(token: str) -> Dict:
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = key_ring.verification_key(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+    # Pin the algorithm to the key's own to rule out algorithm confusion.
+    return jwt.decode(token, key.verifying, algorithms=[key.algorithm])
+
+
+def _check_revoked(payload: Dict) -> Dict:
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return dict(payload)
 
 
 class JWTHandler:
     """Handle JWT token operations"""
 
     @staticmethod
-    def create_access_token(
-        data: Dict, expires_delta: Optional[timedelta] = None
-    ) -> str:
+    def create_access_token(data: Dict, expires_delta: Optional[timedelta] = None) -> str:
         """
         Create JWT access token
 
@@ -59,16 +103,18 @@ class JWTHandler:
         if expires_delta:
             expire = datetime.now(timezone.utc) + expires_delta
         else:
-            expire = datetime.now(timezone.utc) + timedelta(
-                minutes=ACCESS_TOKEN_EXPIRE_MINUTES
-            )
+            expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
         to_encode.update(
-            {"exp": expire, "iat": datetime.now(timezone.utc), "type": "access"}
+            {
+                "exp": expire,
+                "iat": datetime.now(timezone.utc),
+                "jti": uuid.uuid4().hex,
+                "type": "access",
+            }
         )
 
-        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-        return encoded_jwt
+        return _encode(to_encode)
 
     @staticmethod
     def create_refresh_token(data: Dict) -> str:
@@ -85,17 +131,26 @@ class JWTHandler:
         expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
         to_encode.update(
-            {"exp": expire, "iat": datetime.now(timezone.utc), "type": "refresh"}
+            {
+                "exp": expire,
+                "iat": datetime.now(timezone.utc),
+                "jti": uuid.uuid4().hex,
+                "type": "refresh",
+            }
         )
 
-        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-        return encoded_jwt
+        return _encode(to_encode)
 
     @staticmethod
     def verify_token(token: str) -> Dict:
         """
         Verify and decode JWT token
 
+        Recently verified tokens are served from a bounded cache until
+        they expire, so repeated calls with the same token skip the
+        signature check. The revocation check runs on every call,
+        cached or not.
+
         Args:
             token: JWT token to verify
 
@@ -103,11 +158,18 @@ class JWTHandler:
             Decoded token payload
 
         Raises:
-            HTTPException: If token is invalid or expired
+            HTTPException: If token is invalid, expired or revoked
         """
+        cached = _verified_tokens.get(token)
+        if cached is not None:
+            if cached["exp"] > time.time():
+                _verified_tokens.move_to_end(token)
+                return _check_revoked(cached)
+            del _verified_tokens[token]
+
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            return payload
+            with tracer.span("jwt.verify"):
+                payload = _decode(token)
         except jwt.ExpiredSignatureError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -121,32 +183,60 @@ class JWTHandler:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        if "exp" in payload:
+            _verified_tokens[token] = payload
+            if len(_verified_tokens) > _VERIFIED_CACHE_SIZE:
+                _verified_tokens.popitem(last=False)
+        return _check_revoked(payload)
+
+    @staticmethod
+    def revoke_token(payload: Dict):
+        """Revoke a verified token until it expires."""
+        if "jti" in payload and "exp" in payload:
+            revocation_list.revoke(payload["jti"], payload["exp"])
+
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash password using bcrypt"""
-        return pwd_context.hash(password)
+        with tracer.span("bcrypt.hash"):
+            return pwd_context.hash(password)
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
         """Verify password against hash"""
-        return pwd_context.verify(plain_password, hashed_password)
+        with tracer.span("bcrypt.verify"):
+            return pwd_context.verify(plain_password, hashed_password)
 
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    api_key: Optional[str] = Depends(api_key_header),
 ) -> Dict:
     """
     Dependency to get current authenticated user
 
     Args:
         credentials: HTTP Bearer credentials
+        api_key: API key from the X-API-Key header
 
     Returns:
-        User data from token
+        User data from token, or the API key's principal
 
     Raises:
-        HTTPException: If token is invalid
+        HTTPException: If token or API key is invalid
     """
+    if api_key is not None:
+        record = api_key_store.resolve(api_key)
+        if record is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+        return dict(record.principal)
+
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     token = credentials.credentials
     payload = JWTHandler.verify_token(token)
 
@@ -177,8 +267,26 @@ async def get_current_admin_user(
         HTTPException: If user is not admin
     """
     if not current_user.get("is_admin", False):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
-        )
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
 
     return current_user
+
+
+def require_scope(scope: str):
+    """
+    Dependency factory requiring an API-key scope
+
+    Bearer-token users are not scope-limited; API keys must carry the
+    scope.
+    """
+
+    async def dependency(current_user: Dict = Depends(get_current_user)) -> Dict:
+        scopes = current_user.get("scopes")
+        if scopes is not None and scope not in scopes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"API key lacks scope: {scope}",
+            )
+        return current_user
+
+    return dependency
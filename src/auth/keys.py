@@ -0,0 +1,319 @@
+"""
+JWT Signing Keys
+Author: Gabriel Demetrios Lafis
+
+A key ring of JWT signing keys selected by `kid`. Keys are parsed once
+into cryptography key objects and reused for every sign/verify call.
+HS256 keeps working with the shared secret; RS256 and EdDSA keys are
+published as a JWKS so downstream services verify tokens without
+holding any secret.
+
+Rotation needs no restart: `rotate()` makes a new key active while
+older keys stay available for verification. When JWT_KEYS_DIR is set,
+keys live there as `<kid>.pem` files (PKCS8 private keys, or an HS256
+secret in an "HS256 SECRET" block), the newest file is the active key,
+and every worker picks up added or removed files.
+
+With JWT_ALGORITHM set to RS256 or EdDSA the ring is asymmetric: the
+JWT_SECRET_KEY secret is not registered, HS256 keys are refused, and
+tokens without a `kid` do not verify, so nobody holding (or guessing) a
+shared secret can mint tokens.
+
+Rotation retires the oldest keys beyond `max_keys`, but never the
+`default` key (the JWT_SECRET_KEY secret) until `token_lifetime` has
+passed since it stopped being active, as tokens signed with it may still
+be live. Listeners in `on_remove` are called whenever a key goes away,
+so caches of verified tokens can be dropped.
+"""
+
+import base64
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+ALGORITHMS = ("HS256", "RS256", "EdDSA")
+# kid of the key built from JWT_SECRET_KEY; also used for tokens without a kid
+DEFAULT_KID = "default"
+
+# Minimum seconds between key directory scans
+_RELOAD_INTERVAL_SECONDS = 5.0
+_RSA_KEY_BITS = 2048
+_SECRET_BEGIN = b"-----BEGIN HS256 SECRET-----"
+_SECRET_END = b"-----END HS256 SECRET-----"
+# Longest token lifetime (the refresh token's), in seconds
+DEFAULT_TOKEN_LIFETIME = 7 * 86_400
+
+
+class SigningKey:
+    """A parsed signing key and its verification counterpart."""
+
+    __slots__ = ("kid", "algorithm", "signing", "verifying")
+
+    def __init__(self, kid: str, algorithm: str, signing, verifying):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.signing = signing
+        self.verifying = verifying
+
+    @classmethod
+    def hmac(cls, kid: str, secret) -> "SigningKey":
+        secret = secret.encode() if isinstance(secret, str) else secret
+        return cls(kid, "HS256", secret, secret)
+
+    @classmethod
+    def generate(cls, algorithm: str, kid: Optional[str] = None) -> "SigningKey":
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
+        kid = kid or f"{algorithm.lower()}-{int(time.time())}-{secrets.token_hex(4)}"
+        if algorithm == "HS256":
+            return cls.hmac(kid, secrets.token_bytes(32))
+        if algorithm == "RS256":
+            private = rsa.generate_private_key(65537, _RSA_KEY_BITS)
+        else:
+            private = ed25519.Ed25519PrivateKey.generate()
+        return cls(kid, algorithm, private, private.public_key())
+
+    @classmethod
+    def from_pem(cls, kid: str, pem: bytes) -> "SigningKey":
+        if pem.startswith(_SECRET_BEGIN):
+            body = pem[len(_SECRET_BEGIN) :].split(_SECRET_END)[0]
+            return cls.hmac(kid, base64.b64decode(body))
+        private = serialization.load_pem_private_key(pem, password=None)
+        if isinstance(private, rsa.RSAPrivateKey):
+            algorithm = "RS256"
+        elif isinstance(private, ed25519.Ed25519PrivateKey):
+            algorithm = "EdDSA"
+        else:
+            raise ValueError(f"Unsupported key type in {kid}")
+        return cls(kid, algorithm, private, private.public_key())
+
+    def to_pem(self) -> bytes:
+        if self.algorithm == "HS256":
+            secret = base64.b64encode(self.signing)
+            return b"%s\n%s\n%s\n" % (_SECRET_BEGIN, secret, _SECRET_END)
+        return self.signing.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+
+    def jwk(self) -> Optional[dict]:
+        """Public JWK for this key (None for shared-secret keys)."""
+        if self.algorithm == "RS256":
+            jwk = RSAAlgorithm.to_jwk(self.verifying, as_dict=True)
+        elif self.algorithm == "EdDSA":
+            jwk = OKPAlgorithm.to_jwk(self.verifying, as_dict=True)
+        else:
+            return None
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeyRing:
+    """Signing keys by kid, with one active key and rotation."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_keys: int = 5,
+        token_lifetime: float = DEFAULT_TOKEN_LIFETIME,
+        allow_hmac: bool = True,
+    ):
+        self.directory = directory
+        self.allow_hmac = allow_hmac
+        self.max_keys = max_keys
+        self.token_lifetime = token_lifetime
+        self._keys: "OrderedDict[str, SigningKey]" = OrderedDict()
+        self._file_kids: set = set()
+        self.active_kid: Optional[str] = None
+        # kid -> when it stopped (or was added without) being active
+        self._retired_at: Dict[str, float] = {}
+        self.on_remove: List[Callable[[], None]] = []
+        self._jwks: Optional[dict] = None
+        self._next_reload = 0.0
+        self.rotations = 0
+        self.reloads = 0
+
+    def _activate(self, kid: str):
+        if kid != self.active_kid:
+            if self.active_kid is not None:
+                self._retired_at[self.active_kid] = time.time()
+            self._retired_at.pop(kid, None)
+            self.active_kid = kid
+
+    def add(self, key: SigningKey, activate: bool = True):
+        if key.algorithm == "HS256" and not self.allow_hmac:
+            raise ValueError("HS256 keys are disabled for an asymmetric key ring")
+        self._keys[key.kid] = key
+        if activate:
+            self._activate(key.kid)
+        elif key.kid != self.active_kid:
+            self._retired_at.setdefault(key.kid, time.time())
+        self._jwks = None
+
+    def _evictable(self, kid: str) -> bool:
+        if kid == self.active_kid:
+            return False
+        if kid != DEFAULT_KID:
+            return True
+        # Tokens signed with the shared secret may outlive its rotation
+        retired = self._retired_at.get(kid)
+        return retired is not None and time.time() - retired > self.token_lifetime
+
+    def _removed(self):
+        self._jwks = None
+        for listener in self.on_remove:
+            listener()
+
+    def rotate(self, algorithm: str) -> SigningKey:
+        """Create and activate a new key; previous keys still verify."""
+        if algorithm == "HS256" and not self.allow_hmac:
+            raise ValueError("HS256 keys are disabled for an asymmetric key ring")
+        key = SigningKey.generate(algorithm)
+        if self.directory:
+            path = os.path.join(self.directory, f"{key.kid}.pem")
+            tmp = f"{path}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(key.to_pem())
+            os.replace(tmp, path)
+            self._file_kids.add(key.kid)
+        self.add(key)
+        self.rotations += 1
+        # Drop the oldest keys beyond max_keys (never the active one,
+        # nor the default key while its tokens may be live).
+        while len(self._keys) > self.max_keys:
+            kid = next((kid for kid in self._keys if self._evictable(kid)), None)
+            if kid is None:
+                break
+            self.remove(kid)
+        return key
+
+    def remove(self, kid: str):
+        """Retire a key; tokens signed with it no longer verify."""
+        if kid == self.active_kid or kid not in self._keys:
+            return
+        del self._keys[kid]
+        self._retired_at.pop(kid, None)
+        self._removed()
+        if kid in self._file_kids:
+            self._file_kids.discard(kid)
+            try:
+                os.remove(os.path.join(self.directory, f"{kid}.pem"))
+            except FileNotFoundError:
+                pass
+
+    def signing_key(self) -> SigningKey:
+        self._maybe_reload()
+        return self._keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]) -> Optional[SigningKey]:
+        if not kid and not self.allow_hmac:
+            return None
+        key = self._keys.get(kid or DEFAULT_KID)
+        if key is None and kid and self._maybe_reload():
+            # Possibly rotated in by another worker.
+            key = self._keys.get(kid)
+        return key
+
+    def jwks(self) -> dict:
+        """JWK Set of the public keys (cached until the ring changes)."""
+        if self._jwks is None:
+            keys: List[dict] = [
+                jwk for key in self._keys.values() if (jwk := key.jwk()) is not None
+            ]
+            self._jwks = {"keys": keys}
+        return self._jwks
+
+    def _maybe_reload(self) -> bool:
+        if not self.directory:
+            return False
+        now = time.monotonic()
+        if now < self._next_reload:
+            return False
+        self._next_reload = now + _RELOAD_INTERVAL_SECONDS
+        self.reload()
+        return True
+
+    def reload(self):
+        """Sync file-backed keys with the key directory."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pem"):
+                path = os.path.join(self.directory, name)
+                entries.append((os.stat(path).st_mtime, name[:-4], path))
+        entries.sort()
+
+        present = {kid for _, kid, _ in entries}
+        gone = self._file_kids - present
+        if not self.allow_hmac:
+            # No shared secret to fall back to: keep signing with the active key
+            gone.discard(self.active_kid)
+        for kid in gone:
+            self._keys.pop(kid, None)
+            self._retired_at.pop(kid, None)
+        if gone:
+            self._removed()
+        loaded = [kid for _, kid, path in entries if self._load(kid, path)]
+        self._file_kids = present
+        if loaded:
+            self._activate(loaded[-1])
+        elif self.active_kid not in self._keys and self.allow_hmac:
+            self._activate(DEFAULT_KID)
+        self.reloads += 1
+
+    def _load(self, kid: str, path: str) -> bool:
+        if kid not in self._keys:
+            with open(path, "rb") as f:
+                key = SigningKey.from_pem(kid, f.read())
+            if key.algorithm == "HS256" and not self.allow_hmac:
+                return False
+            self.add(key, activate=False)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "active_kid": self.active_kid,
+            "keys": [{"kid": key.kid, "algorithm": key.algorithm} for key in self._keys.values()],
+            "rotations": self.rotations,
+            "reloads": self.reloads,
+        }
+
+    @classmethod
+    def from_env(
+        cls,
+        algorithm: str,
+        secret: str,
+        token_lifetime: float = DEFAULT_TOKEN_LIFETIME,
+    ) -> "KeyRing":
+        """
+        Build the ring from configuration.
+
+        HS256 signs with the shared secret until a key is rotated in;
+        keys in JWT_KEYS_DIR, of any algorithm, are loaded and the newest
+        is active. RS256/EdDSA never accept the shared secret: they load
+        the asymmetric keys in JWT_KEYS_DIR, generating one there if
+        there is none; without a directory a process-local key is
+        generated (single worker only).
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported algorithm: {algorithm}")
+        ring = cls(
+            directory=os.getenv("JWT_KEYS_DIR") or None,
+            token_lifetime=token_lifetime,
+            allow_hmac=algorithm == "HS256",
+        )
+        if ring.allow_hmac:
+            ring.add(SigningKey.hmac(DEFAULT_KID, secret))
+        if ring.directory:
+            os.makedirs(ring.directory, exist_ok=True)
+            ring.reload()
+        if ring.active_kid is None:
+            ring.rotate(algorithm)
+        return ring
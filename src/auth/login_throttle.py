@@ -0,0 +1,90 @@
+"""
+Login Throttle
+Author: Gabriel Demetrios Lafis
+
+Brute-force protection for the login endpoint that runs before any
+password hashing. Failed logins are counted per account and per client
+subnet in windowed count-min sketches; once a key passes its threshold
+it is blocked with exponential backoff (doubling per extra failure, up
+to a cap). Blocked attempts are answered with 429 without touching
+bcrypt.
+
+All state lives in fixed-size sketches, so memory stays bounded no
+matter how many accounts or addresses an attacker cycles through.
+Collisions can only over-throttle, never let extra attempts through.
+"""
+
+import ipaddress
+import os
+import time
+
+from src.utils import metrics
+from src.utils.sketches import MaxSketch, WindowedCountMinSketch
+
+
+def subnet_of(host: str) -> str:
+    """Group addresses by /24 (IPv4) or /64 (IPv6)."""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    prefix = 24 if address.version == 4 else 64
+    return str(ipaddress.ip_network(f"{host}/{prefix}", strict=False))
+
+
+class LoginThrottle:
+    """Per-account and per-subnet failure tracking with backoff."""
+
+    def __init__(
+        self,
+        window_seconds: float = 900.0,
+        account_threshold: int = 5,
+        subnet_threshold: int = 50,
+        base_delay: float = 1.0,
+        max_delay: float = 900.0,
+        width: int = 8192,
+        depth: int = 4,
+    ):
+        self.account_threshold = account_threshold
+        self.subnet_threshold = subnet_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._failures = WindowedCountMinSketch(window_seconds, width, depth)
+        self._blocked_until = MaxSketch(width, depth)
+        self.failures = 0
+        self.throttled = 0
+
+    def retry_after(self, account: str, client_host: str) -> float:
+        """Seconds until this account/subnet may try again (0 if allowed)."""
+        now = time.time()
+        blocked_until = max(
+            self._blocked_until.estimate(f"acct:{account.lower()}"),
+            self._blocked_until.estimate(f"net:{subnet_of(client_host)}"),
+        )
+        if blocked_until <= now:
+            return 0.0
+        self.throttled += 1
+        return blocked_until - now
+
+    def record_failure(self, account: str, client_host: str):
+        self.failures += 1
+        now = time.time()
+        for key, threshold in (
+            (f"acct:{account.lower()}", self.account_threshold),
+            (f"net:{subnet_of(client_host)}", self.subnet_threshold),
+        ):
+            count = self._failures.add(key)
+            if count >= threshold:
+                excess = min(count - threshold, 32)
+                delay = min(self.max_delay, self.base_delay * 2**excess)
+                self._blocked_until.update(key, now + delay)
+
+    def stats(self) -> dict:
+        return {"failures": self.failures, "throttled": self.throttled}
+
+
+login_throttle = LoginThrottle(
+    account_threshold=int(os.getenv("LOGIN_MAX_ACCOUNT_FAILURES", "5")),
+    subnet_threshold=int(os.getenv("LOGIN_MAX_SUBNET_FAILURES", "50")),
+)
+metrics.register("login_throttle", login_throttle.stats)
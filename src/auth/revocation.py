@@ -0,0 +1,200 @@
+"""
+Token Revocation
+Author: Gabriel Demetrios Lafis
+
+Revoked token IDs (`jti`) kept until the token's own `exp`, with a Bloom
+filter in front so the common not-revoked check is a handful of bit
+probes and no dictionary lookup. Only Bloom positives consult the exact
+set, so false positives never reject a valid token.
+
+When REVOCATION_FILE is set, revocations are appended to that file
+(one "jti exp" line each) and every worker tails it, so a logout on one
+worker is honoured by all of them within `sync_interval` seconds. The
+file is compacted in place once most of its lines have expired.
+"""
+
+import fcntl
+import hashlib
+import math
+import os
+import time
+from typing import Dict, Optional
+
+from src.utils import metrics
+
+# How often workers look for revocations appended by other workers
+_SYNC_INTERVAL_SECONDS = 1.0
+# How often expired entries are purged and the filter rebuilt
+_PURGE_INTERVAL_SECONDS = 60.0
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _probes(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for bit in self._probes(item):
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in self._probes(item))
+
+
+class RevocationList:
+    """Expiring set of revoked jtis, optionally shared through a file."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        capacity: int = 100_000,
+        error_rate: float = 0.001,
+        sync_interval: float = _SYNC_INTERVAL_SECONDS,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._expiry: Dict[str, float] = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._file_id = None
+        self._offset = 0
+        self._next_sync = 0.0
+        self._next_purge = time.monotonic() + _PURGE_INTERVAL_SECONDS
+        self.checks = 0
+        self.bloom_positives = 0
+        self.false_positives = 0
+
+    def revoke(self, jti: str, exp: float):
+        """Revoke a token ID until its expiry time (epoch seconds)."""
+        if exp <= time.time():
+            return
+        self._insert(jti, exp)
+        if self.path:
+            with self._locked():
+                with open(self.path, "a") as f:
+                    f.write(f"{jti} {exp}\n")
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Return True if the token ID has been revoked and not yet expired."""
+        if jti is None:
+            return False
+        now = time.monotonic()
+        if now >= self._next_sync:
+            self._sync(now)
+
+        self.checks += 1
+        if jti not in self._bloom:
+            return False
+        self.bloom_positives += 1
+        exp = self._expiry.get(jti)
+        if exp is None:
+            self.false_positives += 1
+            return False
+        return exp > time.time()
+
+    def _insert(self, jti: str, exp: float):
+        self._expiry[jti] = exp
+        self._bloom.add(jti)
+
+    def _sync(self, now: float):
+        self._next_sync = now + self.sync_interval
+        if now >= self._next_purge:
+            self._next_purge = now + _PURGE_INTERVAL_SECONDS
+            self._purge()
+        if self.path:
+            self._tail()
+
+    def _tail(self):
+        """Load revocations appended to the shared file since the last sync."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self._file_id:
+            # New or compacted file: it holds every live entry.
+            self._file_id, self._offset = file_id, 0
+        if st.st_size <= self._offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        # Only consume complete lines; a writer may be mid-append.
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            jti, _, exp = line.decode().partition(" ")
+            if jti and exp:
+                self._insert(jti, float(exp))
+
+    def _purge(self):
+        """Drop expired entries and rebuild the filter without them."""
+        now = time.time()
+        live = {jti: exp for jti, exp in self._expiry.items() if exp > now}
+        expired = len(self._expiry) - len(live)
+        self._expiry = live
+        if expired:
+            self._bloom = BloomFilter(max(self.capacity, 2 * len(live)), self.error_rate)
+            for jti in live:
+                self._bloom.add(jti)
+        if self.path and expired > len(live):
+            self._compact(now)
+
+    def _compact(self, now: float):
+        """Rewrite the shared file with live entries only."""
+        with self._locked():
+            self._tail()
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                for jti, exp in self._expiry.items():
+                    if exp > now:
+                        f.write(f"{jti} {exp}\n")
+            os.replace(tmp, self.path)
+            st = os.stat(self.path)
+            self._file_id, self._offset = (st.st_dev, st.st_ino), st.st_size
+
+    def _locked(self):
+        return _FileLock(f"{self.path}.lock")
+
+    def stats(self) -> dict:
+        return {
+            "revoked": len(self._expiry),
+            "checks": self.checks,
+            "bloom_positives": self.bloom_positives,
+            "false_positives": self.false_positives,
+            "shared_file": self.path,
+        }
+
+
+class _FileLock:
+    """Exclusive advisory lock serialising appends and compaction."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = -1
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+revocation_list = RevocationList(path=os.getenv("REVOCATION_FILE") or None)
+metrics.register("revocation", revocation_list.stats)
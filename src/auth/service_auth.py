@@ -0,0 +1,65 @@
+"""
+Service Authentication
+Author: Gabriel Demetrios Lafis
+
+HTTP Basic credentials for internal services calling service-only
+endpoints such as token introspection. Credentials come from
+SERVICE_CREDENTIALS ("name:secret,name:secret"); only SHA-256 digests of
+the secrets are kept, compared in constant time.
+"""
+
+import hashlib
+import hmac
+import os
+from typing import Dict
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+
+basic_security = HTTPBasic(auto_error=False)
+
+
+class ServiceCredentials:
+    """Registered service names and their secret digests."""
+
+    def __init__(self, spec: str = ""):
+        self._digests: Dict[str, bytes] = {}
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            name, _, secret = entry.partition(":")
+            if name and secret:
+                self.add(name, secret)
+
+    def add(self, name: str, secret: str):
+        self._digests[name] = hashlib.sha256(secret.encode()).digest()
+
+    def verify(self, name: str, secret: str) -> bool:
+        expected = self._digests.get(name)
+        digest = hashlib.sha256(secret.encode()).digest()
+        # Compare even for unknown names so timing does not reveal them.
+        return hmac.compare_digest(digest, expected or bytes(32)) and bool(expected)
+
+
+service_credentials = ServiceCredentials(os.getenv("SERVICE_CREDENTIALS", ""))
+
+
+async def get_current_service(
+    credentials: HTTPBasicCredentials = Depends(basic_security),
+) -> str:
+    """
+    Dependency authenticating an internal service
+
+    Returns:
+        The service name
+
+    Raises:
+        HTTPException: If service credentials are missing or invalid
+    """
+    if credentials is None or not service_credentials.verify(
+        credentials.username, credentials.password
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid service credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
@@ -0,0 +1,368 @@
+"""
+Multi-Worker Launcher
+Author: Gabriel Demetrios Lafis
+
+Production entry point: forks WORKERS uvicorn processes serving
+`src.main:app` on one port.
+
+- Each worker binds its own SO_REUSEPORT listener, so the kernel spreads
+  connections across workers instead of every worker racing on one
+  accept queue. Where SO_REUSEPORT is missing, the launcher binds one
+  socket and the workers inherit it.
+- uvloop and httptools are used when installed, else asyncio and h11.
+- WORKER_CPU_PINNING pins worker i to the i-th CPU the launcher may run
+  on.
+- A worker that dies is restarted in its slot.
+
+Signals to the launcher:
+- SIGHUP is forwarded to every worker, which reloads the gateway config
+  file in place (see utils.config) without restarting.
+- SIGUSR2 rotates the workers one slot at a time, e.g. to deploy new
+  code. The old worker stops accepting and finishes in-flight requests
+  (up to WORKER_GRACEFUL_TIMEOUT), then its replacement starts and
+  reports ready before the next slot rotates. The other workers keep serving
+  throughout, so with two or more workers no connection is refused.
+- SIGTERM/SIGINT stops every worker gracefully.
+
+The app is imported only in the workers, after the fork, so each has
+its own state. Cross-worker state goes through the shared backends:
+RATE_LIMIT_BACKEND_URL for rate limits, REVOCATION_FILE for logouts and
+API_KEYS_FILE for API keys. More than one worker requires
+API_KEY_HMAC_SECRET and JWT_KEYS_DIR (SHARED_SETTINGS), since without
+them every worker hashes API keys with its own random pepper and signs
+tokens with keys the others cannot verify. Other admin mutations
+(config and IP rule reloads, user registration) still change only the
+worker that served them; use SIGHUP for config and restarts for the
+rest.
+Per-process files are made per slot (`RATE_LIMIT_SNAPSHOT_FILE.<slot>`,
+`AUDIT_LOG_DIR/worker-<slot>`), so a replacement picks up where its
+predecessor stopped and no two processes write the same file.
+
+Usage:
+    python -m src.launcher [--workers N] [--host H] [--port P] [--pin-cpus]
+"""
+
+import argparse
+import importlib.util
+import os
+import select
+import signal
+import socket
+import time
+from typing import Dict, List, Mapping, Optional
+
+import uvicorn
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger("launcher")
+
+APP = "src.main:app"
+# A worker that dies sooner than this after starting is restarted after
+# a pause, so a crash loop does not spin the launcher
+MIN_WORKER_UPTIME = 1.0
+
+
+# Settings every worker must share for tokens and API keys to work
+# across workers
+SHARED_SETTINGS = ("API_KEY_HMAC_SECRET", "JWT_KEYS_DIR")
+
+
+def missing_shared_settings(environ: Mapping[str, str]) -> List[str]:
+    """SHARED_SETTINGS that are unset in `environ`."""
+    return [name for name in SHARED_SETTINGS if not environ.get(name)]
+
+
+def loop_impl() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_impl() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def bind_socket(host: str, port: int, reuse_port: bool, backlog: int = 2048):
+    """A listening TCP socket, optionally sharing its port via SO_REUSEPORT."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_env(slot: int, workers: int, environ: Mapping[str, str]) -> Dict[str, str]:
+    """Environment overrides for the worker in `slot`."""
+    env = {"WORKER_ID": str(slot), "WORKER_COUNT": str(workers)}
+    if environ.get("RATE_LIMIT_SNAPSHOT_FILE"):
+        env["RATE_LIMIT_SNAPSHOT_FILE"] = f"{environ['RATE_LIMIT_SNAPSHOT_FILE']}.{slot}"
+    if environ.get("AUDIT_LOG_DIR"):
+        env["AUDIT_LOG_DIR"] = os.path.join(environ["AUDIT_LOG_DIR"], f"worker-{slot}")
+    return env
+
+
+class _ReadyServer(uvicorn.Server):
+    """uvicorn server that tells the launcher once it is accepting."""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+
+class Launcher:
+    """Forks, supervises and rotates uvicorn workers."""
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = 1,
+        pin_cpus: bool = False,
+        graceful_timeout: float = 30.0,
+        ready_timeout: float = 60.0,
+        app: str = APP,
+    ):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.pin_cpus = pin_cpus and hasattr(os, "sched_setaffinity")
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.app = app
+        self.reuse_port = hasattr(socket, "SO_REUSEPORT")
+        self.shared_socket: Optional[socket.socket] = None
+        self.pids: Dict[int, int] = {}
+        self.started_at: Dict[int, float] = {}
+        self._stopping = False
+        self._rotate = False
+
+    # --- workers --------------------------------------------------------
+
+    def _run_worker(self, slot: int, ready_fd: int):
+        """Body of a forked worker process."""
+        for sig in (signal.SIGUSR2, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        # A config reload before the app installs its handler is a no-op
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        os.environ.update(worker_env(slot, self.workers, os.environ))
+        if self.pin_cpus:
+            cpus = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, {cpus[slot % len(cpus)]})
+        sock = self.shared_socket or bind_socket(self.host, self.port, True)
+        config = uvicorn.Config(
+            self.app,
+            loop=loop_impl(),
+            http=http_impl(),
+            lifespan="on",
+            access_log=False,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        _ReadyServer(config, ready_fd).run(sockets=[sock])
+
+    def spawn(self, slot: int) -> int:
+        """Fork the worker for `slot` and wait until it accepts connections."""
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            code = 1
+            try:
+                self._run_worker(slot, ready_w)
+                code = 0
+            except BaseException:
+                logger.exception("Worker %d failed", slot)
+            finally:
+                os._exit(code)
+        os.close(ready_w)
+        try:
+            readable, _, _ = select.select([ready_r], [], [], self.ready_timeout)
+            ready = bool(readable) and os.read(ready_r, 1) == b"1"
+        finally:
+            os.close(ready_r)
+        self.pids[slot] = pid
+        self.started_at[slot] = time.monotonic()
+        if not ready:
+            logger.error("Worker %d (pid %d) did not become ready", slot, pid)
+        else:
+            logger.info("Worker %d ready (pid %d)", slot, pid)
+        return pid
+
+    def stop_worker(self, pid: int):
+        """SIGTERM a worker and wait for it to drain."""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        self._wait(pid)
+
+    def _wait(self, pid: int):
+        """Wait for a stopping worker, killing it past the grace period."""
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while time.monotonic() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if done:
+                return
+            time.sleep(0.05)
+        logger.warning("Worker pid %d did not exit in time; killing it", pid)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def rotate(self):
+        """Replace every worker, one slot at a time."""
+        logger.info("Rotating %d workers", len(self.pids))
+        for slot in sorted(self.pids):
+            self.stop_worker(self.pids.pop(slot))
+            self.spawn(slot)
+            if self._stopping:
+                break
+
+    def _reap(self):
+        """Restart workers that exited on their own."""
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = next((s for s, p in self.pids.items() if p == pid), None)
+            if slot is None or self._stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d", slot, pid, status)
+            del self.pids[slot]
+            if time.monotonic() - self.started_at[slot] < MIN_WORKER_UPTIME:
+                time.sleep(MIN_WORKER_UPTIME)
+            self.spawn(slot)
+
+    # --- supervisor -----------------------------------------------------
+
+    def _warn_unshared_state(self):
+        if self.workers < 2:
+            logger.warning("One worker: rotation leaves no listener while it restarts")
+            return
+        if not os.getenv("RATE_LIMIT_BACKEND_URL"):
+            logger.warning(
+                "RATE_LIMIT_BACKEND_URL is unset: each of the %d workers enforces "
+                "its own rate limits",
+                self.workers,
+            )
+        if not os.getenv("REVOCATION_FILE"):
+            logger.warning("REVOCATION_FILE is unset: logouts apply to one worker only")
+        if not os.getenv("API_KEYS_FILE"):
+            logger.warning(
+                "API_KEYS_FILE is unset: API keys work only on the worker that created them"
+            )
+        logger.warning(
+            "Admin mutations (key rotation without JWT_KEYS_DIR, config and IP rule "
+            "reloads, registrations) apply only to the worker that serves them"
+        )
+
+    def reload_config(self):
+        """Ask every worker to reload the gateway config."""
+        logger.info("Reloading config in %d workers", len(self.pids))
+        for pid in self.pids.values():
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self.reload_config()
+        elif signum == signal.SIGUSR2:
+            self._rotate = True
+        else:
+            self._stopping = True
+
+    def _check_shared_settings(self):
+        missing = missing_shared_settings(os.environ)
+        if self.workers > 1 and missing:
+            raise RuntimeError(
+                f"{self.workers} workers need {', '.join(missing)} set so tokens "
+                "and API keys verify in every worker (or set WORKERS=1); "
+                f"required with more than one worker: {', '.join(SHARED_SETTINGS)}"
+            )
+
+    def run(self):
+        self._check_shared_settings()
+        for sig in (signal.SIGHUP, signal.SIGUSR2, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._on_signal)
+        if not self.reuse_port:
+            self.shared_socket = bind_socket(self.host, self.port, False)
+        self._warn_unshared_state()
+        logger.info(
+            "Starting %d workers on %s:%d (loop=%s, http=%s, reuse_port=%s, pinned=%s)",
+            self.workers,
+            self.host,
+            self.port,
+            loop_impl(),
+            http_impl(),
+            self.reuse_port,
+            self.pin_cpus,
+        )
+        for slot in range(self.workers):
+            self.spawn(slot)
+        while not self._stopping:
+            if self._rotate:
+                self._rotate = False
+                self.rotate()
+            self._reap()
+            time.sleep(0.1)
+        logger.info("Stopping %d workers", len(self.pids))
+        for pid in self.pids.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.pids.values():
+            self._wait(pid)
+        self.pids.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the gateway with N workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WORKERS", "0")) or os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        default=os.getenv("WORKER_CPU_PINNING", "").lower() in ("1", "true", "yes"),
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=float(os.getenv("WORKER_GRACEFUL_TIMEOUT", "30")),
+    )
+    args = parser.parse_args(argv)
+    launcher = Launcher(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        pin_cpus=args.pin_cpus,
+        graceful_timeout=args.graceful_timeout,
+    )
+    try:
+        launcher.run()
+    except RuntimeError as exc:
+        parser.exit(2, f"error: {exc}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,35 @@
+import asyncio
 import os
+import signal
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, Request, status
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, Request, Response, status
 from fastapi.responses import JSONResponse
 
-from src.auth.jwt_handler import JWTHandler
+from src.auth.jwt_handler import JWTHandler, key_ring
 from src.middleware.circuit_breaker import CircuitBreakerMiddleware
+from src.middleware.concurrency_limiter import AdaptiveConcurrencyMiddleware
+from src.middleware.cors import CORSMiddleware
+from src.middleware.idempotency import IdempotencyMiddleware
+from src.middleware.ip_filter import IpFilterMiddleware, ip_rules
+from src.middleware.rate_limit_snapshot import limiter_snapshots
 from src.middleware.rate_limiter import RateLimiterMiddleware
 from src.middleware.request_logger import RequestLoggerMiddleware
 from src.middleware.security_headers import SecurityHeadersMiddleware
-from src.routes import admin_routes, auth_routes, trading_routes, user_routes
+from src.middleware.tracing import TracingMiddleware
+from src.routes import (
+    admin_routes,
+    auth_routes,
+    batch_routes,
+    trading_routes,
+    user_routes,
+)
+from src.utils.audit import audit_log
+from src.utils.config import gateway_config
 from src.utils.logger import setup_logger
+from src.utils.loop_monitor import loop_monitor
+from src.utils.tracing import tracer
 
 # Initialize logger
 logger = setup_logger(__name__)
@@ -22,7 +39,21 @@ logger = setup_logger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Starting Secure Financial API Gateway")
     logger.info(f"Environment: {os.getenv('ENVIRONMENT', 'development')}")
+    if gateway_config.path:
+        # Refuse to start on a broken config file
+        gateway_config.reload()
+    reload_on_sighup = gateway_config.install_signal_handler(asyncio.get_running_loop())
+    ip_rules.reload()
+    limiter_snapshots.start()
+    tracer.start()
+    loop_monitor.start()
     yield
+    if reload_on_sighup:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+    await loop_monitor.stop()
+    await limiter_snapshots.stop()
+    await tracer.stop()
+    audit_log.close()
     logger.info("Shutting down Secure Financial API Gateway")
 
 
@@ -37,27 +68,30 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# CORS Configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=os.getenv("ALLOWED_ORIGINS", "*").split(","),
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["X-Request-ID", "X-RateLimit-Remaining"],
-)
+# Rate limits, breaker thresholds, security headers and CORS follow the
+# hot-reloadable gateway config (GATEWAY_CONFIG_FILE)
 
 # Add custom middleware (order matters!)
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(RequestLoggerMiddleware)
-app.add_middleware(RateLimiterMiddleware, requests_per_minute=60)
-app.add_middleware(CircuitBreakerMiddleware, failure_threshold=5, timeout=60)
+app.add_middleware(RateLimiterMiddleware)
+app.add_middleware(CircuitBreakerMiddleware)
+# Shed overload before any other layer does work
+app.add_middleware(AdaptiveConcurrencyMiddleware)
+# Refuse denied networks before they take a concurrency slot
+app.add_middleware(IpFilterMiddleware)
+# The root span covers every other layer
+app.add_middleware(TracingMiddleware)
+# Outermost: CORS preflights are answered before any other layer runs
+app.add_middleware(CORSMiddleware)
 
 # Include routers
 app.include_router(auth_routes.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(user_routes.router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(trading_routes.router, prefix="/api/v1/trading", tags=["Trading"])
 app.include_router(admin_routes.router, prefix="/api/v1/admin", tags=["Admin"])
+app.include_router(batch_routes.router, prefix="/api/v1/batch", tags=["Batch"])
 
 
 @app.get("/", tags=["Health"])
@@ -83,6 +117,13 @@ async def health_check():
     }
 
 
+@app.get("/.well-known/jwks.json", tags=["Authentication"])
+async def jwks(response: Response):
+    """Public keys for verifying tokens issued by this gateway"""
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return key_ring.jwks()
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
@@ -93,9 +134,7 @@ async def global_exception_handler(request: Request, exc: Exception):
             "error": "Internal Server Error",
             "message": "An unexpected error occurred",
             "request_id": (
-                request.state.request_id
-                if hasattr(request.state, "request_id")
-                else None
+                request.state.request_id if hasattr(request.state, "request_id") else None
             ),
         },
     )
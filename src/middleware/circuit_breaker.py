@@ -4,15 +4,19 @@ Author: Gabriel Demetrios Lafis
 
 Prevents cascading failures by breaking the circuit when error rate is high.
 Includes automatic eviction of stale breakers to prevent memory leaks.
+Thresholds follow the hot-reloadable gateway config (see utils.config).
 """
 
 import time
 from enum import Enum
-from typing import Dict
+from typing import Dict, Optional
 
 from fastapi import HTTPException, Request, status
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from src.utils.config import BreakerSettings, ConfigStore, gateway_config
+from src.utils.tracing import traced_middleware
+
 
 class CircuitState(Enum):
     """Circuit breaker states."""
@@ -25,7 +29,7 @@ class CircuitState(Enum):
 class CircuitBreaker:
     """Circuit breaker implementation."""
 
-    def __init__(self, failure_threshold: int = 5, timeout: int = 60):
+    def __init__(self, failure_threshold: int = 5, timeout: float = 60):
         self.failure_threshold = failure_threshold
         self.timeout = timeout
         self.failure_count = 0
@@ -47,10 +51,7 @@ class CircuitBreaker:
                     status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                     detail={
                         "error": "Service Unavailable",
-                        "message": (
-                            "Circuit breaker is OPEN. "
-                            "Service is temporarily unavailable."
-                        ),
+                        "message": "Circuit breaker is OPEN. Service is temporarily unavailable.",
                         "retry_after": self.timeout,
                     },
                 )
@@ -77,6 +78,10 @@ class CircuitBreaker:
             return False
         return (time.time() - self.last_failure_time) >= self.timeout
 
+    def configure(self, settings: BreakerSettings):
+        """Adopt reloaded thresholds, keeping the current state."""
+        self.failure_threshold, self.timeout = settings
+
     def get_state(self) -> str:
         """Get current circuit state."""
         return self.state.value
@@ -92,6 +97,7 @@ _MAX_BREAKERS = 5_000
 _BREAKER_TTL_SECONDS = 1800.0
 
 
+@traced_middleware("middleware.circuit_breaker")
 class CircuitBreakerMiddleware(BaseHTTPMiddleware):
     """
     Circuit breaker middleware.
@@ -102,12 +108,26 @@ class CircuitBreakerMiddleware(BaseHTTPMiddleware):
     - Configurable thresholds and timeouts
     - Half-open state for testing recovery
     - Automatic eviction of stale breakers
+    - Thresholds reloaded at runtime from the gateway config
     """
 
-    def __init__(self, app, failure_threshold: int = 5, timeout: int = 60):
+    def __init__(
+        self,
+        app,
+        failure_threshold: Optional[int] = None,
+        timeout: Optional[float] = None,
+        config: Optional[ConfigStore] = None,
+    ):
         super().__init__(app)
-        self.failure_threshold = failure_threshold
-        self.timeout = timeout
+        self.config = config or gateway_config
+        # Explicit thresholds pin the breakers; otherwise they follow reloads
+        self.pinned: Optional[BreakerSettings] = None
+        if failure_threshold is not None or timeout is not None:
+            current = self.config.current.circuit_breaker
+            self.pinned = BreakerSettings(
+                failure_threshold or current.failure_threshold,
+                timeout or current.timeout,
+            )
         self.breakers: Dict[str, CircuitBreaker] = {}
         self._last_eviction = time.time()
 
@@ -119,9 +139,7 @@ class CircuitBreakerMiddleware(BaseHTTPMiddleware):
         self._last_eviction = now
 
         stale_keys = [
-            key
-            for key, breaker in self.breakers.items()
-            if breaker.is_stale(_BREAKER_TTL_SECONDS)
+            key for key, breaker in self.breakers.items() if breaker.is_stale(_BREAKER_TTL_SECONDS)
         ]
         for key in stale_keys:
             del self.breakers[key]
@@ -145,12 +163,12 @@ class CircuitBreakerMiddleware(BaseHTTPMiddleware):
         endpoint = f"{request.method}:{request.url.path}"
 
         # Get or create circuit breaker
-        if endpoint not in self.breakers:
-            self.breakers[endpoint] = CircuitBreaker(
-                failure_threshold=self.failure_threshold, timeout=self.timeout
-            )
-
-        breaker = self.breakers[endpoint]
+        settings = self.pinned or self.config.current.circuit_breaker
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(*settings)
+        elif (breaker.failure_threshold, breaker.timeout) != settings:
+            breaker.configure(settings)
 
         # Check if circuit allows the request (raises 503 if OPEN)
         breaker.check_state()
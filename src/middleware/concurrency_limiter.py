@@ -0,0 +1,213 @@
+"""
+Adaptive Concurrency Limiter Middleware
+Author: Gabriel Demetrios Lafis
+
+Caps the number of requests in flight across the whole process and
+sheds the excess with 503 + Retry-After before any handler work runs.
+
+The cap adapts with AIMD driven by observed latency. Each route keeps
+its own uncongested baseline, and the congestion signal is the smoothed
+ratio of latency to the baseline of the route that served it, so a
+mix of slow routes (bcrypt logins) and fast ones is not mistaken for
+overload. While the ratio stays within `latency_tolerance` the limit
+grows by roughly one per limit's worth of completions; above it the
+limit is cut multiplicatively, at most once per window of that many
+completions so one congested episode costs one cut. Streaming
+responses (no Content-Length) are released at their headers without a
+latency sample, since their body time says nothing about load. This
+reacts to aggregate overload before errors appear, unlike the circuit
+breaker.
+
+Requests arriving at the limit are handed to a PriorityScheduler, which
+queues them briefly by route priority instead of shedding immediately.
+"""
+
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src.auth.api_keys import api_key_store
+from src.auth.jwt_handler import JWTHandler
+from src.middleware.ip_filter import client_info
+from src.middleware.scheduler import PriorityScheduler
+from src.utils import metrics
+from src.utils.tracing import traced_middleware
+
+# Paths that are never shed
+_EXEMPT_PATHS = frozenset({"/health", "/", "/api/docs", "/api/redoc", "/api/openapi.json"})
+
+
+def tenant_of(request: Request) -> str:
+    """Fair-share tenant: the API key, else the access-token user, else the address."""
+    api_key = request.headers.get("x-api-key")
+    record = api_key_store.resolve(api_key) if api_key else None
+    if record is not None:
+        return f"apikey:{record.key_id}"
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            # Verified tokens are cached, so later checks are free
+            payload = JWTHandler.verify_token(token)
+        except HTTPException:
+            payload = {}
+        if payload.get("type") == "access":
+            return f"user:{payload.get('user_id')}"
+    return f"ip:{client_info(request).host}"
+
+
+def _route_key(request: Request) -> str:
+    """The matched route template, so baselines do not grow per URL."""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    return f"{request.method} {getattr(route, 'path', route)}"
+
+
+class AdaptiveConcurrencyLimit:
+    """Latency-driven AIMD concurrency limit."""
+
+    def __init__(
+        self,
+        initial_limit: int = 100,
+        min_limit: int = 5,
+        max_limit: int = 1000,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.9,
+        smoothing: float = 0.2,
+        baseline_drift: float = 0.001,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.smoothing = smoothing
+        self.baseline_drift = baseline_drift
+
+        self.in_flight = 0
+        self.baselines: Dict[str, float] = {}
+        self.ratio = 1.0
+        # Completions left before another decrease is allowed
+        self._hold = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.decreases = 0
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def try_acquire(self) -> bool:
+        """Admit a request if below the current limit."""
+        if not self.has_capacity():
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.accepted += 1
+        return True
+
+    def abandon(self):
+        """Return a slot that was never used, without a latency sample."""
+        self.in_flight -= 1
+
+    def release(self, latency: Optional[float], route: str = "default"):
+        """Record a completed request and adapt the limit."""
+        self.in_flight -= 1
+        if latency is None:
+            return
+
+        baseline = self.baselines.get(route)
+        if baseline is None:
+            self.baselines[route] = latency
+            return
+
+        # The baseline tracks the route's uncongested latency: it follows
+        # drops immediately and creeps up slowly so a permanent shift is
+        # eventually accepted.
+        if latency < baseline:
+            self.baselines[route] = latency
+        else:
+            self.baselines[route] = baseline + self.baseline_drift * (latency - baseline)
+        self.ratio += self.smoothing * (latency / max(baseline, 1e-6) - self.ratio)
+
+        if self._hold > 0:
+            self._hold -= 1
+        if self.ratio > self.latency_tolerance:
+            if self._hold == 0:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                self._hold = int(self.limit)
+                self.decreases += 1
+        elif self.in_flight + 1 >= self.limit / 2:
+            # Only grow while the limit is actually being used.
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "decreases": self.decreases,
+            "latency_ratio": self.ratio,
+            "routes": len(self.baselines),
+        }
+
+
+@traced_middleware("middleware.concurrency_limiter")
+class AdaptiveConcurrencyMiddleware(BaseHTTPMiddleware):
+    """
+    Process-wide adaptive concurrency limiting.
+
+    Features:
+    - AIMD limit driven by observed latency
+    - Priority queueing at the limit (trading ahead of users, auth, admin)
+    - 503 with Retry-After when a request's class queue is full or its
+      wait deadline passes
+    - Limit and in-flight count exposed through admin metrics
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: Optional[AdaptiveConcurrencyLimit] = None,
+        scheduler: Optional[PriorityScheduler] = None,
+        retry_after: int = 1,
+        **limit_options,
+    ):
+        super().__init__(app)
+        self.limiter = limiter or AdaptiveConcurrencyLimit(**limit_options)
+        self.scheduler = scheduler or PriorityScheduler(self.limiter)
+        self.retry_after = retry_after
+        metrics.register("concurrency", self.limiter.stats)
+        metrics.register("scheduler", self.scheduler.stats)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in _EXEMPT_PATHS:
+            return await call_next(request)
+
+        path = request.url.path
+        tenant = tenant_of(request)
+        if not await self.scheduler.acquire(self.scheduler.classify(path), tenant):
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={
+                    "detail": {
+                        "error": "Service Unavailable",
+                        "message": "Server is overloaded. Retry later.",
+                        "retry_after": self.retry_after,
+                    }
+                },
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        start = time.perf_counter()
+        latency = None
+        try:
+            response = await call_next(request)
+            if "content-length" in response.headers:
+                latency = time.perf_counter() - start
+            return response
+        finally:
+            self.scheduler.release(latency, _route_key(request))
@@ -0,0 +1,210 @@
+"""
+CORS Middleware
+Author: Gabriel Demetrios Lafis
+
+Cross-origin resource sharing driven by the hot-reloadable gateway
+config (see utils.config). Each config version is compiled once into a
+CorsPolicy: exact origins in a set, `https://*.example.com` style
+patterns in one regex, and every constant header already encoded.
+
+The middleware is the outermost layer. Preflights (OPTIONS with
+Origin and Access-Control-Request-Method) are answered right here from
+the pre-built headers, without reaching tracing, IP filtering, rate
+limiting or the breaker. `Access-Control-Max-Age` (`cors.max_age`, or
+CORS_MAX_AGE) lets browsers cache the answer, so most calls send no
+preflight at all. Actual cross-origin requests pass through, and the
+allow/expose headers are added to their response.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils import metrics
+from src.utils.config import ConfigStore, CorsSettings, GatewayConfig, gateway_config
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+# Request headers a browser may send without asking (CORS-safelisted)
+SAFELISTED_HEADERS = frozenset(["accept", "accept-language", "content-language", "content-type"])
+_HOST_LABELS = r"[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*"
+_REJECTED = b"Disallowed CORS request"
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _origin_regex(patterns: List[str]) -> Optional["re.Pattern"]:
+    """One anchored regex for every `scheme://*.domain` pattern."""
+    if not patterns:
+        return None
+    parts = [re.escape(p).replace(r"\*", _HOST_LABELS) for p in patterns]
+    return re.compile(f"(?:{'|'.join(parts)})")
+
+
+class CorsPolicy:
+    """A CorsSettings compiled into lookups and encoded headers."""
+
+    __slots__ = (
+        "allow_all",
+        "origins",
+        "origin_regex",
+        "methods",
+        "any_header",
+        "headers",
+        "preflight",
+        "simple",
+        "echo_origin",
+    )
+
+    def __init__(self, settings: CorsSettings):
+        origins = settings.allow_origins
+        self.allow_all = "*" in origins
+        self.origins = frozenset(o for o in origins if "*" not in o)
+        self.origin_regex = _origin_regex([o for o in origins if "*" in o and o != "*"])
+        methods = (
+            ALL_METHODS
+            if "*" in settings.allow_methods
+            else tuple(m.upper() for m in settings.allow_methods)
+        )
+        self.methods = frozenset(methods)
+        self.any_header = "*" in settings.allow_headers
+        self.headers = SAFELISTED_HEADERS | {h.lower() for h in settings.allow_headers}
+        # A literal "*" origin is only valid without credentials
+        self.echo_origin = settings.allow_credentials or not self.allow_all
+
+        common: Headers = []
+        if settings.allow_credentials:
+            common.append((b"access-control-allow-credentials", b"true"))
+        if self.echo_origin:
+            common.append((b"vary", b"Origin"))
+        else:
+            common.append((b"access-control-allow-origin", b"*"))
+
+        self.preflight: Headers = common + [
+            (b"access-control-allow-methods", ", ".join(methods).encode()),
+            (b"access-control-max-age", str(settings.max_age).encode()),
+        ]
+        if not self.any_header:
+            allowed = ", ".join(sorted(self.headers)).encode()
+            self.preflight.append((b"access-control-allow-headers", allowed))
+        self.simple: Headers = list(common)
+        if settings.expose_headers:
+            exposed = ", ".join(settings.expose_headers).encode()
+            self.simple.append((b"access-control-expose-headers", exposed))
+
+    def allows_origin(self, origin: str) -> bool:
+        if self.allow_all or origin in self.origins:
+            return True
+        return self.origin_regex is not None and bool(self.origin_regex.fullmatch(origin))
+
+    def preflight_headers(
+        self, origin: bytes, method: str, requested: bytes
+    ) -> Tuple[int, Headers]:
+        """Status and headers answering a preflight."""
+        if not self.allows_origin(origin.decode("latin-1")):
+            return 400, [(b"content-type", b"text/plain")]
+        if method not in self.methods:
+            return 400, [(b"content-type", b"text/plain")]
+        headers = list(self.preflight)
+        if requested:
+            if not self.any_header:
+                names = requested.decode("latin-1").lower().split(",")
+                if any(name.strip() not in self.headers for name in names):
+                    return 400, [(b"content-type", b"text/plain")]
+            else:
+                headers.append((b"access-control-allow-headers", requested))
+        if self.echo_origin:
+            headers.append((b"access-control-allow-origin", origin))
+        return 204, headers
+
+
+class CORSMiddleware:
+    """Answer preflights up front and decorate cross-origin responses."""
+
+    def __init__(self, app: ASGIApp, config: Optional[ConfigStore] = None):
+        self.app = app
+        self.config = config or gateway_config
+        self._compiled_for: Optional[GatewayConfig] = None
+        self._policy: Optional[CorsPolicy] = None
+        self.preflights = 0
+        self.rejected = 0
+        metrics.register("cors", self.stats)
+
+    def policy(self) -> CorsPolicy:
+        config = self.config.current
+        if config is not self._compiled_for:
+            self._policy = CorsPolicy(config.cors)
+            self._compiled_for = config
+        return self._policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        origin, request_method, requested = _request_headers(scope)
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        policy = self.policy()
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(policy, origin, request_method, requested, send)
+            return
+        if not policy.allows_origin(origin.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = _with_cors(message.get("headers", []), policy, origin)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, policy, origin, request_method, requested, send):
+        self.preflights += 1
+        status, headers = policy.preflight_headers(
+            origin, request_method.decode("latin-1").upper(), requested or b""
+        )
+        body = b""
+        if status != 204:
+            self.rejected += 1
+            body = _REJECTED
+            headers = headers + [(b"content-length", b"%d" % len(body))]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> Dict:
+        policy = self.policy()
+        return {
+            "preflights": self.preflights,
+            "rejected_preflights": self.rejected,
+            "exact_origins": len(policy.origins),
+            "origin_patterns": policy.origin_regex is not None,
+            "allow_all": policy.allow_all,
+        }
+
+
+def _request_headers(scope: Scope) -> Tuple[Optional[bytes], ...]:
+    """Origin, Access-Control-Request-Method and -Headers, in one pass."""
+    origin = method = requested = None
+    for name, value in scope["headers"]:
+        if name == b"origin":
+            origin = value
+        elif name == b"access-control-request-method":
+            method = value
+        elif name == b"access-control-request-headers":
+            requested = value
+    return origin, method, requested
+
+
+def _with_cors(headers, policy: CorsPolicy, origin: bytes) -> Headers:
+    out = list(headers)
+    if policy.echo_origin:
+        out.append((b"access-control-allow-origin", origin))
+        for i, (name, value) in enumerate(out):
+            if name.lower() == b"vary":
+                # Merge into the response's own Vary
+                out[i] = (name, value + b", Origin")
+                return out + [h for h in policy.simple if h[0] != b"vary"]
+    return out + policy.simple
@@ -0,0 +1,253 @@
+"""
+Idempotency Middleware
+Author: Gabriel Demetrios Lafis
+
+Makes POST requests carrying an `Idempotency-Key` header safe to retry.
+The first request with a key runs the handler and its response is
+stored; later requests with the same key and payload get the stored
+response replayed without reaching the handler. Duplicates that arrive
+while the first is still running wait for it instead of running twice.
+
+Keys are scoped to the authenticated principal (the API key, else the
+access token's user, else the client address), not to the credential
+itself, so a retry sent after refreshing a token still replays.
+
+The store is bounded by entry count and total bytes, and entries expire
+after a TTL.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src.middleware.concurrency_limiter import tenant_of
+from src.utils import metrics
+from src.utils.tracing import traced_middleware
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Longest accepted key
+_MAX_KEY_LENGTH = 255
+# Rough per-entry bookkeeping overhead counted against the byte cap
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+class _Entry:
+    """A stored (or in-flight) response for one idempotency key."""
+
+    __slots__ = ("fingerprint", "future", "status", "headers", "body", "expires_at")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.future: Optional[asyncio.Future] = asyncio.get_running_loop().create_future()
+        self.status = 0
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body = b""
+        self.expires_at = expires_at
+
+    @property
+    def size(self) -> int:
+        return (
+            len(self.body) + sum(len(k) + len(v) for k, v in self.headers) + _ENTRY_OVERHEAD_BYTES
+        )
+
+
+class IdempotencyStore:
+    """Bounded, TTL-expiring table of idempotent responses."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = 16 * 1024 * 1024,
+        max_entry_bytes: int = 256 * 1024,
+        ttl_seconds: float = 24 * 3600,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.conflicts = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[_Entry, bool]:
+        """
+        Look up a key, creating an in-flight entry if it is new.
+
+        Returns (entry, owner). The owner must call complete() or
+        abort(); other callers wait on entry.future or replay it.
+        """
+        now = time.time()
+        self._expire(now)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry, False
+
+        self.misses += 1
+        entry = _Entry(fingerprint, now + self.ttl_seconds)
+        self._entries[key] = entry
+        self.bytes_used += entry.size
+        self._evict()
+        return entry, True
+
+    def complete(
+        self,
+        key: str,
+        entry: _Entry,
+        status_code: int,
+        headers: List[Tuple[bytes, bytes]],
+        body: bytes,
+    ):
+        """Store the owner's response and wake any waiting duplicates."""
+        if len(body) > self.max_entry_bytes:
+            self.uncacheable += 1
+            self.abort(key, entry)
+            return
+
+        stored = self._entries.get(key) is entry
+        if stored:
+            self.bytes_used -= entry.size
+        entry.status = status_code
+        entry.headers = headers
+        entry.body = body
+        if stored:
+            self.bytes_used += entry.size
+            self._evict()
+        self._resolve(entry, True)
+
+    def abort(self, key: str, entry: _Entry):
+        """Forget an in-flight key so the request can be retried."""
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+            self.bytes_used -= entry.size
+        self._resolve(entry, False)
+
+    @staticmethod
+    def _resolve(entry: _Entry, completed: bool):
+        future, entry.future = entry.future, None
+        if future is not None and not future.done():
+            future.set_result(completed)
+
+    def _expire(self, now: float):
+        # Entries share one TTL, so insertion order is expiry order.
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at > now:
+                return
+            self._entries.popitem(last=False)
+            self.bytes_used -= entry.size
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.bytes_used -= entry.size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes_used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "conflicts": self.conflicts,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+        }
+
+
+def _replay(entry: _Entry) -> Response:
+    response = Response(content=entry.body, status_code=entry.status)
+    response.raw_headers = list(entry.headers)
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+@traced_middleware("middleware.idempotency")
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Idempotency-Key support for POST requests.
+
+    Features:
+    - Replays the stored response for a repeated key
+    - Concurrent duplicates wait on the in-flight request
+    - Rejects a reused key with a different payload (422)
+    - Server errors are not stored, so they can be retried
+    """
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        super().__init__(app)
+        self.store = store or IdempotencyStore()
+        metrics.register("idempotency", self.store.stats)
+
+    async def dispatch(self, request: Request, call_next):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != "POST" or key is None:
+            return await call_next(request)
+
+        if not key or len(key) > _MAX_KEY_LENGTH:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Invalid Idempotency-Key header"},
+            )
+
+        body = await request.body()
+        fingerprint = hashlib.sha256(
+            b"\0".join([request.method.encode(), request.url.path.encode(), body])
+        ).hexdigest()
+        # Keys are scoped to the principal so clients cannot collide.
+        scoped_key = hashlib.sha256(f"{tenant_of(request)}\0{key}".encode()).hexdigest()
+
+        while True:
+            entry, owner = self.store.begin(scoped_key, fingerprint)
+            if owner:
+                return await self._execute(request, call_next, scoped_key, entry)
+
+            if entry.fingerprint != fingerprint:
+                self.store.conflicts += 1
+                return JSONResponse(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    content={"detail": "Idempotency-Key was reused with a different request"},
+                )
+
+            if entry.future is None:
+                self.store.hits += 1
+                return _replay(entry)
+
+            self.store.waits += 1
+            if await asyncio.shield(entry.future):
+                self.store.hits += 1
+                return _replay(entry)
+            # The original attempt failed; try again as a fresh request.
+
+    async def _execute(self, request: Request, call_next, key: str, entry: _Entry):
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        except BaseException:
+            self.store.abort(key, entry)
+            raise
+
+        if response.status_code >= 500:
+            self.store.abort(key, entry)
+        else:
+            self.store.complete(key, entry, response.status_code, list(response.raw_headers), body)
+
+        replay = Response(content=body, status_code=response.status_code)
+        replay.raw_headers = list(response.raw_headers)
+        return replay
@@ -0,0 +1,228 @@
+"""
+IP Filter Middleware
+Author: Gabriel Demetrios Lafis
+
+CIDR allow/deny lists and subnet rate-limit tiers compiled into prefix
+tries. The most specific matching prefix decides, so an allowed /24
+inside a denied /16 gets through. When an allow list is present,
+addresses matching no entry are denied.
+
+Rules are read from the JSON file named by IP_RULES_FILE:
+
+    {"allow": ["10.0.0.0/8"], "deny": ["10.6.0.0/16"],
+     "subnet_limits": {"198.51.100.0/24": 600}}
+
+The file is re-checked every few seconds and recompiled when it
+changes. A file of the wrong shape is rejected with ValueError, and the
+last good rules stay in place. The compiled tables are swapped in as one
+object, so requests never see a half-built rule set.
+
+Client addresses are parsed and hashed (keyed BLAKE2b) once per
+connection rather than on every request. IPv4-mapped IPv6 addresses
+(`::ffff:a.b.c.d`, as seen on dual-stack listeners) are treated as the
+IPv4 address they carry, so IPv4 rules and buckets apply to them.
+"""
+
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src.utils import metrics
+from src.utils.ip_trie import PrefixTrie
+from src.utils.tracing import traced_middleware
+
+logger = logging.getLogger(__name__)
+
+_ALLOW, _DENY = True, False
+# Connections whose parsed client address is kept
+_MAX_CONNECTIONS = 10_000
+# Key for client-id hashing. Random per process unless CLIENT_ID_HASH_KEY
+# is set, which keeps ids (and restored rate-limit buckets) stable across
+# restarts.
+_HASH_KEY = os.getenv("CLIENT_ID_HASH_KEY", "").encode()[:64] or secrets.token_bytes(16)
+
+
+class ClientInfo:
+    """A client address parsed and hashed once per connection."""
+
+    __slots__ = ("host", "client_id", "address", "version")
+
+    def __init__(self, host: str):
+        try:
+            parsed = ipaddress.ip_address(host)
+            if parsed.version == 6 and parsed.ipv4_mapped is not None:
+                parsed = parsed.ipv4_mapped
+                host = str(parsed)
+            self.address, self.version = int(parsed), parsed.version
+        except ValueError:
+            self.address, self.version = None, None
+        self.host = host
+        self.client_id = hashlib.blake2b(host.encode(), key=_HASH_KEY, digest_size=8).hexdigest()
+
+
+_connections: "OrderedDict[Tuple, ClientInfo]" = OrderedDict()
+
+
+def client_info(request: Request) -> ClientInfo:
+    """Return the (cached) ClientInfo for the request's connection."""
+    info = getattr(request.state, "client_info", None)
+    if info is not None:
+        return info
+
+    client = request.scope.get("client")
+    conn = tuple(client) if client else ("unknown", 0)
+    info = _connections.get(conn)
+    if info is None:
+        info = _connections[conn] = ClientInfo(conn[0])
+        if len(_connections) > _MAX_CONNECTIONS:
+            _connections.popitem(last=False)
+    request.state.client_info = info
+    return info
+
+
+def _validate(config) -> Dict:
+    """Check the rules file's shape; raise ValueError if it is wrong."""
+    if not isinstance(config, dict):
+        raise ValueError("IP rules: expected a JSON object")
+    unknown = set(config) - {"allow", "deny", "subnet_limits"}
+    if unknown:
+        raise ValueError(f"IP rules: unknown keys {', '.join(sorted(unknown))}")
+    for key in ("allow", "deny"):
+        cidrs = config.get(key, [])
+        if not isinstance(cidrs, list) or not all(isinstance(c, str) for c in cidrs):
+            raise ValueError(f"IP rules: {key} must be a list of CIDR strings")
+    limits = config.get("subnet_limits", {})
+    if not isinstance(limits, dict) or not all(
+        isinstance(v, int) and not isinstance(v, bool) and v > 0 for v in limits.values()
+    ):
+        raise ValueError("IP rules: subnet_limits must map CIDRs to positive integers")
+    return config
+
+
+class _CompiledRules:
+    __slots__ = ("access", "limits", "default_allow", "size")
+
+    def __init__(self, config: Dict):
+        config = _validate(config)
+        allow = config.get("allow", [])
+        deny = config.get("deny", [])
+        self.access = PrefixTrie(
+            [(cidr, _ALLOW) for cidr in allow] + [(cidr, _DENY) for cidr in deny]
+        )
+        self.limits = PrefixTrie(
+            (cidr, (str(ipaddress.ip_network(cidr, strict=False)), int(limit)))
+            for cidr, limit in config.get("subnet_limits", {}).items()
+        )
+        self.default_allow = not allow
+        self.size = self.access.size + self.limits.size
+
+
+class IpRules:
+    """Hot-reloadable compiled IP rules."""
+
+    def __init__(self, path: Optional[str] = None, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._rules = _CompiledRules({})
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self.version = 0
+        self.denied = 0
+
+    def load(self, config: Dict):
+        """Compile a rule set and swap it in."""
+        self._rules = _CompiledRules(config)
+        self.version += 1
+
+    def reload(self) -> bool:
+        """Recompile from the rules file if it changed."""
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            with open(self.path) as f:
+                self.load(json.load(f))
+        except ValueError as exc:
+            # Keep serving the last good rule set.
+            logger.error("Invalid IP rules in %s: %s", self.path, exc)
+            return False
+        finally:
+            self._mtime = mtime
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self.path and now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload()
+
+    def is_allowed(self, info: ClientInfo) -> bool:
+        self._maybe_reload()
+        rules = self._rules
+        if info.address is None:
+            return rules.default_allow
+        decision = rules.access.lookup_int(info.address, info.version)
+        return rules.default_allow if decision is None else decision
+
+    def subnet_limit(self, info: ClientInfo) -> Optional[Tuple[str, int]]:
+        """(subnet, requests per minute) of the client's limit tier, if any."""
+        if info.address is None:
+            return None
+        return self._rules.limits.lookup_int(info.address, info.version)
+
+    def stats(self) -> dict:
+        return {
+            "rules": self._rules.size,
+            "version": self.version,
+            "denied": self.denied,
+            "connections": len(_connections),
+        }
+
+
+ip_rules = IpRules(os.getenv("IP_RULES_FILE") or None)
+metrics.register("ip_filter", ip_rules.stats)
+
+
+@traced_middleware("middleware.ip_filter")
+class IpFilterMiddleware(BaseHTTPMiddleware):
+    """
+    Reject clients by CIDR allow/deny lists.
+
+    Features:
+    - Longest-prefix match over IPv4 and IPv6 tries
+    - Hot reload of the rules file without restart
+    - 403 before any other middleware does work
+    """
+
+    def __init__(self, app, rules: Optional[IpRules] = None):
+        super().__init__(app)
+        self.rules = rules or ip_rules
+
+    async def dispatch(self, request: Request, call_next):
+        if not self.rules.is_allowed(client_info(request)):
+            self.rules.denied += 1
+            return JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content={
+                    "detail": {
+                        "error": "Forbidden",
+                        "message": "Client address is not allowed",
+                    }
+                },
+            )
+        return await call_next(request)
@@ -0,0 +1,443 @@
+"""
+Rate Limit Backends
+Author: Gabriel Demetrios Lafis
+
+Where token buckets live. A backend charges a set of buckets (one per
+limit window) atomically: either every bucket pays the cost or none
+does.
+
+- LocalBackend: in-process buckets; limits are per gateway process.
+  Optionally restored from a snapshot across restarts (see
+  rate_limit_snapshot)
+- RespBackend: buckets in a Redis-protocol server, shared by every
+  gateway host. Each charge is one server-side script call, and charges
+  from concurrent requests are pipelined into a single round trip.
+- LeasingBackend: wraps a remote backend; hot clients reserve a block
+  of tokens at once and spend it locally for a short time, skipping the
+  round trip on most requests. Unused leased tokens simply expire, so
+  leasing can under-admit but never over-admit.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.middleware.rate_limit_policy import Limit
+from src.middleware.rate_limit_snapshot import key_hash, limiter_snapshots
+from src.utils.resp import RespClient, RespError
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# (bucket key, limit) pairs charged together
+Buckets = Sequence[Tuple[str, Limit]]
+
+# Maximum number of buckets before triggering eviction
+_MAX_BUCKETS = 10_000
+# Time-to-live for idle buckets (10 minutes)
+_BUCKET_TTL_SECONDS = 600.0
+
+
+class ChargeResult(NamedTuple):
+    allowed: bool
+    # Tokens left per bucket, in the order charged
+    remaining: Tuple[int, ...]
+    # Seconds until the charge could succeed (0 if allowed)
+    retry_after: float
+    # Seconds until the first bucket is full again
+    reset: float
+
+
+class TokenBucket:
+    """Token bucket for rate limiting."""
+
+    def __init__(self, capacity: int, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.last_refill = time.time()
+        self.last_access = time.time()
+
+    def consume(self, tokens: int = 1) -> bool:
+        """Try to consume tokens."""
+        self._refill()
+        self.last_access = time.time()
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def _refill(self):
+        """Refill tokens based on time elapsed."""
+        now = time.time()
+        elapsed = now - self.last_refill
+        tokens_to_add = elapsed * self.refill_rate
+
+        self.tokens = min(self.capacity, self.tokens + tokens_to_add)
+        self.last_refill = now
+
+    def can_consume(self, tokens: int = 1) -> bool:
+        self._refill()
+        return self.tokens >= tokens
+
+    def seconds_until(self, tokens: float) -> float:
+        """Seconds until the bucket holds `tokens` tokens."""
+        self._refill()
+        return max(0.0, tokens - self.tokens) / self.refill_rate
+
+    def get_remaining(self) -> int:
+        """Get remaining tokens."""
+        self._refill()
+        return int(self.tokens)
+
+    def resize(self, capacity: int, refill_rate: float):
+        """Apply a changed limit without resetting the bucket."""
+        self._refill()
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = min(self.tokens, capacity)
+
+    def is_stale(self, ttl_seconds: float) -> bool:
+        """Check if this bucket has not been accessed within the TTL."""
+        return (time.time() - self.last_access) > ttl_seconds
+
+
+class LocalBackend:
+    """In-process token buckets with eviction of idle entries."""
+
+    name = "local"
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._last_eviction = time.time()
+        # Set by LimiterSnapshots: buckets then carry their key hash, and
+        # new ones are seeded from `snapshot` if it has them.
+        self.hash_keys = False
+        self.snapshot = None
+        self.restored = 0
+
+    def _evict_stale_buckets(self):
+        """Remove buckets that have not been accessed recently."""
+        now = time.time()
+        # Only run eviction at most once per minute
+        if now - self._last_eviction < 60:
+            return
+        self._last_eviction = now
+
+        stale_keys = [
+            key for key, bucket in self.buckets.items() if bucket.is_stale(_BUCKET_TTL_SECONDS)
+        ]
+        for key in stale_keys:
+            del self.buckets[key]
+
+    def _bucket(self, key: str, limit: Limit) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(
+                capacity=limit.capacity, refill_rate=limit.refill_rate
+            )
+            if self.hash_keys:
+                bucket.key_hash = key_hash(key)
+                if self.snapshot is not None:
+                    self._restore(bucket)
+        elif bucket.refill_rate != limit.refill_rate or (bucket.capacity != limit.capacity):
+            # The window's burst was reloaded; the bucket keeps its level
+            bucket.resize(limit.capacity, limit.refill_rate)
+        return bucket
+
+    def _restore(self, bucket: TokenBucket):
+        saved = self.snapshot.lookup(bucket.key_hash)
+        if saved is not None:
+            # The next refill credits the time elapsed since the save.
+            bucket.tokens = min(bucket.capacity, saved[0])
+            bucket.last_refill = min(saved[1], time.time())
+            self.restored += 1
+
+    async def charge(self, buckets: Buckets, cost: int) -> ChargeResult:
+        # Periodically evict stale buckets
+        if len(self.buckets) > _MAX_BUCKETS // 2:
+            self._evict_stale_buckets()
+
+        pairs = [(self._bucket(key, limit), limit) for key, limit in buckets]
+        allowed = all(bucket.can_consume(cost) for bucket, _ in pairs)
+        retry_after = 0.0
+        if allowed:
+            for bucket, _ in pairs:
+                bucket.consume(cost)
+        else:
+            retry_after = max(
+                min(bucket.seconds_until(cost), limit.period) for bucket, limit in pairs
+            )
+        first = pairs[0][0]
+        return ChargeResult(
+            allowed,
+            tuple(bucket.get_remaining() for bucket, _ in pairs),
+            retry_after,
+            first.seconds_until(first.capacity),
+        )
+
+    def reset(self):
+        self.buckets.clear()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "buckets": len(self.buckets)}
+
+
+# KEYS: bucket keys. ARGV: cost, then capacity and refill rate per key.
+# Replies are strings because Lua numbers are truncated to integers.
+CHARGE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+local allowed = 1
+local wait = 0
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[2 * i])
+  local rate = tonumber(ARGV[2 * i + 1])
+  local state = redis.call('HMGET', KEYS[i], 't', 'ts')
+  local level = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  level = math.min(capacity, level + math.max(0, now - ts) * rate)
+  levels[i] = level
+  if level < cost then
+    allowed = 0
+    wait = math.max(wait, (cost - level) / rate)
+  end
+end
+local reply = {allowed, tostring(wait)}
+for i = 1, #KEYS do
+  local capacity = tonumber(ARGV[2 * i])
+  local rate = tonumber(ARGV[2 * i + 1])
+  if allowed == 1 then
+    levels[i] = levels[i] - cost
+  end
+  redis.call('HSET', KEYS[i], 't', tostring(levels[i]), 'ts', tostring(now))
+  redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate * 1000) + 1000)
+  reply[#reply + 1] = tostring(levels[i])
+end
+return reply
+"""
+CHARGE_SCRIPT_SHA = hashlib.sha1(CHARGE_SCRIPT.encode(), usedforsecurity=False).hexdigest()
+
+
+class RespBackend:
+    """
+    Buckets in a Redis-protocol server, updated by an atomic script.
+
+    Charges made while a round trip is in flight are queued and sent
+    together as one pipeline when it returns. If the server cannot be
+    reached, charges fall back to per-process buckets.
+    """
+
+    name = "resp"
+
+    def __init__(
+        self,
+        client: RespClient,
+        prefix: str = "ratelimit:",
+        fallback: Optional[LocalBackend] = None,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or LocalBackend()
+        self._queue: List[Tuple[list, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self.charges = 0
+        self.errors = 0
+
+    def _command(self, buckets: Buckets, cost: int) -> list:
+        args = [cost]
+        for _, limit in buckets:
+            args += [limit.capacity, limit.refill_rate]
+        keys = [self.prefix + key for key, _ in buckets]
+        return [CHARGE_SCRIPT_SHA, len(keys), *keys, *args]
+
+    async def charge(self, buckets: Buckets, cost: int) -> ChargeResult:
+        self.charges += 1
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((self._command(buckets, cost), future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        try:
+            with tracer.span("rate_limit.backend"):
+                reply = await future
+        except Exception as exc:
+            self.errors += 1
+            logger.warning("Rate-limit backend unavailable, using local: %s", exc)
+            return await self.fallback.charge(buckets, cost)
+
+        allowed, wait, *levels = reply
+        first = buckets[0][1]
+        return ChargeResult(
+            allowed == 1,
+            tuple(max(0, int(float(level))) for level in levels),
+            min(float(wait), max(limit.period for _, limit in buckets)),
+            max(0.0, first.capacity - float(levels[0])) / first.refill_rate,
+        )
+
+    async def _flush(self):
+        while self._queue:
+            batch, self._queue = self._queue, []
+            try:
+                replies = await self._evaluate([command for command, _ in batch])
+            except Exception as exc:
+                # Any failure (I/O, AUTH/SELECT refused, a bad reply) must
+                # resolve the batch, or its requests hang with no fallback.
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, future), reply in zip(batch, replies):
+                if future.done():
+                    # The request was cancelled while waiting
+                    continue
+                if isinstance(reply, RespError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+
+    async def _evaluate(self, commands: List[tuple]) -> list:
+        replies = await self.client.pipeline([("EVALSHA", *command) for command in commands])
+        missing = [i for i, r in enumerate(replies) if _is_noscript(r)]
+        if missing:
+            # First use on this server: load the script and resend.
+            retried = await self.client.pipeline(
+                [("SCRIPT", "LOAD", CHARGE_SCRIPT)] + [("EVALSHA", *commands[i]) for i in missing]
+            )
+            for i, reply in zip(missing, retried[1:]):
+                replies[i] = reply
+        return replies
+
+    async def close(self):
+        await self.client.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "charges": self.charges,
+            "round_trips": self.client.round_trips,
+            "errors": self.errors,
+        }
+
+
+def _is_noscript(reply) -> bool:
+    return isinstance(reply, RespError) and str(reply).startswith("NOSCRIPT")
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires", "remaining")
+
+    def __init__(self, tokens: int, expires: float, remaining: Tuple[int, ...]):
+        self.tokens = tokens
+        self.expires = expires
+        self.remaining = remaining
+
+
+class LeasingBackend:
+    """
+    Local token leases in front of a remote backend.
+
+    A client becomes hot after `hot_threshold` charges within
+    `lease_ttl` seconds; from then on each remote charge reserves
+    `lease_size` tokens, spent locally until they run out or expire.
+    """
+
+    def __init__(
+        self,
+        inner: RespBackend,
+        lease_size: int = 10,
+        lease_ttl: float = 1.0,
+        hot_threshold: int = 5,
+        max_clients: int = 10_000,
+    ):
+        self.inner = inner
+        self.name = f"{inner.name}+lease"
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self.hot_threshold = hot_threshold
+        self.max_clients = max_clients
+        self._leases: "OrderedDict[Tuple[str, ...], _Lease]" = OrderedDict()
+        self._hits: "OrderedDict[Tuple[str, ...], List[float]]" = OrderedDict()
+        self.lease_hits = 0
+
+    def _is_hot(self, group: Tuple[str, ...], now: float) -> bool:
+        window = self._hits.get(group)
+        if window is None or now - window[0] > self.lease_ttl:
+            window = self._hits[group] = [now, 0]
+            if len(self._hits) > self.max_clients:
+                self._hits.popitem(last=False)
+        window[1] += 1
+        return window[1] >= self.hot_threshold
+
+    async def charge(self, buckets: Buckets, cost: int) -> ChargeResult:
+        group = tuple(key for key, _ in buckets)
+        now = time.monotonic()
+        lease = self._leases.get(group)
+        if lease is not None and lease.expires > now and lease.tokens >= cost:
+            lease.tokens -= cost
+            self.lease_hits += 1
+            first = buckets[0][1]
+            remaining = tuple(r + lease.tokens for r in lease.remaining)
+            return ChargeResult(
+                True,
+                remaining,
+                0.0,
+                max(0, first.capacity - remaining[0]) / first.refill_rate,
+            )
+
+        if cost >= self.lease_size or not self._is_hot(group, now):
+            return await self.inner.charge(buckets, cost)
+
+        result = await self.inner.charge(buckets, self.lease_size)
+        if not result.allowed:
+            # Not enough left for a whole lease; charge just this request
+            # and wait for the client to turn hot again before retrying.
+            self._leases.pop(group, None)
+            self._hits.pop(group, None)
+            return await self.inner.charge(buckets, cost)
+
+        self._leases[group] = _Lease(self.lease_size - cost, now + self.lease_ttl, result.remaining)
+        self._leases.move_to_end(group)
+        if len(self._leases) > self.max_clients:
+            self._leases.popitem(last=False)
+        return result._replace(
+            remaining=tuple(r + self.lease_size - cost for r in result.remaining)
+        )
+
+    async def close(self):
+        await self.inner.close()
+
+    def stats(self) -> dict:
+        return {
+            **self.inner.stats(),
+            "backend": self.name,
+            "leases": len(self._leases),
+            "lease_hits": self.lease_hits,
+        }
+
+
+def backend_from_env():
+    """
+    Backend chosen by RATE_LIMIT_BACKEND_URL (redis://host:port/db).
+
+    Without a URL, limits are kept per process (and snapshotted if
+    RATE_LIMIT_SNAPSHOT_FILE is set). RATE_LIMIT_LEASE_SIZE (default 0,
+    off) enables local token leases for hot clients.
+    """
+    url = os.getenv("RATE_LIMIT_BACKEND_URL")
+    if not url:
+        backend = LocalBackend()
+        if limiter_snapshots.path:
+            limiter_snapshots.attach(backend)
+        return backend
+    backend = RespBackend(RespClient.from_url(url))
+    lease_size = int(os.getenv("RATE_LIMIT_LEASE_SIZE", "0"))
+    if lease_size > 0:
+        return LeasingBackend(backend, lease_size=lease_size)
+    return backend
@@ -0,0 +1,134 @@
+"""
+Rate Limit Policies
+Author: Gabriel Demetrios Lafis
+
+Declarative rate-limit policies: every caller tier (anonymous, user,
+admin, API key) has one or more limits (e.g. per second and per day,
+each with its own burst size), and routes carry a cost weight so an
+expensive call such as a login spends more of the budget than a
+profile read.
+
+Route policies are keyed by route template ("POST /api/v1/auth/login",
+or "/path/{param}" for every method) and compiled once into a lookup
+table: static templates resolve with a single dict lookup, templated
+ones through compiled regexes whose results are memoized per path.
+"""
+
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from starlette.routing import compile_path
+
+TIERS = ("anonymous", "user", "admin", "api_key")
+
+# Templated paths whose resolved policy is memoized
+_MAX_CACHED_PATHS = 4096
+
+
+class Limit(NamedTuple):
+    """`requests` per `period` seconds, allowing bursts of `burst`."""
+
+    requests: int
+    period: float
+    burst: Optional[int] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.burst or self.requests
+
+    @property
+    def refill_rate(self) -> float:
+        return self.requests / self.period
+
+
+class RatePolicy(NamedTuple):
+    """
+    Cost of a route in tokens.
+
+    With `limits`, the route gets its own per-tier budget (keyed by
+    `name`) instead of drawing from the caller's shared one.
+    """
+
+    name: str = "default"
+    cost: int = 1
+    limits: Optional[Dict[str, Tuple[Limit, ...]]] = None
+
+
+def default_tier_limits(requests_per_minute: int = 60) -> Dict[str, Tuple[Limit, ...]]:
+    """
+    Limits per caller tier, scaled from the base per-minute rate.
+
+    The first limit of each tier is the one reported in the
+    X-RateLimit-* headers. API keys additionally get the per-minute
+    limit of their own key tier in front of these.
+    """
+    rpm = requests_per_minute
+    return {
+        "anonymous": (Limit(rpm, 60), Limit(rpm * 100, 86_400)),
+        "user": (
+            Limit(rpm * 2, 60),
+            Limit(max(1, rpm // 6), 1, burst=rpm // 2),
+            Limit(rpm * 500, 86_400),
+        ),
+        "admin": (Limit(rpm * 5, 60), Limit(max(1, rpm // 2), 1, burst=rpm)),
+        "api_key": (Limit(500, 1, burst=1000),),
+    }
+
+
+DEFAULT_ROUTE_POLICIES: Dict[str, RatePolicy] = {
+    # Each attempt costs a bcrypt hash
+    "POST /api/v1/auth/login": RatePolicy("auth", cost=5),
+    "POST /api/v1/auth/register": RatePolicy("auth", cost=5),
+    "POST /api/v1/auth/refresh": RatePolicy("auth", cost=2),
+    "POST /api/v1/auth/introspect": RatePolicy("introspect", cost=5),
+    "POST /api/v1/trading/orders": RatePolicy("orders", cost=2),
+    "POST /api/v1/trading/orders/batch": RatePolicy("orders", cost=10),
+    "GET /api/v1/trading/orders/export": RatePolicy("export", cost=10),
+    "GET /api/v1/trading/portfolio": RatePolicy("portfolio", cost=2),
+    "POST /api/v1/admin/keys/rotate": RatePolicy("admin", cost=10),
+}
+
+
+class RatePolicyTable:
+    """Route template -> RatePolicy lookup table."""
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, RatePolicy]] = None,
+        default: RatePolicy = RatePolicy(),
+    ):
+        self.default = default
+        self._static: Dict[Tuple[str, str], RatePolicy] = {}
+        self._templated = []
+        self._cache: "OrderedDict[Tuple[str, str], RatePolicy]" = OrderedDict()
+
+        for template, policy in (DEFAULT_ROUTE_POLICIES if policies is None else policies).items():
+            method, _, path = template.rpartition(" ")
+            method = method.upper() or "*"
+            if "{" in path:
+                regex, _, _ = compile_path(path)
+                self._templated.append((method, regex, policy))
+            else:
+                self._static[(method, path)] = policy
+
+    def __len__(self) -> int:
+        return len(self._static) + len(self._templated)
+
+    def lookup(self, method: str, path: str) -> RatePolicy:
+        key = (method, path)
+        policy = self._static.get(key) or self._static.get(("*", path))
+        if policy is not None:
+            return policy
+        if not self._templated:
+            return self.default
+
+        policy = self._cache.get(key)
+        if policy is None:
+            policy = next(
+                (p for m, regex, p in self._templated if m in ("*", method) and regex.match(path)),
+                self.default,
+            )
+            self._cache[key] = policy
+            if len(self._cache) > _MAX_CACHED_PATHS:
+                self._cache.popitem(last=False)
+        return policy
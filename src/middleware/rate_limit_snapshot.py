@@ -0,0 +1,196 @@
+"""
+Rate Limit Snapshots
+Author: Gabriel Demetrios Lafis
+
+Persists in-process token buckets across restarts so a deploy does not
+hand every client a fresh burst. The snapshot is a fixed-width binary
+file: a small header followed by (key hash, tokens, last refill) records
+sorted by key hash.
+
+Restoring is lazy. The file is memory-mapped at startup, which costs the
+same for 1M keys as for ten, and a bucket is seeded from its record the
+first time its key is seen, by binary search over the mapped hashes.
+Tokens then refill for the time elapsed since the record was written, as
+if the process had never stopped.
+
+Snapshots are written periodically in the background and on shutdown.
+Records for clients not seen since the last restart are carried over
+until they are older than `max_age`.
+
+Anonymous buckets are keyed by a hash of the client address (see
+ip_filter.ClientInfo), which only matches across restarts when
+CLIENT_ID_HASH_KEY is set. Without it, API-key and user buckets are
+restored but every anonymous client starts fresh, so a warning is
+logged at startup.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DTYPE = np.dtype([("key", "<u8"), ("tokens", "<f8"), ("updated", "<f8")])
+_MAGIC = b"RLSNAP01"
+# magic, record count, written at (epoch seconds)
+_HEADER = struct.Struct("<8sQd")
+
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit hash of a bucket key."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+def write_snapshot(path: str, records: np.ndarray, written_at: float):
+    """Atomically write records (SNAPSHOT_DTYPE, sorted by key) to path."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(records), written_at))
+        f.write(records.astype(SNAPSHOT_DTYPE, copy=False).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class BucketSnapshot:
+    """A memory-mapped snapshot file, searched by key hash."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            magic, count, self.written_at = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Not a rate-limit snapshot: {path}")
+        if count:
+            self.records = np.memmap(
+                path,
+                dtype=SNAPSHOT_DTYPE,
+                mode="r",
+                offset=_HEADER.size,
+                shape=(count,),
+            )
+        else:
+            self.records = np.empty(0, dtype=SNAPSHOT_DTYPE)
+        self.keys = self.records["key"]
+
+    @classmethod
+    def open(cls, path: str) -> Optional["BucketSnapshot"]:
+        try:
+            return cls(path)
+        except FileNotFoundError:
+            return None
+        except (ValueError, struct.error) as exc:
+            logger.warning("Ignoring rate-limit snapshot %s: %s", path, exc)
+            return None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def lookup(self, hashed: int) -> Optional[Tuple[float, float]]:
+        """(tokens, updated) saved for a key hash, if any."""
+        idx = int(np.searchsorted(self.keys, np.uint64(hashed)))
+        if idx < len(self.keys) and int(self.keys[idx]) == hashed:
+            record = self.records[idx]
+            return float(record["tokens"]), float(record["updated"])
+        return None
+
+
+class LimiterSnapshots:
+    """Restores a LocalBackend at startup and snapshots it periodically."""
+
+    def __init__(
+        self,
+        path: Optional[str],
+        interval: float = 60.0,
+        max_age: float = 86_400.0,
+        stable_client_ids: bool = True,
+    ):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self.stable_client_ids = stable_client_ids
+        self.backend = None
+        self._task: Optional[asyncio.Task] = None
+        self.saves = 0
+
+    def attach(self, backend):
+        """Seed `backend` from the snapshot file and save it from now on."""
+        self.backend = backend
+        backend.hash_keys = True
+        backend.snapshot = BucketSnapshot.open(self.path)
+        if self.path and not self.stable_client_ids:
+            logger.warning(
+                "RATE_LIMIT_SNAPSHOT_FILE is set without CLIENT_ID_HASH_KEY: "
+                "anonymous clients' buckets will not be restored after a restart"
+            )
+
+    def _records(self, buckets, now: float) -> np.ndarray:
+        live = np.empty(len(buckets), dtype=SNAPSHOT_DTYPE)
+        live["key"] = np.fromiter((b.key_hash for b in buckets), np.uint64, len(live))
+        live["tokens"] = np.fromiter((b.tokens for b in buckets), np.float64, len(live))
+        live["updated"] = np.fromiter((b.last_refill for b in buckets), np.float64, len(live))
+        previous = self.backend.snapshot
+        if previous is not None and len(previous):
+            # Keep recent records of clients not seen since the restore
+            old = np.asarray(previous.records)
+            keep = ~np.isin(old["key"], live["key"]) & (old["updated"] > now - self.max_age)
+            live = np.concatenate([live, old[keep]])
+        live.sort(order="key")
+        return live
+
+    def _write(self, buckets):
+        now = time.time()
+        write_snapshot(self.path, self._records(buckets, now), now)
+        self.backend.snapshot = BucketSnapshot.open(self.path)
+
+    async def save(self):
+        if self.backend is None or not self.path:
+            return
+        # Copy on the loop; pack and write in a thread.
+        buckets = list(self.backend.buckets.values())
+        await asyncio.to_thread(self._write, buckets)
+        self.saves += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except OSError as exc:
+                logger.error("Rate-limit snapshot failed: %s", exc)
+
+    def start(self):
+        if self.backend is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic task and write a final snapshot."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.save()
+
+    def stats(self) -> dict:
+        if self.backend is None:
+            return {"saves": self.saves, "restored": 0, "records": 0}
+        snapshot = self.backend.snapshot
+        return {
+            "saves": self.saves,
+            "restored": self.backend.restored,
+            "records": len(snapshot) if snapshot is not None else 0,
+        }
+
+
+limiter_snapshots = LimiterSnapshots(
+    os.getenv("RATE_LIMIT_SNAPSHOT_FILE") or None,
+    interval=float(os.getenv("RATE_LIMIT_SNAPSHOT_INTERVAL", "60")),
+    stable_client_ids=bool(os.getenv("CLIENT_ID_HASH_KEY")),
+)
+metrics.register("rate_limit_snapshot", limiter_snapshots.stats)
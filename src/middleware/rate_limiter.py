@@ -2,155 +2,265 @@
 Rate Limiter Middleware
 Author: Gabriel Demetrios Lafis
 
-Token bucket algorithm for in-memory rate limiting with automatic
-eviction of stale entries to prevent unbounded memory growth.
+Token bucket rate limiting. Buckets live in a pluggable backend (see
+rate_limit_backend): in process by default, or in a Redis-protocol
+server shared by every gateway host.
+
+Limits come from declarative policies (see rate_limit_policy): each
+caller tier has one or more windows, all checked in a single decision,
+and each route spends its cost weight from every window at once.
+
+Unauthenticated traffic is additionally limited per subnet (/24 for
+IPv4, /64 for IPv6, or a configured subnet tier), so a client rotating
+addresses inside one network still shares a budget.
+
+Limits and route costs come from the hot-reloadable gateway config
+(see utils.config) unless they are passed in explicitly. Buckets are
+keyed by their window's (requests, period), so a reload that reorders,
+adds or removes windows leaves the other windows' buckets untouched; a
+window whose numbers change starts a new bucket.
 """
 
-import hashlib
+import math
 import time
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from src.auth.api_keys import api_key_store
+from src.auth.jwt_handler import JWTHandler
+from src.middleware.ip_filter import client_info, ip_rules
+from src.middleware.rate_limit_backend import ChargeResult, backend_from_env
+from src.middleware.rate_limit_policy import (
+    Limit,
+    RatePolicy,
+    RatePolicyTable,
+    default_tier_limits,
+)
+from src.utils import metrics
+from src.utils.config import ConfigStore, RateLimitSettings, gateway_config
+from src.utils.tracing import traced_middleware
+from src.utils.traffic import traffic_analytics
+
+_SKIP_PATHS = frozenset(["/health", "/", "/api/docs", "/api/redoc", "/api/openapi.json"])
+_WINDOW_NAMES = {1: "second", 60: "minute", 3600: "hour", 86_400: "day"}
+
+
+class BucketGroup:
+    """
+    The caller's buckets for every applicable limit, charged together.
 
-class TokenBucket:
-    """Token bucket for rate limiting."""
+    A charge succeeds only if every bucket can pay it, so one decision
+    enforces all windows. The first limit is the one reported in the
+    X-RateLimit-* headers.
+    """
 
-    def __init__(self, capacity: int, refill_rate: float):
-        self.capacity = capacity
-        self.refill_rate = refill_rate
-        self.tokens = capacity
-        self.last_refill = time.time()
-        self.last_access = time.time()
+    def __init__(self, backend, entries: List[Tuple[str, Limit]], client: str = ""):
+        self.backend = backend
+        self.entries = entries
+        self.client = client
+        self.limit = entries[0][1]
+        self.result: Optional[ChargeResult] = None
 
-    def consume(self, tokens: int = 1) -> bool:
-        """Try to consume tokens."""
-        self._refill()
-        self.last_access = time.time()
+    async def consume(self, tokens: int = 1) -> bool:
+        self.result = await self.backend.charge(self.entries, tokens)
+        return self.result.allowed
 
-        if self.tokens >= tokens:
-            self.tokens -= tokens
-            return True
-        return False
+    def retry_after(self) -> int:
+        """Seconds until the last rejected charge could succeed."""
+        return math.ceil(self.result.retry_after)
 
-    def _refill(self):
-        """Refill tokens based on time elapsed."""
-        now = time.time()
-        elapsed = now - self.last_refill
-        tokens_to_add = elapsed * self.refill_rate
+    def get_remaining(self) -> int:
+        return self.result.remaining[0]
 
-        self.tokens = min(self.capacity, self.tokens + tokens_to_add)
-        self.last_refill = now
+    def headers(self) -> Dict[str, str]:
+        return {
+            "X-RateLimit-Limit": str(self.limit.requests),
+            "X-RateLimit-Remaining": str(self.get_remaining()),
+            "X-RateLimit-Reset": str(int(time.time()) + math.ceil(self.result.reset)),
+            "X-RateLimit-Policy": ", ".join(
+                f"{limit.requests};w={limit.period:g}" for _, limit in self.entries
+            ),
+        }
 
-    def get_remaining(self) -> int:
-        """Get remaining tokens."""
-        self._refill()
-        return int(self.tokens)
 
-    def is_stale(self, ttl_seconds: float) -> bool:
-        """Check if this bucket has not been accessed within the TTL."""
-        return (time.time() - self.last_access) > ttl_seconds
+class RouteCharger:
+    """
+    Charges further calls made on the caller's behalf (batch
+    sub-requests) under the same settings and identity as the request.
+    """
 
+    def __init__(self, middleware: "RateLimiterMiddleware", request: Request, settings):
+        self.middleware = middleware
+        self.request = request
+        self.settings = settings
 
-# Maximum number of buckets before triggering eviction
-_MAX_BUCKETS = 10_000
-# Time-to-live for idle buckets (10 minutes)
-_BUCKET_TTL_SECONDS = 600.0
+    def buckets(self, method: str, path: str) -> Tuple[BucketGroup, int]:
+        """The buckets a call to `method path` spends from, and its cost."""
+        policy = self.settings.policies.lookup(method, path)
+        group = self.middleware._get_buckets(self.request, policy, self.settings)
+        return group, policy.cost
 
 
+@traced_middleware("middleware.rate_limiter")
 class RateLimiterMiddleware(BaseHTTPMiddleware):
     """
     Rate limiter middleware using token bucket algorithm.
 
     Features:
     - Per-IP rate limiting
-    - Per-user rate limiting (if authenticated)
-    - Configurable limits
-    - Automatic eviction of stale buckets to prevent memory leaks
+    - Per-user rate limiting (if authenticated), with admin limits
+    - Per-API-key limits set by the key's tier
+    - Per-subnet limits for unauthenticated clients
+    - Several windows per tier (e.g. per second and per day)
+    - Per-route cost weights from a compiled policy table
+    - Local or shared (Redis-protocol) bucket storage
+    - Limits reloaded at runtime from the gateway config
     """
 
-    def __init__(self, app, requests_per_minute: int = 60):
+    def __init__(
+        self,
+        app,
+        requests_per_minute: Optional[int] = None,
+        subnet_multiplier: Optional[int] = None,
+        tier_limits: Optional[Dict[str, Tuple[Limit, ...]]] = None,
+        policies: Optional[RatePolicyTable] = None,
+        backend=None,
+        config: Optional[ConfigStore] = None,
+    ):
         super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.buckets: Dict[str, TokenBucket] = {}
-        self._last_eviction = time.time()
-
-        # Calculate refill rate (tokens per second)
-        self.refill_rate = requests_per_minute / 60.0
-
-    def _evict_stale_buckets(self):
-        """Remove buckets that have not been accessed recently."""
-        now = time.time()
-        # Only run eviction at most once per minute
-        if now - self._last_eviction < 60:
-            return
-        self._last_eviction = now
-
-        stale_keys = [
-            key
-            for key, bucket in self.buckets.items()
-            if bucket.is_stale(_BUCKET_TTL_SECONDS)
-        ]
-        for key in stale_keys:
-            del self.buckets[key]
+        self.config = config or gateway_config
+        # Explicit settings pin the limiter; otherwise it follows reloads
+        self.pinned: Optional[RateLimitSettings] = None
+        if any(
+            arg is not None
+            for arg in (requests_per_minute, subnet_multiplier, tier_limits, policies)
+        ):
+            current = self.config.current.rate_limit
+            rpm = requests_per_minute or current.requests_per_minute
+            if tier_limits is None:
+                # Pinning only other settings keeps the configured tiers
+                tier_limits = (
+                    current.tier_limits if requests_per_minute is None else default_tier_limits(rpm)
+                )
+            self.pinned = RateLimitSettings(
+                rpm,
+                subnet_multiplier or current.subnet_multiplier,
+                tier_limits,
+                policies or current.policies,
+            )
+        self.backend = backend or backend_from_env()
+        metrics.register("rate_limit_backend", self.backend.stats)
 
     async def dispatch(self, request: Request, call_next):
-        # Skip rate limiting for health checks and docs
-        if request.url.path in [
-            "/health",
-            "/",
-            "/api/docs",
-            "/api/redoc",
-            "/api/openapi.json",
-        ]:
+        # Skip rate limiting for health checks and docs, and for batch
+        # sub-requests, which the batch call has already paid for
+        if request.url.path in _SKIP_PATHS or getattr(request.state, "rate_limit_prepaid", False):
             return await call_next(request)
 
-        # Periodically evict stale buckets
-        if len(self.buckets) > _MAX_BUCKETS // 2:
-            self._evict_stale_buckets()
-
-        # Get client identifier
-        client_id = self._get_client_id(request)
-
-        # Get or create token bucket
-        if client_id not in self.buckets:
-            self.buckets[client_id] = TokenBucket(
-                capacity=self.requests_per_minute, refill_rate=self.refill_rate
-            )
-
-        bucket = self.buckets[client_id]
-
-        # Try to consume a token
-        if not bucket.consume():
-            raise HTTPException(
+        settings = self.pinned or self.config.current.rate_limit
+        policy = settings.policies.lookup(request.method, request.url.path)
+        group = self._get_buckets(request, policy, settings)
+        # Expose the buckets so handlers can charge additional cost
+        request.state.rate_limit_bucket = group
+        request.state.rate_limit_charger = RouteCharger(self, request, settings)
+
+        if not await group.consume(policy.cost):
+            traffic_analytics.record_throttled(group.client)
+            retry_after = group.retry_after()
+            window = _WINDOW_NAMES.get(group.limit.period, f"{group.limit.period:g}s")
+            return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "Rate limit exceeded",
-                    "message": (
-                        f"Too many requests. Limit: {self.requests_per_minute} "
-                        "requests per minute"
-                    ),
-                    "retry_after": 60,
+                content={
+                    "detail": {
+                        "error": "Rate limit exceeded",
+                        "message": (
+                            f"Too many requests. Limit: {group.limit.requests} "
+                            f"requests per {window}"
+                        ),
+                        "retry_after": retry_after,
+                    }
                 },
+                headers={"Retry-After": str(retry_after), **group.headers()},
             )
 
+        traffic_analytics.record_client(group.client, policy.cost)
+
         # Add rate limit headers
         response = await call_next(request)
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(bucket.get_remaining())
-        response.headers["X-RateLimit-Reset"] = str(int(time.time()) + 60)
-
+        response.headers.update(group.headers())
         return response
 
-    def _get_client_id(self, request: Request) -> str:
-        """Get unique client identifier."""
-        # Try to get user ID from request state (if authenticated)
-        if hasattr(request.state, "user_id"):
-            return f"user:{request.state.user_id}"
-
-        # Fall back to IP address
-        client_ip = request.client.host if request.client else "unknown"
+    def _get_buckets(
+        self, request: Request, policy: RatePolicy, settings: RateLimitSettings
+    ) -> BucketGroup:
+        """Get or create the caller's buckets for the route's policy."""
+        tier, client_id, limits = self._get_caller(request, settings.tier_limits)
+        # Analytics name anonymous callers by address, not by hashed id
+        client = client_id if tier != "anonymous" else f"ip:{client_info(request).host}"
+        if policy.limits is not None and tier in policy.limits:
+            # The route has its own budget, separate from the shared one
+            client_id = f"{client_id}:{policy.name}"
+            limits = policy.limits[tier]
+
+        entries = [(f"{client_id}:{limit.requests}/{limit.period:g}", limit) for limit in limits]
+        if tier == "anonymous":
+            subnet = self._get_subnet_bucket(request, settings)
+            if subnet is not None:
+                entries.append(subnet)
+        return BucketGroup(self.backend, entries, client)
+
+    @classmethod
+    def _get_caller(
+        cls, request: Request, tier_limits: Dict[str, Tuple[Limit, ...]]
+    ) -> Tuple[str, str, Tuple[Limit, ...]]:
+        """Return the caller's (tier, client id, limits)."""
+        api_key = request.headers.get("x-api-key")
+        record = api_key_store.resolve(api_key) if api_key else None
+        if record is not None:
+            limits = (Limit(record.requests_per_minute, 60),)
+            return (
+                "api_key",
+                f"apikey:{record.key_id}",
+                limits + tier_limits["api_key"],
+            )
 
-        # Hash IP for privacy
-        return hashlib.sha256(client_ip.encode()).hexdigest()[:16]
+        user = cls._get_bearer_user(request)
+        if user is not None:
+            tier = "admin" if user.get("is_admin") else "user"
+            return tier, f"user:{user.get('user_id')}", tier_limits[tier]
+
+        # Fall back to the IP address, hashed once per connection
+        client_id = client_info(request).client_id
+        return "anonymous", client_id, tier_limits["anonymous"]
+
+    @staticmethod
+    def _get_bearer_user(request: Request) -> Optional[dict]:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            # Verified tokens are cached, so the route's own check is free
+            payload = JWTHandler.verify_token(token)
+        except HTTPException:
+            return None
+        # Refresh tokens do not authenticate API calls
+        return payload if payload.get("type") == "access" else None
+
+    @staticmethod
+    def _get_subnet_bucket(request: Request, settings: RateLimitSettings):
+        """Bucket shared by the client's subnet (None for non-IP clients)."""
+        info = client_info(request)
+        if info.address is None:
+            return None
+
+        tier = ip_rules.subnet_limit(info)
+        if tier is not None:
+            key, limit = f"net:{tier[0]}", Limit(tier[1], 60)
+        else:
+            host_bits = 8 if info.version == 4 else 64
+            key = f"net{info.version}:{info.address >> host_bits}"
+            limit = Limit(settings.requests_per_minute * settings.subnet_multiplier, 60)
+        return key, limit
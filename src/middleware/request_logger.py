@@ -3,7 +3,8 @@ Request Logger Middleware
 Author: Gabriel Demetrios Lafis
 
 Logs incoming HTTP requests with method, path, status code, and duration.
-Adds X-Request-ID and X-Process-Time headers to every response.
+Adds X-Request-ID and X-Process-Time headers to every response, and
+counts each request toward the top-routes table.
 """
 
 import logging
@@ -13,9 +14,13 @@ import uuid
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from src.utils.tracing import traced_middleware
+from src.utils.traffic import traffic_analytics
+
 logger = logging.getLogger("api.requests")
 
 
+@traced_middleware("middleware.request_logger")
 class RequestLoggerMiddleware(BaseHTTPMiddleware):
     """Middleware that logs every request and adds tracing headers."""
 
@@ -27,6 +32,8 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         process_time = time.time() - start_time
 
+        traffic_analytics.record_route(request.method, request.url.path)
+
         # Log the request
         client_ip = request.client.host if request.client else "unknown"
         logger.info(
@@ -0,0 +1,217 @@
+"""
+Priority Scheduler
+Author: Gabriel Demetrios Lafis
+
+Admission scheduling in front of the adaptive concurrency limit. When
+the limit is reached, requests wait in a bounded queue for their route's
+priority class instead of being shed immediately. Freed slots go to the
+highest-priority class first; within a class tenants are served
+round-robin (weighted), so one noisy client cannot monopolise a class.
+Tenants are callers as the gateway authenticates them ("apikey:<id>",
+"user:<id>", else "ip:<address>"), which is how `tenant_weights` is
+keyed.
+
+A waiter whose request is cancelled while queued (e.g. the client
+disconnected) leaves its queue at once; if a slot was handed to it in
+the same instant, the slot is given back.
+
+Each class has its own queue bound and wait deadline. Lower classes
+have shorter queues and deadlines, so under overload they are dropped
+first while latency-critical trading traffic keeps flowing.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from src.middleware.concurrency_limiter import AdaptiveConcurrencyLimit
+
+
+class PriorityClass:
+    """A scheduling class with its own queue bound and wait deadline."""
+
+    def __init__(self, name: str, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.tenants: "OrderedDict[str, deque]" = OrderedDict()
+        self.queued = 0
+        self.admitted = 0
+        self.dropped_full = 0
+        self.dropped_deadline = 0
+
+
+# Default classes, highest priority first
+DEFAULT_CLASSES = (
+    ("critical", 1000, 1.0),
+    ("standard", 500, 0.5),
+    ("background", 100, 0.25),
+)
+
+# Route prefix -> class name (longest prefix wins)
+DEFAULT_ROUTE_CLASSES = {
+    "/api/v1/trading": "critical",
+    "/api/v1/users": "standard",
+    "/api/v1/batch": "standard",
+    "/api/v1/auth": "background",
+    # Other services block on introspection; keep it out of the auth class.
+    "/api/v1/auth/introspect": "standard",
+    "/api/v1/admin": "background",
+}
+
+
+class _Waiter:
+    __slots__ = ("future", "deadline", "tenant")
+
+    def __init__(self, future: asyncio.Future, deadline: float, tenant: str):
+        self.future = future
+        self.deadline = deadline
+        self.tenant = tenant
+
+
+class PriorityScheduler:
+    """Priority classes with weighted round-robin across tenants."""
+
+    def __init__(
+        self,
+        limit: "AdaptiveConcurrencyLimit",
+        classes: Tuple = DEFAULT_CLASSES,
+        route_classes: Optional[Dict[str, str]] = None,
+        default_class: str = "standard",
+        tenant_weights: Optional[Dict[str, int]] = None,
+    ):
+        self.limit = limit
+        self.classes: List[PriorityClass] = [PriorityClass(*c) for c in classes]
+        by_name = {c.name: i for i, c in enumerate(self.classes)}
+        routes = route_classes or DEFAULT_ROUTE_CLASSES
+        self._routes = sorted(
+            ((prefix, by_name[name]) for prefix, name in routes.items()),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self._default = by_name[default_class]
+        self.tenant_weights = tenant_weights or {}
+        self._credits: Dict[str, int] = {}
+        self.waiting = 0
+
+    def classify(self, path: str) -> int:
+        """Return the priority class index for a request path."""
+        for prefix, idx in self._routes:
+            if path.startswith(prefix):
+                return idx
+        return self._default
+
+    async def acquire(self, class_idx: int, tenant: str) -> bool:
+        """
+        Take a concurrency slot, queueing if none is free.
+
+        Returns False if the request was shed (queue full or deadline
+        passed); the caller must then not call release().
+        """
+        cls = self.classes[class_idx]
+        if self.waiting == 0 and self.limit.try_acquire():
+            cls.admitted += 1
+            return True
+
+        if cls.queued >= cls.max_queue:
+            cls.dropped_full += 1
+            return False
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), time.monotonic() + cls.max_wait, tenant)
+        cls.tenants.setdefault(tenant, deque()).append(waiter)
+        cls.queued += 1
+        self.waiting += 1
+
+        timer = loop.call_later(cls.max_wait, self._expire, cls, waiter)
+        try:
+            admitted = await waiter.future
+        except asyncio.CancelledError:
+            future = waiter.future
+            if future.done() and not future.cancelled() and future.result():
+                # Admitted just as the request was cancelled
+                self.limit.abandon()
+                self._dispatch()
+            else:
+                self._remove(cls, waiter)
+            raise
+        finally:
+            timer.cancel()
+        if admitted:
+            cls.admitted += 1
+        return admitted
+
+    def release(self, latency: Optional[float], route: str = "default"):
+        """Return a slot to the limit and admit queued requests."""
+        self.limit.release(latency, route)
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self.waiting and self.limit.has_capacity():
+            waiter = self._next_waiter(now)
+            if waiter is None:
+                return
+            self.limit.try_acquire()
+            waiter.future.set_result(True)
+
+    def _next_waiter(self, now: float) -> Optional[_Waiter]:
+        for cls in self.classes:
+            while cls.queued:
+                waiter = self._pop(cls)
+                if waiter.future.done():
+                    continue
+                if waiter.deadline > now:
+                    return waiter
+                # Deadline already passed: drop rather than admit late.
+                cls.dropped_deadline += 1
+                waiter.future.set_result(False)
+        return None
+
+    def _pop(self, cls: PriorityClass) -> _Waiter:
+        tenant, queue = next(iter(cls.tenants.items()))
+        waiter = queue.popleft()
+        cls.queued -= 1
+        self.waiting -= 1
+
+        credits = self._credits.get(tenant, self.tenant_weights.get(tenant, 1)) - 1
+        if not queue:
+            del cls.tenants[tenant]
+            self._credits.pop(tenant, None)
+        elif credits <= 0:
+            cls.tenants.move_to_end(tenant)
+            self._credits.pop(tenant, None)
+        else:
+            self._credits[tenant] = credits
+        return waiter
+
+    def _remove(self, cls: PriorityClass, waiter: _Waiter) -> bool:
+        """Take a waiter out of its queue; False if it was already popped."""
+        queue = cls.tenants.get(waiter.tenant)
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        if not queue:
+            del cls.tenants[waiter.tenant]
+            self._credits.pop(waiter.tenant, None)
+        cls.queued -= 1
+        self.waiting -= 1
+        return True
+
+    def _expire(self, cls: PriorityClass, waiter: _Waiter):
+        if self._remove(cls, waiter) and not waiter.future.done():
+            cls.dropped_deadline += 1
+            waiter.future.set_result(False)
+
+    def stats(self) -> dict:
+        return {
+            cls.name: {
+                "queued": cls.queued,
+                "admitted": cls.admitted,
+                "dropped_full": cls.dropped_full,
+                "dropped_deadline": cls.dropped_deadline,
+            }
+            for cls in self.classes
+        }
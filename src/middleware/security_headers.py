@@ -2,29 +2,33 @@
 Security Headers Middleware
 Author: Gabriel Demetrios Lafis
 
-Adds OWASP-recommended security headers to all HTTP responses.
+Adds OWASP-recommended security headers to all HTTP responses. The
+header set comes from the hot-reloadable gateway config (see
+utils.config), compiled once per reload into name/value pairs.
 """
 
+from typing import Optional
+
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from src.utils.config import ConfigStore, gateway_config
+from src.utils.tracing import traced_middleware
+
 
+@traced_middleware("middleware.security_headers")
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """Add security headers to all responses."""
 
+    def __init__(self, app, config: Optional[ConfigStore] = None):
+        super().__init__(app)
+        self.config = config or gateway_config
+
     async def dispatch(self, request: Request, call_next):
+        headers = self.config.current.security_headers
         response = await call_next(request)
 
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = (
-            "max-age=31536000; includeSubDomains"
-        )
-        response.headers["Content-Security-Policy"] = "default-src 'self'"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = (
-            "camera=(), microphone=(), geolocation=()"
-        )
+        for name, value in headers:
+            response.headers[name] = value
 
         return response
@@ -0,0 +1,46 @@
+"""
+Tracing Middleware
+Author: Gabriel Demetrios Lafis
+
+Opens the root span of every HTTP request, continuing the caller's
+trace when a valid `traceparent` header is present, and answers with a
+`traceresponse` header naming the trace and root span.
+"""
+
+from typing import Optional
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src.utils.tracing import (
+    TRACEPARENT,
+    TRACERESPONSE,
+    Tracer,
+    format_traceparent,
+)
+from src.utils.tracing import tracer as shared_tracer
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """Start and finish a trace around each request."""
+
+    def __init__(self, app, tracer: Optional[Tracer] = None):
+        super().__init__(app)
+        self.tracer = tracer or shared_tracer
+
+    async def dispatch(self, request: Request, call_next):
+        root, token = self.tracer.start_trace(
+            request.headers.get(TRACEPARENT),
+            f"{request.method} {request.url.path}",
+            **{"http.method": request.method, "http.target": request.url.path},
+        )
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            self.tracer.finish_trace(root, token, status_code)
+        response.headers[TRACERESPONSE] = format_traceparent(
+            root.trace.trace_id, root.span_id, root.trace.sampled
+        )
+        return response
@@ -2,15 +2,52 @@
 Admin Routes
 Author: Gabriel Demetrios Lafis
 
-Administrative endpoints for user management.
+Administrative endpoints for user management and metrics.
 """
 
-from fastapi import APIRouter, Depends
+import asyncio
+from typing import List, Literal, Optional
 
-from src.auth.jwt_handler import get_current_admin_user
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel, Field
+
+from src.auth.api_keys import SCOPES, TIERS, api_key_store
+from src.auth.jwt_handler import get_current_admin_user, get_current_user, key_ring
+from src.middleware.ip_filter import ip_rules
 from src.routes.auth_routes import users_db
+from src.utils import metrics
+from src.utils.audit import audit, audit_log
+from src.utils.config import gateway_config
+from src.utils.deadlines import DeadlineRoute
+from src.utils.loop_monitor import loop_monitor
+from src.utils.tracing import tracer
+from src.utils.traffic import traffic_analytics
+
+
+async def audit_admin_access(request: Request, current_user: dict = Depends(get_current_user)):
+    """Record every authenticated call to an admin route, allowed or not."""
+    await audit(
+        request,
+        "admin_access",
+        "success" if current_user.get("is_admin") else "denied",
+        user=current_user,
+        method=request.method,
+        path=request.url.path,
+    )
+
+
+router = APIRouter(route_class=DeadlineRoute, dependencies=[Depends(audit_admin_access)])
 
-router = APIRouter()
+
+class RotateKeyRequest(BaseModel):
+    algorithm: Optional[Literal["HS256", "RS256", "EdDSA"]] = None
+
+
+class CreateApiKeyRequest(BaseModel):
+    user_id: int
+    name: str = Field(..., min_length=1, max_length=100)
+    scopes: List[Literal[tuple(sorted(SCOPES))]] = Field(..., min_length=1)
+    tier: Literal[tuple(TIERS)] = "standard"
 
 
 @router.get("/users")
@@ -35,3 +72,181 @@ async def list_users(current_user: dict = Depends(get_current_admin_user)):
         "total": len(users),
         "admin": current_user["username"],
     }
+
+
+@router.get("/traffic/top")
+async def top_traffic(
+    n: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_admin_user),
+):
+    """
+    Heaviest clients, routes and rate-limited clients over the rolling
+    window (admin only).
+
+    Counts are approximate: each may over-estimate by up to `error`.
+    """
+    return traffic_analytics.top(n)
+
+
+@router.get("/audit")
+async def query_audit_log(
+    user_id: Optional[int] = None,
+    since: Optional[float] = Query(None, description="Unix time, inclusive"),
+    until: Optional[float] = Query(None, description="Unix time, inclusive"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_admin_user),
+):
+    """
+    Audit records for a user and/or time range, newest first (admin only).
+    """
+    if not audit_log.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audit log is disabled")
+    records = await asyncio.to_thread(audit_log.query, user_id, since, until, limit)
+    return {"records": records, "total": len(records)}
+
+
+@router.get("/audit/verify")
+async def verify_audit_log(current_user: dict = Depends(get_current_admin_user)):
+    """
+    Check the audit log's hash chain end to end (admin only).
+    """
+    if not audit_log.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audit log is disabled")
+    return await asyncio.to_thread(audit_log.verify)
+
+
+@router.get("/traces")
+async def recent_traces(
+    min_ms: float = Query(0.0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    current_user: dict = Depends(get_current_admin_user),
+):
+    """
+    Recently kept request traces, newest first (admin only).
+
+    Each span carries its offset from the start of the request, its
+    duration and its self time (duration minus child spans).
+    """
+    return {"traces": tracer.recent(min_ms, limit), **tracer.stats()}
+
+
+@router.get("/event-loop")
+async def event_loop_health(
+    limit: int = Query(20, ge=1, le=50),
+    current_user: dict = Depends(get_current_admin_user),
+):
+    """
+    Event-loop lag histogram and the stacks caught blocking the loop,
+    most recent first (admin only).
+    """
+    return {**loop_monitor.stats(), "blocking": loop_monitor.blocking(limit)}
+
+
+@router.get("/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_admin_user)):
+    """
+    Return counters from every registered metric source (admin only).
+    """
+    return metrics.collect()
+
+
+@router.post("/keys/rotate")
+async def rotate_signing_key(
+    request: RotateKeyRequest,
+    current_user: dict = Depends(get_current_admin_user),
+):
+    """
+    Activate a new JWT signing key (admin only).
+
+    Defaults to the active key's algorithm. Tokens signed with previous
+    keys keep verifying until those keys are retired.
+    """
+    algorithm = request.algorithm or key_ring.signing_key().algorithm
+    try:
+        key = key_ring.rotate(algorithm)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return {"kid": key.kid, "algorithm": key.algorithm, **key_ring.stats()}
+
+
+@router.post("/api-keys", status_code=status.HTTP_201_CREATED)
+async def create_api_key(
+    request: CreateApiKeyRequest,
+    current_user: dict = Depends(get_current_admin_user),
+):
+    """
+    Issue an API key for a user (admin only).
+
+    The plaintext key is returned only in this response.
+    """
+    user = next((u for u in users_db.values() if u["user_id"] == request.user_id), None)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    raw_key, record = api_key_store.create(user, request.name, request.scopes, request.tier)
+    return {"api_key": raw_key, **record.to_dict()}
+
+
+@router.get("/api-keys")
+async def list_api_keys(current_user: dict = Depends(get_current_admin_user)):
+    """
+    List API keys without their secrets (admin only).
+    """
+    keys = api_key_store.list()
+    return {"api_keys": keys, "total": len(keys)}
+
+
+@router.delete("/api-keys/{key_id}")
+async def revoke_api_key(key_id: str, current_user: dict = Depends(get_current_admin_user)):
+    """
+    Revoke an API key immediately (admin only).
+    """
+    if not api_key_store.revoke(key_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="API key not found")
+    return {"key_id": key_id, "active": False}
+
+
+@router.get("/config")
+async def get_config(current_user: dict = Depends(get_current_admin_user)):
+    """
+    The gateway config in effect, with its version and digest (admin only).
+    """
+    return {**gateway_config.current.to_dict(), "store": gateway_config.stats()}
+
+
+@router.post("/config/reload")
+async def reload_config(request: Request, current_user: dict = Depends(get_current_admin_user)):
+    """
+    Reload the gateway config file and swap it in (admin only).
+
+    An invalid file is rejected with 422 and the running config is kept.
+    Applies to the worker serving this request; send SIGHUP to the
+    launcher to reload every worker.
+    """
+    if not gateway_config.path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No config file is configured",
+        )
+    previous = gateway_config.current.version
+    try:
+        config = gateway_config.reload()
+    except ValueError as exc:
+        await audit(request, "config_reload", "failure", user=current_user)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"error": "Invalid config", "message": str(exc)},
+        )
+    await audit(request, "config_reload", user=current_user, version=config.version)
+    return {
+        "previous_version": previous,
+        "version": config.version,
+        "digest": config.digest,
+    }
+
+
+@router.post("/ip-rules/reload")
+async def reload_ip_rules(current_user: dict = Depends(get_current_admin_user)):
+    """
+    Recompile the IP allow/deny rules from the rules file now (admin only).
+    """
+    return {"reloaded": ip_rules.reload(), **ip_rules.stats()}
@@ -5,12 +5,21 @@ Author: Gabriel Demetrios Lafis
 Routes for user authentication and authorization.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr, Field
 
-from src.auth.jwt_handler import JWTHandler, get_current_user
+from src.auth.jwt_handler import JWTHandler, get_current_user, require_scope
+from src.auth.login_throttle import login_throttle
+from src.auth.service_auth import get_current_service
+from src.utils.audit import audit
+from src.utils.deadlines import DeadlineRoute, deadline
+
+router = APIRouter(route_class=DeadlineRoute)
 
-router = APIRouter()
+# Maximum tokens per introspection call
+MAX_INTROSPECT_TOKENS = 1000
 
 # In-memory user database (for demo purposes)
 users_db = {
@@ -56,29 +65,56 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 
+class IntrospectRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, max_length=MAX_INTROSPECT_TOKENS)
+
+
 @router.post("/login", response_model=TokenResponse)
-async def login(request: LoginRequest):
+@deadline(5.0)
+async def login(request: LoginRequest, http_request: Request):
     """
     Login endpoint
 
-    Returns JWT access and refresh tokens.
+    Returns JWT access and refresh tokens. Accounts and subnets with
+    repeated failures are throttled with 429 before any password hashing.
     """
-    # Find user
-    user = users_db.get(request.email)
-
-    if not user:
+    client_host = http_request.client.host if http_request.client else "unknown"
+    retry_after = login_throttle.retry_after(request.email, client_host)
+    if retry_after:
+        seconds = max(1, int(retry_after + 0.999))
+        # Non-durable (queued, no fsync wait): a throttled attempt must stay cheap
+        await audit(http_request, "login", "throttled", actor=request.email, durable=False)
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "Too many failed logins",
+                "message": "Login temporarily blocked. Retry later.",
+                "retry_after": seconds,
+            },
+            headers={"Retry-After": str(seconds)},
         )
 
+    # Find user
+    user = users_db.get(request.email)
+
     # Verify password
-    if not JWTHandler.verify_password(request.password, user["password_hash"]):
+    if not user or not JWTHandler.verify_password(request.password, user["password_hash"]):
+        login_throttle.record_failure(request.email, client_host)
+        await audit(
+            http_request,
+            "login",
+            "failure",
+            user=user,
+            actor=request.email,
+            durable=False,
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         )
 
     # Check if user is active
     if not user["is_active"]:
+        await audit(http_request, "login", "inactive", user=user)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="User account is inactive"
         )
@@ -93,14 +129,14 @@ async def login(request: LoginRequest):
 
     access_token = JWTHandler.create_access_token(token_data)
     refresh_token = JWTHandler.create_refresh_token({"user_id": user["user_id"]})
+    await audit(http_request, "login", user=user)
 
     return TokenResponse(access_token=access_token, refresh_token=refresh_token)
 
 
-@router.post(
-    "/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED
-)
-async def register(request: RegisterRequest):
+@router.post("/register", response_model=TokenResponse, status_code=status.HTTP_201_CREATED)
+@deadline(5.0)
+async def register(request: RegisterRequest, http_request: Request):
     """
     Register new user
 
@@ -108,9 +144,8 @@ async def register(request: RegisterRequest):
     """
     # Check if email already exists
     if request.email in users_db:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Email already registered"
-        )
+        await audit(http_request, "register", "conflict", actor=request.email)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
 
     # Create new user
     new_user_id = max([u["user_id"] for u in users_db.values()]) + 1 if users_db else 1
@@ -125,6 +160,7 @@ async def register(request: RegisterRequest):
     }
 
     users_db[request.email] = new_user
+    await audit(http_request, "register", user=new_user)
 
     # Create tokens
     token_data = {
@@ -141,29 +177,31 @@ async def register(request: RegisterRequest):
 
 
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(request: RefreshTokenRequest):
+async def refresh_token(request: RefreshTokenRequest, http_request: Request):
     """
     Refresh access token
 
     Uses refresh token to generate a new access token.
     """
     # Verify refresh token
-    payload = JWTHandler.verify_token(request.refresh_token)
+    try:
+        payload = JWTHandler.verify_token(request.refresh_token)
+    except HTTPException:
+        await audit(http_request, "refresh", "invalid_token")
+        raise
 
     # Verify token type
     if payload.get("type") != "refresh":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token type"
-        )
+        await audit(http_request, "refresh", "invalid_token_type", user=payload)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token type")
 
     # Find user
     user_id = payload.get("user_id")
     user = next((u for u in users_db.values() if u["user_id"] == user_id), None)
 
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
-        )
+        await audit(http_request, "refresh", "unknown_user", user=payload)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
     # Create new access token
     token_data = {
@@ -174,12 +212,15 @@ async def refresh_token(request: RefreshTokenRequest):
     }
 
     access_token = JWTHandler.create_access_token(token_data)
+    await audit(http_request, "refresh", user=user)
 
     return TokenResponse(access_token=access_token, refresh_token=request.refresh_token)
 
 
 @router.get("/me")
-async def get_current_user_info(current_user: dict = Depends(get_current_user)):
+async def get_current_user_info(
+    current_user: dict = Depends(require_scope("auth:read")),
+):
     """
     Get current user information
 
@@ -194,10 +235,38 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
 
 
 @router.post("/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
+async def logout(request: Request, current_user: dict = Depends(get_current_user)):
     """
     Logout endpoint
 
-    In a production system, this would invalidate the token.
+    Revokes the access token used for this call on every worker. API
+    keys are not logged out; revoke them through the admin API-key
+    endpoint.
     """
+    if current_user.get("auth") == "api_key":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="API keys cannot log out; revoke the key via /api/v1/admin/api-keys",
+        )
+    JWTHandler.revoke_token(current_user)
+    await audit(request, "logout", user=current_user)
     return {"message": "Successfully logged out", "user_id": current_user["user_id"]}
+
+
+@router.post("/introspect")
+async def introspect_tokens(
+    request: IntrospectRequest, service: str = Depends(get_current_service)
+):
+    """
+    Introspect a batch of tokens (service credentials only)
+
+    Each token goes through the same verified-token cache and revocation
+    check as a normal request. Results are returned in request order.
+    """
+    results = []
+    for token in request.tokens:
+        try:
+            results.append({"active": True, "claims": JWTHandler.verify_token(token)})
+        except HTTPException as exc:
+            results.append({"active": False, "error": exc.detail})
+    return {"results": results, "service": service}
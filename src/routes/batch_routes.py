@@ -0,0 +1,200 @@
+"""
+Batch Routes
+Author: Gabriel Demetrios Lafis
+
+Executes several API sub-requests in one call. The caller is
+authenticated once for the batch; sub-requests are dispatched
+concurrently in process (no extra HTTP hop) and reuse the verified token
+from the token cache. Each sub-request runs under its own route
+deadline, capped by what remains of the batch's.
+
+Sub-requests enter the middleware stack below its transport-level
+layers (CORS and the tracing root span), so IP filtering, the
+concurrency limiter, the circuit breaker and idempotency apply to them
+as to a direct call. A sub-request may carry its own `idempotency_key`;
+an Idempotency-Key on the batch call replays the whole batch.
+
+Sub-requests are rate limited as if they had been called directly: each
+spends its route's cost from the buckets that route uses (including
+route-specific budgets), on top of what the batch call itself paid. The
+whole batch is charged up front, so the rate limiter lets its
+sub-requests through without charging them again.
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import BaseModel, Field
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from src.auth.jwt_handler import get_current_user
+from src.middleware.ip_filter import IpFilterMiddleware
+from src.utils.deadlines import DeadlineRoute, deadline, deadline_headers
+from src.utils.tracing import tracer
+
+router = APIRouter(route_class=DeadlineRoute)
+
+# Maximum sub-requests per batch
+MAX_BATCH_REQUESTS = 10
+# Maximum sub-requests executing at the same time
+MAX_BATCH_CONCURRENCY = 5
+# Only API routes may be batched (and never the batch endpoint itself)
+_ALLOWED_PREFIX = "/api/v1/"
+_BATCH_PATH = "/api/v1/batch"
+# Outermost middleware sub-requests pass through (the layers above it
+# are transport-level: CORS and the tracing root span)
+_ENTRY_MIDDLEWARE = IpFilterMiddleware
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = Field(None, max_length=64)
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(..., max_length=2048)
+    body: Optional[Any] = None
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=255)
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest] = Field(..., min_length=1, max_length=MAX_BATCH_REQUESTS)
+
+
+async def _charge_rate_limit(request: Request, subs: List[SubRequest]):
+    """
+    Charge each sub-request's route cost to the buckets of its route.
+
+    Sub-requests sharing buckets are charged together in one decision.
+    """
+    charger = getattr(request.state, "rate_limit_charger", None)
+    if charger is None:
+        return
+    charges: Dict[tuple, list] = {}
+    for sub in subs:
+        group, cost = charger.buckets(sub.method, sub.path.partition("?")[0])
+        key = tuple(name for name, _ in group.entries)
+        charges.setdefault(key, [group, 0])[1] += cost
+    for group, cost in charges.values():
+        if not await group.consume(cost):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail={
+                    "error": "Rate limit exceeded",
+                    "message": f"Batch of {len(subs)} requests exceeds remaining budget",
+                    "retry_after": group.retry_after(),
+                },
+                headers={"Retry-After": str(group.retry_after())},
+            )
+
+
+def _sub_scope(request: Request, sub: SubRequest, body: bytes) -> Dict:
+    """Build an ASGI scope for a sub-request from the batch request."""
+    path, _, query = sub.path.partition("?")
+    headers = [
+        (k, v)
+        for k, v in request.scope["headers"]
+        if k in (b"authorization", b"x-api-key", b"user-agent", b"x-forwarded-for")
+    ]
+    # Sub-requests inherit whatever is left of the batch's deadline.
+    headers.extend((k.lower().encode(), v.encode()) for k, v in deadline_headers(request).items())
+    if body:
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode()))
+    if sub.idempotency_key:
+        headers.append((b"idempotency-key", sub.idempotency_key.encode()))
+
+    scope = dict(request.scope)
+    scope.update(
+        {
+            "method": sub.method,
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "headers": headers,
+            "state": {
+                "request_id": getattr(request.state, "request_id", None),
+                # Charged up front by _charge_rate_limit
+                "rate_limit_prepaid": True,
+            },
+        }
+    )
+    for key in ("route", "endpoint", "path_params"):
+        scope.pop(key, None)
+    return scope
+
+
+def _sub_app(request: Request):
+    """The app's middleware stack from _ENTRY_MIDDLEWARE inwards."""
+    layer = request.app.middleware_stack
+    while layer is not None and not isinstance(layer, _ENTRY_MIDDLEWARE):
+        layer = getattr(layer, "app", None)
+    return layer or request.app.router
+
+
+def _result(sub: SubRequest, status_code: int, raw: bytes) -> Dict:
+    """Format a captured sub-response, decoding JSON bodies."""
+    try:
+        payload = json.loads(raw) if raw else None
+    except ValueError:
+        payload = raw.decode(errors="replace")
+    return {"id": sub.id, "status": status_code, "body": payload}
+
+
+def _error(sub: SubRequest, status_code: int, detail: str) -> Dict:
+    return {"id": sub.id, "status": status_code, "body": {"detail": detail}}
+
+
+async def _dispatch(request: Request, sub: SubRequest) -> Dict:
+    """Run one sub-request through the app's middleware and capture the result."""
+    if not sub.path.startswith(_ALLOWED_PREFIX) or sub.path.startswith(_BATCH_PATH):
+        return _error(sub, status.HTTP_400_BAD_REQUEST, "Path cannot be batched")
+
+    body = json.dumps(sub.body).encode() if sub.body is not None else b""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    response: Dict[str, Any] = {"status": 500, "chunks": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["chunks"].append(message.get("body", b""))
+
+    try:
+        with tracer.span("batch.sub_request", method=sub.method, path=sub.path):
+            await _sub_app(request)(_sub_scope(request, sub, body), receive, send)
+    except StarletteHTTPException as exc:
+        # Raised by the router itself, e.g. 404/405 for unmatched paths
+        return _error(sub, exc.status_code, exc.detail)
+    except Exception:
+        return _error(sub, status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal Server Error")
+
+    return _result(sub, response["status"], b"".join(response["chunks"]))
+
+
+@router.post("")
+@deadline(15.0)
+async def execute_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Execute up to MAX_BATCH_REQUESTS API calls in one request.
+
+    Each sub-request costs its route's rate-limit cost. Results are
+    returned in request order with their own status codes.
+    """
+    await _charge_rate_limit(request, batch.requests)
+
+    semaphore = asyncio.Semaphore(MAX_BATCH_CONCURRENCY)
+
+    async def run(sub: SubRequest) -> Dict:
+        async with semaphore:
+            return await _dispatch(request, sub)
+
+    responses = await asyncio.gather(*(run(sub) for sub in batch.requests))
+    return {"responses": responses, "user_id": current_user["user_id"]}
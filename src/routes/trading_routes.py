@@ -2,28 +2,371 @@
 Trading Routes
 Author: Gabriel Demetrios Lafis
 
-Placeholder endpoints for trading operations (orders).
-In a real system these would integrate with an order management service.
+Endpoints for trading operations (orders) and push updates.
+Orders are kept in an in-memory store; in a real system these would
+integrate with an order management service.
 """
 
-from fastapi import APIRouter, Depends
+import json
+import math
+import time
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from src.auth.jwt_handler import get_current_user
+import numpy as np
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-router = APIRouter()
+from src.auth.jwt_handler import JWTHandler, get_current_admin_user, require_scope
+from src.trading.export import columnar_stream, csv_stream
+from src.trading.orders import order_store
+from src.trading.portfolio import portfolio_valuator
+from src.trading.positions import symbol_index
+from src.trading.prices import price_store
+from src.trading.risk import REASON_ACCEPTED, REASONS, risk_engine
+from src.trading.streaming import CHANNELS, Subscriber, stream_hub
+from src.utils.deadlines import DeadlineRoute, deadline
+
+router = APIRouter(route_class=DeadlineRoute)
+
+# Seconds between keepalives on an idle stream
+STREAM_KEEPALIVE_SECONDS = 15.0
+# Maximum legs per basket order
+MAX_BASKET_LEGS = 10_000
+# Orders encoded per streamed export block
+EXPORT_CHUNK_SIZE = 1000
+
+
+class OrderRequest(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=12)
+    side: Literal["buy", "sell"]
+    quantity: float = Field(..., gt=0)
+    price: float = Field(..., gt=0)
+
+
+class BasketOrderRequest(BaseModel):
+    legs: List[OrderRequest] = Field(..., min_length=1, max_length=MAX_BASKET_LEGS)
+
+
+class MarketDataUpdate(BaseModel):
+    symbol: str = Field(..., min_length=1, max_length=12)
+    price: float = Field(..., gt=0)
+
+
+def _parse_channels(channels: str) -> frozenset:
+    """Parse a comma-separated channel list, rejecting unknown names."""
+    requested = frozenset(c.strip() for c in channels.split(",") if c.strip())
+    if not requested or not requested <= CHANNELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"channels must be a subset of {sorted(CHANNELS)}",
+        )
+    return requested
+
+
+def _hub_full() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many stream subscribers",
+    )
+
+
+def _expires_at(principal: dict) -> float:
+    """When a stream must close: the token's expiry (API keys have none)."""
+    exp = principal.get("exp")
+    return math.inf if exp is None else float(exp)
+
+
+def _submit_legs(user_id: int, legs: List[OrderRequest]) -> List[dict]:
+    """
+    Run pre-trade risk checks on a basket in one vectorized pass, book
+    the accepted legs and return a per-leg result.
+    """
+    symbols = [leg.symbol.upper() for leg in legs]
+    idx = symbol_index.indices(symbols)
+    signed_qty = np.fromiter(
+        (leg.quantity if leg.side == "buy" else -leg.quantity for leg in legs),
+        dtype=np.float64,
+        count=len(legs),
+    )
+    prices = np.fromiter((leg.price for leg in legs), dtype=np.float64, count=len(legs))
+
+    reasons = risk_engine.check_batch(user_id, idx, signed_qty, prices)
+    risk_engine.apply(user_id, idx, signed_qty, prices, reasons)
+
+    results = []
+    for leg, symbol, reason in zip(legs, symbols, reasons.tolist()):
+        if reason != REASON_ACCEPTED:
+            results.append({"status": "rejected", "reason": REASONS[reason]})
+            continue
+        order = order_store.add(
+            user_id=user_id,
+            symbol=symbol,
+            side=leg.side,
+            quantity=leg.quantity,
+            price=leg.price,
+        )
+        stream_hub.publish_order(user_id, order)
+        results.append(order)
+    return results
 
 
 @router.get("/orders")
-async def get_orders(current_user: dict = Depends(get_current_user)):
+async def get_orders(current_user: dict = Depends(require_scope("trading:read"))):
     """
     List orders for the authenticated user.
-
-    This is a demo endpoint; in production it would query a
-    database or downstream order management service.
     """
+    orders = order_store.for_user(current_user["user_id"])
     return {
-        "orders": [],
-        "total": 0,
+        "orders": orders,
+        "total": len(orders),
         "user_id": current_user["user_id"],
-        "message": "No orders found. This is a demo endpoint.",
     }
+
+
+@router.get("/orders/export")
+async def export_orders(
+    format: Literal["csv", "columnar"] = Query("csv"),
+    start: Optional[datetime] = Query(None),
+    end: Optional[datetime] = Query(None),
+    user_id: Optional[int] = Query(None),
+    current_user: dict = Depends(require_scope("trading:read")),
+):
+    """
+    Stream order history for an account and time range [start, end).
+
+    Rows are streamed in chunks with constant memory. Admins may export
+    any account via `user_id`; other users only their own.
+    """
+    account = current_user["user_id"] if user_id is None else user_id
+    if account != current_user["user_id"] and not current_user.get("is_admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+    chunks = order_store.iter_range(
+        account,
+        start=start.timestamp() if start else None,
+        end=end.timestamp() if end else None,
+        chunk_size=EXPORT_CHUNK_SIZE,
+    )
+    if format == "csv":
+        body, media_type, ext = csv_stream(chunks), "text/csv", "csv"
+    else:
+        body, media_type, ext = (
+            columnar_stream(chunks),
+            "application/octet-stream",
+            "bin",
+        )
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders-{account}.{ext}"'},
+    )
+
+
+@router.post("/orders", status_code=status.HTTP_201_CREATED)
+@deadline(2.0)
+async def submit_order(
+    request: OrderRequest,
+    current_user: dict = Depends(require_scope("trading:write")),
+):
+    """
+    Submit an order.
+
+    The order must pass pre-trade risk checks; the accepted order is
+    pushed to the user's stream subscribers.
+    """
+    result = _submit_legs(current_user["user_id"], [request])[0]
+    if result["status"] == "rejected":
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"error": "Order rejected", "reason": result["reason"]},
+        )
+    return result
+
+
+@router.post("/orders/batch")
+@deadline(5.0)
+async def submit_basket(
+    request: BasketOrderRequest,
+    current_user: dict = Depends(require_scope("trading:write")),
+):
+    """
+    Submit a basket of orders.
+
+    All legs are risk-checked together; each leg is accepted or
+    rejected independently with a reason.
+    """
+    results = _submit_legs(current_user["user_id"], request.legs)
+    accepted = sum(1 for r in results if r["status"] != "rejected")
+    return {
+        "legs": results,
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+    }
+
+
+@router.get("/portfolio")
+@deadline(2.0)
+async def get_portfolio(
+    current_user: dict = Depends(require_scope("trading:read")),
+):
+    """
+    Value the authenticated user's positions at the latest prices.
+
+    Results are cached until the next price tick or position change.
+    """
+    return portfolio_valuator.value(current_user["user_id"])
+
+
+@router.post("/market-data", status_code=status.HTTP_202_ACCEPTED)
+async def publish_market_data(
+    update: MarketDataUpdate, current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Publish a market-data tick (admin only).
+
+    Updates the price snapshot used for portfolio valuation and pushes
+    the tick to stream subscribers.
+    """
+    symbol = update.symbol.upper()
+    price_store.update(symbol, update.price)
+    delivered = stream_hub.publish_market(symbol, {"price": update.price})
+    return {"symbol": symbol, "price": update.price, "subscribers": delivered}
+
+
+async def _sse_events(user_id: int, channels: frozenset, expires_at: float):
+    """
+    Yield server-sent events until the token expires or the sub is dropped.
+
+    The subscription is made here, on first iteration, so a response
+    whose body is never sent leaves nothing registered in the hub.
+    """
+    sub = stream_hub.subscribe(user_id, channels)
+    if sub is None:
+        # Filled up since the capacity check in the handler
+        yield 'event: close\ndata: {"reason": "too_many_subscribers"}\n\n'
+        return
+    try:
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                yield 'event: close\ndata: {"reason": "token_expired"}\n\n'
+                return
+
+            batch = await sub.next_batch(min(remaining, STREAM_KEEPALIVE_SECONDS))
+            for message in batch:
+                yield f"event: {message['channel']}\ndata: {json.dumps(message)}\n\n"
+
+            if sub.closed:
+                reason = json.dumps({"reason": sub.close_reason})
+                yield f"event: close\ndata: {reason}\n\n"
+                return
+            if not batch and time.time() < expires_at:
+                yield ": keepalive\n\n"
+    finally:
+        stream_hub.unsubscribe(sub)
+
+
+@router.get("/stream")
+async def stream_sse(
+    channels: str = Query("orders,market"),
+    current_user: dict = Depends(require_scope("trading:read")),
+):
+    """
+    Server-sent event stream of order and market-data updates.
+
+    The token is verified once when the stream opens; the stream is
+    closed when the token's expiry passes. API-key streams stay open
+    until the client disconnects.
+    """
+    requested = _parse_channels(channels)
+    if stream_hub.subscriber_count >= stream_hub.max_subscribers:
+        raise _hub_full()
+    return StreamingResponse(
+        _sse_events(current_user["user_id"], requested, _expires_at(current_user)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _authenticate_ws(websocket: WebSocket, token: Optional[str]) -> dict:
+    """Verify the access token of a WebSocket handshake."""
+    auth = websocket.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        token = auth[7:]
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    payload = JWTHandler.verify_token(token)
+    if payload.get("type") != "access":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return payload
+
+
+async def _pump_ws(websocket: WebSocket, sub: Subscriber, expires_at: float):
+    """Send a subscriber's batches until the token expires or it is dropped."""
+    while True:
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="token_expired")
+            return
+
+        batch = await sub.next_batch(min(remaining, STREAM_KEEPALIVE_SECONDS))
+        for message in batch:
+            await websocket.send_json(message)
+
+        if sub.closed:
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=sub.close_reason)
+            return
+        if not batch and time.time() < expires_at:
+            await websocket.send_json({"channel": "keepalive"})
+
+
+@router.websocket("/stream/ws")
+async def stream_ws(
+    websocket: WebSocket,
+    channels: str = Query("orders,market"),
+    token: Optional[str] = Query(None),
+):
+    """
+    WebSocket stream of order and market-data updates.
+
+    Browsers cannot set headers on WebSocket handshakes, so the token
+    may be passed as a `token` query parameter instead of a Bearer
+    Authorization header.
+    """
+    try:
+        payload = _authenticate_ws(websocket, token)
+        requested = _parse_channels(channels)
+        if stream_hub.subscriber_count >= stream_hub.max_subscribers:
+            raise _hub_full()
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    expires_at = _expires_at(payload)
+    sub = None
+    try:
+        await websocket.accept()
+        sub = stream_hub.subscribe(payload["user_id"], requested)
+        if sub is None:
+            # Filled up since the capacity check above
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER, reason="too_many_subscribers"
+            )
+            return
+        await _pump_ws(websocket, sub, expires_at)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if sub is not None:
+            stream_hub.unsubscribe(sub)
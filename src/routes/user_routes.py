@@ -7,13 +7,14 @@ Endpoints for user profile management.
 
 from fastapi import APIRouter, Depends
 
-from src.auth.jwt_handler import get_current_user
+from src.auth.jwt_handler import require_scope
+from src.utils.deadlines import DeadlineRoute
 
-router = APIRouter()
+router = APIRouter(route_class=DeadlineRoute)
 
 
 @router.get("/profile")
-async def get_profile(current_user: dict = Depends(get_current_user)):
+async def get_profile(current_user: dict = Depends(require_scope("users:read"))):
     """
     Get current user's profile.
 
@@ -0,0 +1,179 @@
+"""
+Order History Export
+Author: Gabriel Demetrios Lafis
+
+Streaming encoders for order history. Both formats consume an iterator
+of order chunks and emit one encoded block per chunk, so memory use is
+bounded by the chunk size regardless of how many orders are exported.
+
+Columnar format (little-endian):
+    header   b"SFGWCOL1"
+    blocks   uint32 row count, then one column after another:
+               order_id    int64[n]
+               user_id     int64[n]
+               created_at  float64[n]  (POSIX seconds)
+               quantity    float64[n]
+               price       float64[n]
+               side        uint8[n]    (0 = buy, 1 = sell)
+               symbol      int32[n + 1] offsets, uint32 byte length, utf-8 bytes
+               status      int32[n + 1] offsets, uint32 byte length, utf-8 bytes
+    trailer  uint32 0
+"""
+
+import csv
+import io
+import struct
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+import numpy as np
+
+from src.utils import metrics
+
+COLUMNAR_MAGIC = b"SFGWCOL1"
+CSV_FIELDS = (
+    "order_id",
+    "user_id",
+    "created_at",
+    "symbol",
+    "side",
+    "quantity",
+    "price",
+    "status",
+)
+
+_U32 = struct.Struct("<I")
+
+
+class ExportStats:
+    """Counters for completed exports."""
+
+    def __init__(self):
+        self.exports = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.last_rows_per_second = 0.0
+
+    def record(self, rows: int, seconds: float):
+        self.exports += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.last_rows_per_second = rows / seconds if seconds > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "exports": self.exports,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds if self.seconds else 0.0,
+            "last_rows_per_second": self.last_rows_per_second,
+        }
+
+
+export_stats = ExportStats()
+metrics.register("order_export", export_stats.snapshot)
+
+
+def _measured(chunks: Iterable[List[dict]], encode, header: bytes) -> Iterator[bytes]:
+    """Encode chunks and record rows/s once the export finishes."""
+    start = time.perf_counter()
+    rows = 0
+    try:
+        if header:
+            yield header
+        for chunk in chunks:
+            rows += len(chunk)
+            yield encode(chunk)
+    finally:
+        export_stats.record(rows, time.perf_counter() - start)
+
+
+def _csv_block(chunk: List[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([order[field] for field in CSV_FIELDS] for order in chunk)
+    return buffer.getvalue().encode()
+
+
+def csv_stream(chunks: Iterable[List[dict]]) -> Iterator[bytes]:
+    """Stream orders as CSV with a header row."""
+    header = (",".join(CSV_FIELDS) + "\r\n").encode()
+    return _measured(chunks, _csv_block, header)
+
+
+def _string_column(values: List[str]) -> bytes:
+    encoded = [v.encode() for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i4")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = b"".join(encoded)
+    return offsets.tobytes() + _U32.pack(len(data)) + data
+
+
+def _columnar_block(chunk: List[dict]) -> bytes:
+    n = len(chunk)
+    created = [datetime.fromisoformat(o["created_at"]).timestamp() for o in chunk]
+    parts = [
+        _U32.pack(n),
+        np.fromiter((o["order_id"] for o in chunk), "<i8", n).tobytes(),
+        np.fromiter((o["user_id"] for o in chunk), "<i8", n).tobytes(),
+        np.asarray(created, dtype="<f8").tobytes(),
+        np.fromiter((o["quantity"] for o in chunk), "<f8", n).tobytes(),
+        np.fromiter((o["price"] for o in chunk), "<f8", n).tobytes(),
+        np.fromiter((o["side"] == "sell" for o in chunk), "u1", n).tobytes(),
+        _string_column([o["symbol"] for o in chunk]),
+        _string_column([o["status"] for o in chunk]),
+    ]
+    return b"".join(parts)
+
+
+def columnar_stream(chunks: Iterable[List[dict]]) -> Iterator[bytes]:
+    """Stream orders in the columnar binary format described above."""
+    body = _measured(chunks, _columnar_block, COLUMNAR_MAGIC)
+    yield from body
+    yield _U32.pack(0)
+
+
+def read_columnar(data: bytes) -> List[dict]:
+    """Decode a columnar export (used by tests and offline tooling)."""
+    if not data.startswith(COLUMNAR_MAGIC):
+        raise ValueError("Not a columnar order export")
+    pos = len(COLUMNAR_MAGIC)
+    rows: List[dict] = []
+
+    def take(dtype: str, count: int) -> np.ndarray:
+        nonlocal pos
+        arr = np.frombuffer(data, dtype=dtype, count=count, offset=pos)
+        pos += arr.nbytes
+        return arr
+
+    def take_strings(count: int) -> List[str]:
+        nonlocal pos
+        offsets = take("<i4", count + 1)
+        (length,) = _U32.unpack_from(data, pos)
+        pos += 4
+        blob = data[pos : pos + length]
+        pos += length
+        return [blob[offsets[i] : offsets[i + 1]].decode() for i in range(count)]
+
+    while True:
+        (n,) = _U32.unpack_from(data, pos)
+        pos += 4
+        if n == 0:
+            return rows
+        order_id, user_id = take("<i8", n), take("<i8", n)
+        created, quantity, price = take("<f8", n), take("<f8", n), take("<f8", n)
+        side = take("u1", n)
+        symbol, status = take_strings(n), take_strings(n)
+        for i in range(n):
+            rows.append(
+                {
+                    "order_id": int(order_id[i]),
+                    "user_id": int(user_id[i]),
+                    "created_at": float(created[i]),
+                    "symbol": symbol[i],
+                    "side": "sell" if side[i] else "buy",
+                    "quantity": float(quantity[i]),
+                    "price": float(price[i]),
+                    "status": status[i],
+                }
+            )
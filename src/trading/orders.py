@@ -0,0 +1,71 @@
+"""
+Order Store
+Author: Gabriel Demetrios Lafis
+
+In-memory order storage with a per-user index. Orders are appended in
+submission order, so each user's index is already sorted by time and a
+time range is found by bisecting a parallel timestamp list.
+"""
+
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+
+class OrderStore:
+    """In-memory order storage (for demo purposes)."""
+
+    def __init__(self):
+        self.orders: Dict[int, dict] = {}
+        self._by_user: Dict[int, List[int]] = {}
+        self._ts_by_user: Dict[int, List[float]] = {}
+        self._next_id = 1
+
+    def add(self, user_id: int, symbol: str, side: str, quantity: float, price: float) -> dict:
+        """Record a new order and return it."""
+        now = datetime.now(timezone.utc)
+        order = {
+            "order_id": self._next_id,
+            "user_id": user_id,
+            "symbol": symbol,
+            "side": side,
+            "quantity": quantity,
+            "price": price,
+            "status": "accepted",
+            "created_at": now.isoformat(),
+        }
+        self._next_id += 1
+
+        self.orders[order["order_id"]] = order
+        self._by_user.setdefault(user_id, []).append(order["order_id"])
+        self._ts_by_user.setdefault(user_id, []).append(now.timestamp())
+        return order
+
+    def for_user(self, user_id: int) -> List[dict]:
+        """Return all orders of a user, oldest first."""
+        return [self.orders[oid] for oid in self._by_user.get(user_id, [])]
+
+    def iter_range(
+        self,
+        user_id: int,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        chunk_size: int = 1000,
+    ) -> Iterator[List[dict]]:
+        """
+        Yield a user's orders created in [start, end) in chunks.
+
+        Bounds are POSIX timestamps; None means unbounded. Only one
+        chunk is materialized at a time.
+        """
+        ids = self._by_user.get(user_id, [])
+        timestamps = self._ts_by_user.get(user_id, [])
+        lo = 0 if start is None else bisect_left(timestamps, start)
+        hi = len(ids) if end is None else bisect_left(timestamps, end)
+
+        for pos in range(lo, hi, chunk_size):
+            yield [self.orders[oid] for oid in ids[pos : min(pos + chunk_size, hi)]]
+
+
+# Shared order store used by the trading routes
+order_store = OrderStore()
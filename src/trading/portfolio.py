@@ -0,0 +1,107 @@
+"""
+Portfolio Valuation
+Author: Gabriel Demetrios Lafis
+
+Values a user's positions against the latest price snapshot with a
+single vectorized dot product. Results are memoized per user and reused
+until either a new price tick arrives or the user's positions change,
+so repeated dashboard polls between ticks cost a dict lookup.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from src.trading.positions import PositionBook, average_prices, position_book
+from src.trading.prices import PriceSnapshotStore, price_store
+from src.utils import metrics
+
+# Cached valuations kept before the memo is reset
+_MAX_CACHED_USERS = 100_000
+
+
+class PortfolioValuator:
+    """Memoized, vectorized portfolio valuation."""
+
+    def __init__(self, book: PositionBook, prices: PriceSnapshotStore):
+        self.book = book
+        self.prices = prices
+        self._memo: Dict[int, Tuple[int, int, dict]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def value(self, user_id: int) -> dict:
+        """Return the valuation of a user's portfolio."""
+        position_version = self.book.versions.get(user_id, 0)
+        cached = self._memo.get(user_id)
+        if (
+            cached is not None
+            and cached[0] == self.prices.version
+            and cached[1] == position_version
+        ):
+            self.hits += 1
+            return cached[2]
+
+        self.misses += 1
+        result = self._compute(user_id)
+        if len(self._memo) >= _MAX_CACHED_USERS:
+            self._memo.clear()
+        self._memo[user_id] = (result["price_version"], position_version, result)
+        return result
+
+    def stats(self) -> dict:
+        """Return memoization counters."""
+        return {
+            "cached_users": len(self._memo),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _compute(self, user_id: int) -> dict:
+        n = len(self.book.symbols)
+        qty, cost = self.book.get(user_id)
+        qty, cost = qty[:n], cost[:n]
+        realized = self.book.realized(user_id)[:n]
+        last, version = self.prices.snapshot(n)
+
+        # Unpriced symbols are marked at their average cost (no unrealized P&L).
+        avg_price = average_prices(qty, cost)
+        mark = np.where(np.isnan(last), avg_price, last)
+
+        market_values = qty * mark
+        market_value = float(np.dot(qty, mark))
+        # Cost basis of the open positions; closed quantity is in realized.
+        cost_basis = float(cost.sum())
+        unrealized_pnl = market_value - cost_basis
+        realized_pnl = float(realized.sum())
+
+        held = np.flatnonzero(qty)
+        symbols = self.book.symbols.symbols
+        positions = [
+            {
+                "symbol": symbols[i],
+                "quantity": float(qty[i]),
+                "avg_price": float(avg_price[i]),
+                "price": float(mark[i]),
+                "market_value": float(market_values[i]),
+                "realized_pnl": float(realized[i]),
+                "pnl": float(market_values[i] - cost[i] + realized[i]),
+            }
+            for i in held.tolist()
+        ]
+
+        return {
+            "user_id": user_id,
+            "positions": positions,
+            "market_value": market_value,
+            "cost_basis": cost_basis,
+            "unrealized_pnl": unrealized_pnl,
+            "realized_pnl": realized_pnl,
+            "pnl": unrealized_pnl + realized_pnl,
+            "price_version": version,
+        }
+
+
+# Shared valuator used by the trading routes
+portfolio_valuator = PortfolioValuator(position_book, price_store)
+metrics.register("portfolio", portfolio_valuator.stats)
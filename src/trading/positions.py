@@ -0,0 +1,145 @@
+"""
+Position Book
+Author: Gabriel Demetrios Lafis
+
+NumPy-backed per-user positions. Symbols are mapped to dense integer
+indices shared by every user, so a user's holdings are contiguous
+arrays indexed by symbol: signed quantity, cost basis and realized P&L.
+
+Positions use average-cost accounting. The cost basis is the open
+quantity at its average entry price; fills that add to a position move
+the average, fills that reduce it realize (price - average) on the
+closed quantity and leave the average as it was. A fill that crosses
+zero closes the old position and opens the rest at the fill price.
+"""
+
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+# Initial array capacity (symbols) per user
+_INITIAL_CAPACITY = 64
+
+
+def average_prices(qty: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """Average entry price per symbol (zero where flat)."""
+    return np.divide(cost, qty, out=np.zeros(len(qty)), where=qty != 0)
+
+
+def _occurrence(idx: np.ndarray) -> np.ndarray:
+    """How many earlier entries of idx hold the same value, per entry."""
+    order = np.argsort(idx, kind="stable")
+    ordered = idx[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    counts = np.diff(np.r_[starts, len(idx)])
+    rank = np.empty(len(idx), dtype=np.int64)
+    rank[order] = np.arange(len(idx)) - np.repeat(starts, counts)
+    return rank
+
+
+def _grow(arr: np.ndarray, size: int) -> np.ndarray:
+    """Return a zero-padded copy of arr with the given length."""
+    grown = np.zeros(size, dtype=arr.dtype)
+    grown[: len(arr)] = arr
+    return grown
+
+
+class SymbolIndex:
+    """Dense symbol -> integer index mapping."""
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self.symbols: list = []
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def get(self, symbol: str) -> int:
+        """Return the index of a symbol, assigning one if it is new."""
+        idx = self._index.get(symbol)
+        if idx is None:
+            idx = len(self.symbols)
+            self._index[symbol] = idx
+            self.symbols.append(symbol)
+        return idx
+
+    def lookup(self, symbol: str) -> int:
+        """Return the index of a known symbol, or -1."""
+        return self._index.get(symbol, -1)
+
+    def indices(self, symbols: Iterable[str]) -> np.ndarray:
+        """Map symbols to an int64 index array, assigning new indices."""
+        get = self.get
+        return np.fromiter((get(s) for s in symbols), dtype=np.int64)
+
+
+class PositionBook:
+    """Per-user signed quantity, cost basis and realized P&L arrays."""
+
+    def __init__(self, symbols: SymbolIndex):
+        self.symbols = symbols
+        self._qty: Dict[int, np.ndarray] = {}
+        self._cost: Dict[int, np.ndarray] = {}
+        self._realized: Dict[int, np.ndarray] = {}
+        # Bumped whenever any position changes, for cache invalidation
+        self.versions: Dict[int, int] = {}
+
+    def _ensure(self, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        qty = self._qty.get(user_id)
+        needed = len(self.symbols)
+        if qty is None:
+            size = max(_INITIAL_CAPACITY, needed)
+            self._qty[user_id] = np.zeros(size)
+            self._cost[user_id] = np.zeros(size)
+            self._realized[user_id] = np.zeros(size)
+        elif len(qty) < needed:
+            size = max(needed, 2 * len(qty))
+            self._qty[user_id] = _grow(qty, size)
+            self._cost[user_id] = _grow(self._cost[user_id], size)
+            self._realized[user_id] = _grow(self._realized[user_id], size)
+        return self._qty[user_id], self._cost[user_id]
+
+    def get(self, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (quantity, cost) arrays for a user, covering every known
+        symbol. The arrays may be longer than the symbol count; extra
+        slots are zero.
+        """
+        return self._ensure(user_id)
+
+    def realized(self, user_id: int) -> np.ndarray:
+        """Realized P&L per symbol, aligned with get()."""
+        self._ensure(user_id)
+        return self._realized[user_id]
+
+    def apply_fills(
+        self, user_id: int, idx: np.ndarray, signed_qty: np.ndarray, prices: np.ndarray
+    ):
+        """Apply a batch of fills in order (symbols may repeat)."""
+        if len(idx) == 0:
+            return
+        qty, cost = self._ensure(user_id)
+        realized = self._realized[user_id]
+        # Fills of the same symbol depend on each other, so apply the
+        # batch in rounds in which every symbol appears at most once.
+        rank = _occurrence(idx)
+        for n in range(int(rank.max()) + 1):
+            sel = rank == n
+            i, fill, price = idx[sel], signed_qty[sel], prices[sel]
+            held = qty[i]
+            avg = average_prices(held, cost[i])
+            # Quantity that closes part of the held position
+            closing = np.where(
+                np.sign(fill) == -np.sign(held),
+                np.sign(fill) * np.minimum(np.abs(fill), np.abs(held)),
+                0.0,
+            )
+            realized[i] -= closing * (price - avg)
+            cost[i] += closing * avg + (fill - closing) * price
+            qty[i] = held + fill
+        self.versions[user_id] = self.versions.get(user_id, 0) + 1
+
+
+# Shared symbol universe and position book
+symbol_index = SymbolIndex()
+position_book = PositionBook(symbol_index)
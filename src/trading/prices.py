@@ -0,0 +1,70 @@
+"""
+Price Snapshot Store
+Author: Gabriel Demetrios Lafis
+
+Latest price per symbol kept in one contiguous float64 array indexed by
+the shared SymbolIndex. Updates write in place; every tick bumps a
+version counter that readers use to invalidate cached results.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from src.trading.positions import SymbolIndex, symbol_index
+
+# Initial array capacity (symbols)
+_INITIAL_CAPACITY = 1024
+
+
+class PriceSnapshotStore:
+    """Contiguous last-price array with a tick version."""
+
+    def __init__(self, symbols: SymbolIndex):
+        self.symbols = symbols
+        self._prices = np.full(_INITIAL_CAPACITY, np.nan)
+        self.version = 0
+
+    def _ensure_capacity(self, size: int):
+        if size > len(self._prices):
+            grown = np.full(max(size, 2 * len(self._prices)), np.nan)
+            grown[: len(self._prices)] = self._prices
+            self._prices = grown
+
+    def update(self, symbol: str, price: float):
+        """Record a single price tick."""
+        idx = self.symbols.get(symbol)
+        self._ensure_capacity(idx + 1)
+        self._prices[idx] = price
+        self.version += 1
+
+    def update_many(self, prices: Dict[str, float]):
+        """Record several price ticks as one version bump."""
+        if not prices:
+            return
+        idx = self.symbols.indices(prices.keys())
+        self._ensure_capacity(int(idx.max()) + 1)
+        self._prices[idx] = np.fromiter(prices.values(), dtype=np.float64)
+        self.version += 1
+
+    def get(self, symbol: str) -> float:
+        """Return the last price of a symbol (NaN if never priced)."""
+        idx = self.symbols.lookup(symbol)
+        if idx < 0 or idx >= len(self._prices):
+            return float("nan")
+        return float(self._prices[idx])
+
+    def snapshot(self, size: int) -> Tuple[np.ndarray, int]:
+        """
+        Return (prices, version) covering the first `size` symbols.
+
+        The array is a read-only view; unpriced symbols are NaN.
+        """
+        self._ensure_capacity(size)
+        view = self._prices[:size]
+        view.flags.writeable = False
+        return view, self.version
+
+
+# Shared price store
+price_store = PriceSnapshotStore(symbol_index)
@@ -0,0 +1,250 @@
+"""
+Pre-Trade Risk Engine
+Author: Gabriel Demetrios Lafis
+
+Vectorized pre-trade limit checks. A whole basket is validated in one
+NumPy pass against the user's position arrays instead of looping over
+legs in Python.
+
+Checks, in priority order (the first failing check is the reason):
+1. Order notional   -- |quantity| * price per leg
+2. Position         -- |position| per symbol after the leg
+3. Symbol exposure  -- |position| * price per symbol after the leg
+4. Gross exposure   -- total exposure across symbols after the leg
+
+Each leg is checked as if every earlier *accepted* leg in the basket
+fills; rejected legs never count against later ones. The vectorized
+pass first assumes every leg within its notional limit fills, then
+re-runs with the rejected legs masked out until the accept mask stops
+changing. Each pass settles at least the first leg it got wrong, so
+this converges; baskets that still disagree after MAX_PASSES fall back
+to a leg-by-leg loop.
+
+Exposure is |position| * price: basket legs at their limit price,
+existing holdings at the last price in the snapshot store (the average
+entry price for symbols that were never priced, see PositionBook). A
+position closed out to zero adds nothing.
+"""
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.trading.positions import PositionBook, average_prices, position_book
+from src.trading.prices import PriceSnapshotStore, price_store
+
+REASON_ACCEPTED = 0
+REASON_ORDER_NOTIONAL = 1
+REASON_POSITION = 2
+REASON_SYMBOL_EXPOSURE = 3
+REASON_GROSS_EXPOSURE = 4
+
+REASONS = (
+    "accepted",
+    "order_notional_limit",
+    "position_limit",
+    "symbol_exposure_limit",
+    "gross_exposure_limit",
+)
+
+# Vectorized re-checks before a basket is resolved leg by leg
+MAX_PASSES = 8
+
+
+class RiskLimits:
+    """Per-user pre-trade limits."""
+
+    def __init__(
+        self,
+        max_order_notional: float = 1_000_000.0,
+        max_position: float = 100_000.0,
+        max_symbol_exposure: float = 5_000_000.0,
+        max_gross_exposure: float = 20_000_000.0,
+    ):
+        self.max_order_notional = max_order_notional
+        self.max_position = max_position
+        self.max_symbol_exposure = max_symbol_exposure
+        self.max_gross_exposure = max_gross_exposure
+
+    @classmethod
+    def from_env(cls) -> "RiskLimits":
+        """Build limits from RISK_* environment variables."""
+        defaults = cls()
+        return cls(
+            max_order_notional=float(
+                os.getenv("RISK_MAX_ORDER_NOTIONAL", defaults.max_order_notional)
+            ),
+            max_position=float(os.getenv("RISK_MAX_POSITION", defaults.max_position)),
+            max_symbol_exposure=float(
+                os.getenv("RISK_MAX_SYMBOL_EXPOSURE", defaults.max_symbol_exposure)
+            ),
+            max_gross_exposure=float(
+                os.getenv("RISK_MAX_GROSS_EXPOSURE", defaults.max_gross_exposure)
+            ),
+        )
+
+
+def _prior_in_symbol(idx: np.ndarray, qty: np.ndarray) -> np.ndarray:
+    """
+    For each leg, the summed quantity of earlier legs in the same symbol.
+
+    A stable sort groups legs by symbol while preserving basket order,
+    so a per-group exclusive cumulative sum gives the answer.
+    """
+    n = len(idx)
+    order = np.argsort(idx, kind="stable")
+    sorted_idx = idx[order]
+    sorted_qty = qty[order]
+
+    csum = np.cumsum(sorted_qty)
+    starts = np.empty(n, dtype=bool)
+    starts[0] = True
+    np.not_equal(sorted_idx[1:], sorted_idx[:-1], out=starts[1:])
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    exclusive = csum - sorted_qty - (csum[group_start] - sorted_qty[group_start])
+
+    prior = np.empty(n)
+    prior[order] = exclusive
+    return prior
+
+
+class PreTradeRiskEngine:
+    """Validate order baskets against per-user limits."""
+
+    def __init__(
+        self,
+        book: PositionBook,
+        limits: RiskLimits,
+        prices: Optional[PriceSnapshotStore] = None,
+    ):
+        self.book = book
+        self.limits = limits
+        self.prices = prices
+
+    def _marks(self, qty: np.ndarray, cost: np.ndarray) -> np.ndarray:
+        """Price per symbol for valuing existing positions."""
+        marks = average_prices(qty, cost)
+        if self.prices is not None:
+            last, _ = self.prices.snapshot(len(qty))
+            marks = np.where(np.isnan(last), marks, last)
+        return marks
+
+    def check_batch(
+        self,
+        user_id: int,
+        idx: np.ndarray,
+        signed_qty: np.ndarray,
+        prices: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Check a basket of legs.
+
+        Args:
+            user_id: Owner of the basket
+            idx: Symbol index per leg (see SymbolIndex)
+            signed_qty: Quantity per leg, positive to buy, negative to sell
+            prices: Limit price per leg
+
+        Returns:
+            int8 array of reason codes per leg (REASON_ACCEPTED if ok)
+        """
+        if len(idx) == 0:
+            return np.zeros(0, dtype=np.int8)
+
+        qty, cost = self.book.get(user_id)
+        gross = float((np.abs(qty) * self._marks(qty, cost)).sum())
+
+        accepted = np.abs(signed_qty) * prices <= self.limits.max_order_notional
+        for _ in range(MAX_PASSES):
+            reasons = self._check_pass(qty[idx], gross, idx, signed_qty, prices, accepted)
+            settled = reasons == REASON_ACCEPTED
+            if np.array_equal(settled, accepted):
+                return reasons
+            accepted = settled
+        return self._check_sequential(qty, gross, idx, signed_qty, prices)
+
+    def _check_pass(
+        self,
+        held: np.ndarray,
+        gross: float,
+        idx: np.ndarray,
+        signed_qty: np.ndarray,
+        prices: np.ndarray,
+        accepted: np.ndarray,
+    ) -> np.ndarray:
+        """Reason codes assuming exactly the `accepted` legs fill."""
+        limits = self.limits
+        effective = np.where(accepted, signed_qty, 0.0)
+
+        before = held + _prior_in_symbol(idx, effective)
+        after = before + signed_qty
+        abs_after = np.abs(after)
+
+        # Earlier legs count only if they fill; each leg counts itself
+        filled = (np.abs(before + effective) - np.abs(before)) * prices
+        own = (abs_after - np.abs(before)) * prices
+        gross_after = gross + np.cumsum(filled) - filled + own
+
+        return np.select(
+            [
+                np.abs(signed_qty) * prices > limits.max_order_notional,
+                abs_after > limits.max_position,
+                abs_after * prices > limits.max_symbol_exposure,
+                gross_after > limits.max_gross_exposure,
+            ],
+            [
+                REASON_ORDER_NOTIONAL,
+                REASON_POSITION,
+                REASON_SYMBOL_EXPOSURE,
+                REASON_GROSS_EXPOSURE,
+            ],
+            default=REASON_ACCEPTED,
+        ).astype(np.int8)
+
+    def _check_sequential(
+        self,
+        qty: np.ndarray,
+        gross: float,
+        idx: np.ndarray,
+        signed_qty: np.ndarray,
+        prices: np.ndarray,
+    ) -> np.ndarray:
+        """Leg-by-leg resolution for baskets the passes did not settle."""
+        limits = self.limits
+        positions: Dict[int, float] = {}
+        reasons = np.zeros(len(idx), dtype=np.int8)
+        for i, (symbol, leg_qty, price) in enumerate(
+            zip(idx.tolist(), signed_qty.tolist(), prices.tolist())
+        ):
+            before = positions.get(symbol, float(qty[symbol]))
+            after = abs(before + leg_qty)
+            gross_after = gross + (after - abs(before)) * price
+            if abs(leg_qty) * price > limits.max_order_notional:
+                reasons[i] = REASON_ORDER_NOTIONAL
+            elif after > limits.max_position:
+                reasons[i] = REASON_POSITION
+            elif after * price > limits.max_symbol_exposure:
+                reasons[i] = REASON_SYMBOL_EXPOSURE
+            elif gross_after > limits.max_gross_exposure:
+                reasons[i] = REASON_GROSS_EXPOSURE
+            else:
+                positions[symbol] = before + leg_qty
+                gross = gross_after
+        return reasons
+
+    def apply(
+        self,
+        user_id: int,
+        idx: np.ndarray,
+        signed_qty: np.ndarray,
+        prices: np.ndarray,
+        reasons: np.ndarray,
+    ):
+        """Book the accepted legs of a checked basket as fills."""
+        accepted = reasons == REASON_ACCEPTED
+        self.book.apply_fills(user_id, idx[accepted], signed_qty[accepted], prices[accepted])
+
+
+# Shared engine used by the trading routes
+risk_engine = PreTradeRiskEngine(position_book, RiskLimits.from_env(), price_store)
@@ -0,0 +1,233 @@
+"""
+Stream Hub
+Author: Gabriel Demetrios Lafis
+
+Fan-out of order and market-data updates to push subscribers.
+
+Each subscriber owns a small bounded buffer. Order events are queued in
+order and a subscriber whose queue overflows is dropped (it must
+reconnect and resync via GET /orders). Market data is conflated: only
+the latest update per symbol is kept, so a slow consumer never holds
+more than one pending tick per symbol.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+from src.utils import metrics
+
+CHANNEL_ORDERS = "orders"
+CHANNEL_MARKET = "market"
+CHANNELS = frozenset({CHANNEL_ORDERS, CHANNEL_MARKET})
+
+# Default per-subscriber order queue size
+_DEFAULT_QUEUE_SIZE = 256
+# Default cap on concurrent subscribers per worker
+_DEFAULT_MAX_SUBSCRIBERS = 50_000
+
+
+class Subscriber:
+    """
+    A single push connection.
+
+    Uses __slots__ and no background task of its own so that tens of
+    thousands of idle subscribers stay cheap.
+    """
+
+    __slots__ = (
+        "user_id",
+        "channels",
+        "maxsize",
+        "closed",
+        "close_reason",
+        "dropped",
+        "conflated",
+        "_queue",
+        "_latest",
+        "_waiter",
+    )
+
+    def __init__(self, user_id: int, channels: frozenset, maxsize: int):
+        self.user_id = user_id
+        self.channels = channels
+        self.maxsize = maxsize
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self.dropped = 0
+        self.conflated = 0
+        self._queue: deque = deque()
+        self._latest: Dict[str, dict] = {}
+        self._waiter: Optional[asyncio.Future] = None
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def push(self, message: dict) -> bool:
+        """
+        Queue an ordered message.
+
+        Returns False if the queue is full; the caller is expected
+        to drop the subscriber in that case.
+        """
+        if self.closed:
+            return False
+        if len(self._queue) >= self.maxsize:
+            self.dropped += 1
+            return False
+        self._queue.append(message)
+        self._wake()
+        return True
+
+    def push_latest(self, key: str, message: dict):
+        """Store a conflatable message, replacing any pending one for key."""
+        if self.closed:
+            return
+        if key in self._latest:
+            self.conflated += 1
+        self._latest[key] = message
+        self._wake()
+
+    def close(self, reason: str):
+        """Mark the subscriber closed and wake its consumer."""
+        self.closed = True
+        self.close_reason = reason
+        self._wake()
+
+    async def next_batch(self, timeout: float) -> List[dict]:
+        """
+        Wait up to `timeout` seconds for pending messages.
+
+        Returns every pending message (ordered events first, then the
+        latest market update per symbol), or an empty list on timeout.
+        """
+        if not self._queue and not self._latest and not self.closed:
+            # A bare future plus call_later is much cheaper than
+            # wait_for(), which spawns a task per wait.
+            loop = asyncio.get_running_loop()
+            self._waiter = loop.create_future()
+            timer = loop.call_later(timeout, self._wake)
+            try:
+                await self._waiter
+            finally:
+                timer.cancel()
+                self._waiter = None
+
+        batch = list(self._queue)
+        self._queue.clear()
+        if self._latest:
+            batch.extend(self._latest.values())
+            self._latest = {}
+        return batch
+
+
+class StreamHub:
+    """
+    Routes published updates to subscribers.
+
+    Order updates are indexed by user so that publishing touches only
+    that user's connections; market data goes to every market
+    subscriber. Publishing never awaits, so a slow consumer cannot
+    stall the publisher.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = _DEFAULT_QUEUE_SIZE,
+        max_subscribers: int = _DEFAULT_MAX_SUBSCRIBERS,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._order_subs: Dict[int, Set[Subscriber]] = {}
+        self._market_subs: Set[Subscriber] = set()
+        self._count = 0
+        self.slow_consumers_dropped = 0
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def subscribe(self, user_id: int, channels: frozenset) -> Optional[Subscriber]:
+        """Register a subscriber, or return None if the hub is full."""
+        if self._count >= self.max_subscribers:
+            return None
+
+        sub = Subscriber(user_id, channels, self.queue_size)
+        if CHANNEL_ORDERS in channels:
+            self._order_subs.setdefault(user_id, set()).add(sub)
+        if CHANNEL_MARKET in channels:
+            self._market_subs.add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        """Remove a subscriber. Safe to call more than once."""
+        removed = False
+        user_subs = self._order_subs.get(sub.user_id)
+        if user_subs is not None and sub in user_subs:
+            user_subs.discard(sub)
+            if not user_subs:
+                del self._order_subs[sub.user_id]
+            removed = True
+        if sub in self._market_subs:
+            self._market_subs.discard(sub)
+            removed = True
+        if removed:
+            self._count -= 1
+
+    def publish_order(self, user_id: int, order: dict) -> int:
+        """Push an order update to the user's subscribers."""
+        subs = self._order_subs.get(user_id)
+        if not subs:
+            return 0
+
+        message = {
+            "channel": CHANNEL_ORDERS,
+            "data": order,
+            "ts": time.time(),
+        }
+        delivered = 0
+        for sub in list(subs):
+            if sub.push(message):
+                delivered += 1
+            else:
+                self._drop(sub)
+        self.published += 1
+        return delivered
+
+    def publish_market(self, symbol: str, data: dict) -> int:
+        """Push a market-data update to all market subscribers (conflated)."""
+        message = {
+            "channel": CHANNEL_MARKET,
+            "symbol": symbol,
+            "data": data,
+            "ts": time.time(),
+        }
+        for sub in self._market_subs:
+            sub.push_latest(symbol, message)
+        self.published += 1
+        return len(self._market_subs)
+
+    def _drop(self, sub: Subscriber):
+        """Disconnect a subscriber that cannot keep up."""
+        self.slow_consumers_dropped += 1
+        sub.close("slow_consumer")
+        self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        """Return hub counters."""
+        return {
+            "subscribers": self._count,
+            "market_subscribers": len(self._market_subs),
+            "published": self.published,
+            "slow_consumers_dropped": self.slow_consumers_dropped,
+        }
+
+
+# Shared hub used by the trading routes
+stream_hub = StreamHub()
+metrics.register("stream", stream_hub.stats)
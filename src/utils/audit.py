@@ -0,0 +1,423 @@
+"""
+Audit Log
+Author: Gabriel Demetrios Lafis
+
+Append-only, tamper-evident record of security events (logins,
+registrations, token refreshes, logouts, admin access).
+
+Records are JSON lines in segment files (`<first seq>.log`), rotated at
+`segment_bytes`. Every record carries the SHA-256 of the one before it
+and its own hash over its body, so editing, dropping or reordering any
+record breaks the chain from that point on; `verify()` walks it.
+
+Writes go through one background thread. Callers enqueue and, for
+`write()`, wait until their record is on disk; the thread writes
+everything queued since its last pass and fsyncs once, so concurrent
+logins share one fsync instead of paying for one each. The chain head
+(`seq`, `last_hash`) only advances once a batch is fsynced; a batch
+that fails is cut back off the files, so the chain never skips or
+forks. Records that must stay cheap (throttled or failed logins) are
+queued with `audit(..., durable=False)` and not waited for.
+
+Each segment has a fixed-width binary index (`.idx`: time, user id,
+offset, length) written alongside it. Queries memory-map the indexes,
+binary search the time range (times are non-decreasing) and filter by
+user with numpy, then read only the matching lines.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+
+from src.utils import metrics
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+INDEX_DTYPE = np.dtype([("ts", "<f8"), ("user", "<i8"), ("offset", "<u8"), ("length", "<u4")])
+# The same layout, for packing one row at a time
+_INDEX_ROW = struct.Struct("<dqQI")
+GENESIS = "0" * 64
+# Records with no user (e.g. a failed login for an unknown email)
+NO_USER = -1
+# ',"hash":"<64 hex>"}\n' closes every line
+_HASH_SUFFIX = len(',"hash":"') + 64 + len('"}\n')
+
+
+def _seal(body: Dict) -> Tuple[bytes, str]:
+    """Serialize a record body and append its hash."""
+    raw = json.dumps(body, separators=(",", ":"), sort_keys=True).encode()
+    digest = hashlib.sha256(raw).hexdigest()
+    return raw[:-1] + f',"hash":"{digest}"}}\n'.encode(), digest
+
+
+def _check(line: bytes) -> Optional[Dict]:
+    """Parse a sealed line, or None if its hash does not match its body."""
+    if len(line) <= _HASH_SUFFIX:
+        return None
+    body = line[:-_HASH_SUFFIX] + b"}"
+    record = json.loads(line)
+    if hashlib.sha256(body).hexdigest() != record.get("hash"):
+        return None
+    return record
+
+
+class AuditSegment:
+    """One segment file and its memory-mapped index."""
+
+    def __init__(self, directory: str, first_seq: int):
+        self.first_seq = first_seq
+        self.log_path = os.path.join(directory, f"{first_seq:012d}.log")
+        self.idx_path = os.path.join(directory, f"{first_seq:012d}.idx")
+
+    def index(self) -> np.ndarray:
+        count = os.path.getsize(self.idx_path) // INDEX_DTYPE.itemsize
+        if not count:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.memmap(self.idx_path, dtype=INDEX_DTYPE, mode="r", shape=(count,))
+
+    def lines(self):
+        with open(self.log_path, "rb") as f:
+            yield from f
+
+    def read(self, rows: np.ndarray) -> List[Dict]:
+        if not len(rows):
+            return []
+        with open(self.log_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return [
+                    json.loads(data[int(row["offset"]) : int(row["offset"] + row["length"])])
+                    for row in rows
+                ]
+
+
+class AuditLog:
+    """Hash-chained segment writer with group fsync, and its reader."""
+
+    def __init__(self, directory: Optional[str], segment_bytes: int = 64 << 20):
+        self.segment_bytes = segment_bytes
+        self.directory = None
+        self.segments: List[AuditSegment] = []
+        self.seq = 0
+        self.last_hash = GENESIS
+        self.last_ts = 0.0
+        self.records = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.errors = 0
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        self._log = self._idx = None
+        self._size = 0
+        if directory:
+            self.open(directory)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    # --- writer ---------------------------------------------------------
+
+    def open(self, directory: str):
+        """Start logging to `directory`, continuing any existing chain."""
+        self.close()
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segments = [
+            AuditSegment(directory, int(name[:-4]))
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".log") and name[:-4].isdigit()
+        ]
+        self.seq, self.last_hash, self.last_ts = 0, GENESIS, 0.0
+        if self.segments:
+            self._recover(self.segments[-1])
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def _recover(self, segment: AuditSegment):
+        """Drop a torn tail, rebuild a stale index and resume the chain."""
+        rows, offset, last = [], 0, None
+        for line in segment.lines():
+            try:
+                record = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                record = None
+            if record is None:
+                break
+            rows.append((record["ts"], record["user_id"], offset, len(line)))
+            offset += len(line)
+            last = record
+        if os.path.getsize(segment.log_path) != offset:
+            logger.warning("Truncating torn audit record in %s", segment.log_path)
+            os.truncate(segment.log_path, offset)
+        if not os.path.exists(segment.idx_path) or len(segment.index()) != len(rows):
+            np.array(rows, dtype=INDEX_DTYPE).tofile(segment.idx_path)
+        if last is not None:
+            self.seq, self.last_hash, self.last_ts = (
+                last["seq"],
+                last["hash"],
+                last["ts"],
+            )
+        elif len(self.segments) > 1:
+            os.remove(segment.log_path)
+            os.remove(segment.idx_path)
+            self.segments.pop()
+            self._recover(self.segments[-1])
+
+    def close(self):
+        """Flush queued records and stop the writer thread."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+        self._close_files()
+        self.directory = None
+
+    def _close_files(self):
+        for f in (self._log, self._idx):
+            if f is not None:
+                f.close()
+        self._log = self._idx = None
+
+    def _segment_for(self, size: int, seq: int):
+        """Open the active segment, rotating first if `size` would overflow it."""
+        if self._log is not None and self._size + size <= self.segment_bytes:
+            return
+        if self._log is not None and self._size:
+            self._sync()
+            self._close_files()
+            self.segments.append(AuditSegment(self.directory, seq))
+        elif not self.segments:
+            self.segments.append(AuditSegment(self.directory, seq))
+        segment = self.segments[-1]
+        self._log = open(segment.log_path, "ab")
+        self._idx = open(segment.idx_path, "ab")
+        self._size = self._log.tell()
+
+    def _sync(self):
+        self._log.flush()
+        self._idx.flush()
+        os.fsync(self._log.fileno())
+        os.fsync(self._idx.fileno())
+        self.fsyncs += 1
+
+    def _write_batch(self, batch: List[tuple]):
+        seq, last_hash, last_ts = self.seq, self.last_hash, self.last_ts
+        lines = []
+        for entry, _ in batch:
+            seq += 1
+            last_ts = max(last_ts, entry["ts"])
+            body = {k: v for k, v in entry.items() if k != "ts"}
+            line, last_hash = _seal({**body, "seq": seq, "ts": last_ts, "prev": last_hash})
+            lines.append((seq, last_ts, entry["user_id"], line))
+
+        # Where the batch starts, to cut it off again if it fails
+        segments, size = len(self.segments), self._size
+        if self._log is None:
+            size = os.path.getsize(self.segments[-1].log_path) if self.segments else 0
+        try:
+            for record_seq, ts, user_id, line in lines:
+                self._segment_for(len(line), record_seq)
+                row = _INDEX_ROW.pack(ts, user_id, self._size, len(line))
+                # Data before index, so a reader never sees an index row
+                # pointing past the end of the log
+                self._log.write(line)
+                self._log.flush()
+                self._idx.write(row)
+                self._size += len(line)
+            self._sync()
+        except Exception:
+            self._rollback(segments, size)
+            raise
+        self.seq, self.last_hash, self.last_ts = seq, last_hash, last_ts
+
+    def _rollback(self, segments: int, size: int):
+        """Cut a failed batch off the files, back to where it started."""
+        try:
+            self._close_files()
+        except OSError:
+            self._log = self._idx = None
+        try:
+            while len(self.segments) > segments:
+                segment = self.segments.pop()
+                for path in (segment.log_path, segment.idx_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            if self.segments:
+                segment = self.segments[-1]
+                os.truncate(segment.log_path, size)
+                rows = int(np.searchsorted(segment.index()["offset"], size))
+                os.truncate(segment.idx_path, rows * INDEX_DTYPE.itemsize)
+        except OSError as exc:
+            # Reopening recovers a torn tail; the chain head is unchanged
+            logger.error("Audit rollback failed: %s", exc)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+            try:
+                self._write_batch(batch)
+            except Exception as exc:
+                self.errors += 1
+                logger.error("Audit write failed: %s", exc)
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.records += len(batch)
+            self.batches += 1
+            for _, future in batch:
+                future.set_result(None)
+
+    def record(
+        self,
+        event: str,
+        outcome: str = "success",
+        user_id: Optional[int] = None,
+        actor: Optional[str] = None,
+        client: Optional[str] = None,
+        request_id: Optional[str] = None,
+        **detail,
+    ) -> Future:
+        """Queue a record; the future resolves once it is fsynced."""
+        future = Future()
+        if not self.enabled:
+            future.set_result(None)
+            return future
+        entry = {
+            "ts": time.time(),
+            "event": event,
+            "outcome": outcome,
+            "user_id": NO_USER if user_id is None else int(user_id),
+            "actor": actor,
+            "client": client,
+            "request_id": request_id,
+            "detail": detail,
+        }
+        with self._cond:
+            self._pending.append((entry, future))
+            self._cond.notify()
+        return future
+
+    async def write(self, event: str, outcome: str = "success", **fields):
+        """Record an event and wait until it is durable."""
+        with tracer.span("audit.write", event=event):
+            await asyncio.wrap_future(self.record(event, outcome, **fields))
+
+    # --- reader ---------------------------------------------------------
+
+    def query(
+        self,
+        user_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100,
+    ) -> List[Dict]:
+        """Records matching a user and time range, newest first."""
+        since = -np.inf if since is None else since
+        until = np.inf if until is None else until
+        results: List[Dict] = []
+        for segment in reversed(self.segments):
+            index = segment.index()
+            if not len(index):
+                continue
+            if index["ts"][0] > until:
+                continue
+            if index["ts"][-1] < since:
+                break
+            times = index["ts"]
+            lo = int(np.searchsorted(times, since, side="left"))
+            hi = int(np.searchsorted(times, until, side="right"))
+            rows = index[lo:hi]
+            if user_id is not None:
+                rows = rows[rows["user"] == user_id]
+            rows = rows[::-1][: limit - len(results)]
+            results.extend(segment.read(rows))
+            if len(results) >= limit:
+                break
+        return results
+
+    def verify(self) -> Dict:
+        """Walk every segment and check the hash chain end to end."""
+        prev, count = GENESIS, 0
+        for segment in self.segments:
+            for line in segment.lines():
+                record = _check(line)
+                if record is None or record["prev"] != prev:
+                    return {
+                        "valid": False,
+                        "records": count,
+                        "broken_at_seq": count + 1,
+                        "segment": os.path.basename(segment.log_path),
+                    }
+                prev = record["hash"]
+                count += 1
+        return {"valid": True, "records": count, "head": prev}
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "segments": len(self.segments),
+            "seq": self.seq,
+            "records": self.records,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "errors": self.errors,
+        }
+
+
+audit_log = AuditLog(
+    os.getenv("AUDIT_LOG_DIR") or None,
+    segment_bytes=int(os.getenv("AUDIT_SEGMENT_BYTES", str(64 << 20))),
+)
+metrics.register("audit", audit_log.stats)
+
+
+async def audit(
+    request: Request,
+    event: str,
+    outcome: str = "success",
+    user: Optional[Dict] = None,
+    actor: Optional[str] = None,
+    durable: bool = True,
+    **detail,
+):
+    """
+    Record `event` for the caller of `request`.
+
+    With `durable=False` the record is queued without waiting for its
+    fsync, for paths that must stay cheap under attack.
+    """
+    user = user or {}
+    fields = dict(
+        user_id=user.get("user_id"),
+        actor=actor or user.get("username"),
+        client=request.client.host if request.client else None,
+        request_id=getattr(request.state, "request_id", None),
+        **detail,
+    )
+    if durable:
+        await audit_log.write(event, outcome, **fields)
+    else:
+        audit_log.record(event, outcome, **fields)
@@ -0,0 +1,374 @@
+"""
+Gateway Configuration
+Author: Gabriel Demetrios Lafis
+
+Runtime settings for the middleware layers: rate limits, circuit
+breaker thresholds, CORS and security headers. They are read from the
+JSON file named by GATEWAY_CONFIG_FILE, on top of defaults taken from
+the environment:
+
+    {"rate_limit": {"requests_per_minute": 120,
+                    "tiers": {"user": [{"requests": 240, "period": 60}]},
+                    "routes": {"POST /api/v1/auth/login": {"name": "auth",
+                                                           "cost": 5}}},
+     "circuit_breaker": {"failure_threshold": 5, "timeout": 60},
+     "cors": {"allow_origins": ["https://app.example.com"]},
+     "security_headers": {"X-Frame-Options": "SAMEORIGIN"}}
+
+A file is validated and compiled into an immutable GatewayConfig (limit
+tuples, a route policy table, header pairs) before anything changes,
+and a bad file leaves the running config in place. The new config then
+replaces the old one in a single attribute assignment. Middleware reads
+`gateway_config.current` once per request and uses that snapshot to
+the end, so requests in flight finish on the config they started with
+and no request ever takes a lock.
+
+Reloads happen on SIGHUP (in each worker; the launcher forwards it) or
+through POST /api/v1/admin/config/reload. Breaker state is kept, and so
+is every token bucket whose window (requests, period) is unchanged.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import signal
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+from src.middleware.rate_limit_policy import (
+    DEFAULT_ROUTE_POLICIES,
+    TIERS,
+    Limit,
+    RatePolicy,
+    RatePolicyTable,
+    default_tier_limits,
+)
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+    "Content-Security-Policy": "default-src 'self'",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "camera=(), microphone=(), geolocation=()",
+}
+
+_SECTIONS = ("rate_limit", "circuit_breaker", "cors", "security_headers")
+# "*" may only stand for the leftmost host labels: https://*.example.com
+_ORIGIN_PATTERN = re.compile(r"^[a-z][a-z0-9+.-]*://\*\.[^*/]+$")
+# RFC 7230 token (header field name)
+_HEADER_NAME = re.compile(r"^[!#$%&'*+.^_`|~0-9A-Za-z-]+$")
+# Control characters other than horizontal tab
+_HEADER_CONTROL = re.compile(r"[\x00-\x08\x0a-\x1f\x7f]")
+
+
+class RateLimitSettings(NamedTuple):
+    requests_per_minute: int
+    subnet_multiplier: int
+    tier_limits: Mapping[str, Tuple[Limit, ...]]
+    policies: RatePolicyTable
+
+
+class BreakerSettings(NamedTuple):
+    failure_threshold: int
+    timeout: float
+
+
+class CorsSettings(NamedTuple):
+    allow_origins: Tuple[str, ...]
+    allow_methods: Tuple[str, ...]
+    allow_headers: Tuple[str, ...]
+    expose_headers: Tuple[str, ...]
+    allow_credentials: bool
+    max_age: int
+
+
+class GatewayConfig:
+    """One validated, compiled and immutable set of gateway settings."""
+
+    __slots__ = (
+        "version",
+        "source",
+        "digest",
+        "loaded_at",
+        "rate_limit",
+        "circuit_breaker",
+        "cors",
+        "security_headers",
+    )
+
+    def __init__(self, raw: Dict, version: int = 1, source: str = "environment"):
+        unknown = set(raw) - set(_SECTIONS)
+        if unknown:
+            raise ValueError(f"unknown sections: {', '.join(sorted(unknown))}")
+        self.rate_limit = _rate_limit(_section(raw, "rate_limit"))
+        self.circuit_breaker = _breaker(_section(raw, "circuit_breaker"))
+        self.cors = _cors(_section(raw, "cors"))
+        self.security_headers = _headers(_section(raw, "security_headers"))
+        self.version = version
+        self.source = source
+        self.digest = hashlib.sha256(json.dumps(raw, sort_keys=True).encode()).hexdigest()[:16]
+        self.loaded_at = time.time()
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"GatewayConfig.{name} is read-only")
+        super().__setattr__(name, value)
+
+    def to_dict(self) -> Dict:
+        rate_limit = self.rate_limit
+        return {
+            "version": self.version,
+            "source": self.source,
+            "digest": self.digest,
+            "loaded_at": self.loaded_at,
+            "rate_limit": {
+                "requests_per_minute": rate_limit.requests_per_minute,
+                "subnet_multiplier": rate_limit.subnet_multiplier,
+                "tiers": {
+                    tier: [limit._asdict() for limit in limits]
+                    for tier, limits in rate_limit.tier_limits.items()
+                },
+                "routes": len(rate_limit.policies),
+            },
+            "circuit_breaker": self.circuit_breaker._asdict(),
+            "cors": self.cors._asdict(),
+            "security_headers": dict(self.security_headers),
+        }
+
+
+# --- validation ----------------------------------------------------------
+
+
+def _section(raw: Dict, name: str) -> Dict:
+    section = raw.get(name, {})
+    if not isinstance(section, dict):
+        raise ValueError(f"{name}: expected an object")
+    return section
+
+
+def _check_keys(section: Dict, name: str, allowed: Tuple[str, ...]):
+    unknown = set(section) - set(allowed)
+    if unknown:
+        raise ValueError(f"{name}: unknown keys {', '.join(sorted(unknown))}")
+
+
+def _number(section: Dict, key: str, default, name: str, kind=int, minimum=1):
+    value = section.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name}.{key}: expected a number")
+    if value < minimum:
+        raise ValueError(f"{name}.{key}: must be at least {minimum}")
+    return kind(value)
+
+
+def _strings(section: Dict, key: str, default, name: str) -> Tuple[str, ...]:
+    value = section.get(key, default)
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{name}.{key}: expected a list of strings")
+    return tuple(value)
+
+
+def _limits(raw, name: str) -> Tuple[Limit, ...]:
+    if not isinstance(raw, list) or not raw:
+        raise ValueError(f"{name}: expected a non-empty list of limits")
+    limits = []
+    for i, entry in enumerate(raw):
+        where = f"{name}[{i}]"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected an object")
+        _check_keys(entry, where, ("requests", "period", "burst"))
+        limits.append(
+            Limit(
+                _number(entry, "requests", None, where),
+                _number(entry, "period", None, where, float, minimum=0.001),
+                _number(entry, "burst", None, where) if "burst" in entry else None,
+            )
+        )
+    return tuple(limits)
+
+
+def _tiers(raw: Dict, name: str) -> Dict[str, Tuple[Limit, ...]]:
+    if not isinstance(raw, dict):
+        raise ValueError(f"{name}: expected an object")
+    _check_keys(raw, name, TIERS)
+    return {tier: _limits(limits, f"{name}.{tier}") for tier, limits in raw.items()}
+
+
+def _route_policies(raw: Dict) -> Dict[str, RatePolicy]:
+    if not isinstance(raw, dict):
+        raise ValueError("rate_limit.routes: expected an object")
+    policies = dict(DEFAULT_ROUTE_POLICIES)
+    for template, entry in raw.items():
+        where = f"rate_limit.routes[{template!r}]"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected an object")
+        _check_keys(entry, where, ("name", "cost", "limits"))
+        policies[template] = RatePolicy(
+            str(entry.get("name", "default")),
+            _number(entry, "cost", 1, where),
+            _tiers(entry["limits"], f"{where}.limits") if "limits" in entry else None,
+        )
+    return policies
+
+
+def _rate_limit(section: Dict) -> RateLimitSettings:
+    name = "rate_limit"
+    _check_keys(section, name, ("requests_per_minute", "subnet_multiplier", "tiers", "routes"))
+    rpm = _number(
+        section,
+        "requests_per_minute",
+        int(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "60")),
+        name,
+    )
+    tier_limits = default_tier_limits(rpm)
+    tier_limits.update(_tiers(section.get("tiers", {}), f"{name}.tiers"))
+    return RateLimitSettings(
+        rpm,
+        _number(
+            section,
+            "subnet_multiplier",
+            int(os.getenv("SUBNET_RATE_LIMIT_MULTIPLIER", "16")),
+            name,
+        ),
+        MappingProxyType(tier_limits),
+        RatePolicyTable(_route_policies(section.get("routes", {}))),
+    )
+
+
+def _breaker(section: Dict) -> BreakerSettings:
+    name = "circuit_breaker"
+    _check_keys(section, name, BreakerSettings._fields)
+    return BreakerSettings(
+        _number(section, "failure_threshold", 5, name),
+        _number(section, "timeout", 60, name, float),
+    )
+
+
+def _cors(section: Dict) -> CorsSettings:
+    name = "cors"
+    _check_keys(section, name, CorsSettings._fields)
+    credentials = section.get("allow_credentials", True)
+    if not isinstance(credentials, bool):
+        raise ValueError(f"{name}.allow_credentials: expected true or false")
+    origins = _strings(section, "allow_origins", os.getenv("ALLOWED_ORIGINS", "*").split(","), name)
+    for origin in origins:
+        if "*" in origin and origin != "*" and not _ORIGIN_PATTERN.match(origin):
+            raise ValueError(f"{name}.allow_origins: bad pattern {origin!r}")
+    return CorsSettings(
+        origins,
+        _strings(section, "allow_methods", ["*"], name),
+        _strings(section, "allow_headers", ["*"], name),
+        _strings(section, "expose_headers", ["X-Request-ID", "X-RateLimit-Remaining"], name),
+        credentials,
+        _number(section, "max_age", int(os.getenv("CORS_MAX_AGE", "600")), name, minimum=0),
+    )
+
+
+def _header_value(header: str, value) -> str:
+    where = f"security_headers.{header}"
+    if not isinstance(value, str) or _HEADER_CONTROL.search(value):
+        raise ValueError(f"{where}: expected a one-line string")
+    try:
+        value.encode("latin-1")
+    except UnicodeEncodeError:
+        raise ValueError(f"{where}: value must be latin-1") from None
+    return value
+
+
+def _headers(section: Dict) -> Tuple[Tuple[str, str], ...]:
+    headers = dict(DEFAULT_SECURITY_HEADERS)
+    for header, value in section.items():
+        if not _HEADER_NAME.match(header):
+            raise ValueError(f"security_headers: bad header name {header!r}")
+        if value is None:
+            # null removes a default header
+            headers.pop(header, None)
+        else:
+            headers[header] = _header_value(header, value)
+    return tuple(headers.items())
+
+
+# --- store ---------------------------------------------------------------
+
+
+class ConfigStore:
+    """The current GatewayConfig, swapped atomically on reload."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.current = GatewayConfig({})
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def load(self, raw: Dict, source: str = "inline") -> GatewayConfig:
+        """Compile `raw` and swap it in; raise ValueError if it is invalid."""
+        if not isinstance(raw, dict):
+            raise ValueError("expected a JSON object")
+        config = GatewayConfig(raw, self.current.version + 1, source)
+        # The only write readers can observe: one reference replaced
+        self.current = config
+        self.reloads += 1
+        self.last_error = None
+        return config
+
+    def reload(self) -> GatewayConfig:
+        """Load the config file again; the old config stays on error."""
+        try:
+            if not self.path:
+                raise ValueError("GATEWAY_CONFIG_FILE is not set")
+            with open(self.path) as f:
+                raw = json.load(f)
+            config = self.load(raw, self.path)
+        except (OSError, ValueError) as exc:
+            self.failures += 1
+            self.last_error = str(exc)
+            logger.error(
+                "Config reload failed, keeping version %d: %s",
+                self.current.version,
+                exc,
+            )
+            raise ValueError(str(exc)) from exc
+        logger.info(
+            "Loaded config version %d (%s) from %s",
+            config.version,
+            config.digest,
+            self.path,
+        )
+        return config
+
+    def _on_sighup(self):
+        try:
+            self.reload()
+        except ValueError:
+            pass
+
+    def install_signal_handler(self, loop) -> bool:
+        """Reload on SIGHUP; only possible from the main thread."""
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        loop.add_signal_handler(signal.SIGHUP, self._on_sighup)
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.current.version,
+            "digest": self.current.digest,
+            "source": self.current.source,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+gateway_config = ConfigStore(os.getenv("GATEWAY_CONFIG_FILE") or None)
+metrics.register("config", gateway_config.stats)
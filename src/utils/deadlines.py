@@ -0,0 +1,148 @@
+"""
+Route Deadlines
+Author: Gabriel Demetrios Lafis
+
+Per-route timeout budgets. Routers opt in with
+`APIRouter(route_class=DeadlineRoute)` and individual endpoints override
+the default budget with the `@deadline(seconds)` decorator. A handler
+that overruns its budget is cancelled and answered with 504, which the
+circuit breaker counts as a failure like any other 5xx.
+
+The remaining budget is carried in the `X-Request-Timeout-Ms` header:
+an incoming value can only shorten the route's budget (down to
+MIN_CLIENT_TIMEOUT_MS), and `deadline_headers()` produces the header to
+forward to upstream calls. A timeout caused by the caller's shorter
+budget is the caller's doing, not the route's: it is answered with 408,
+which the circuit breaker does not count, so clients cannot open a
+shared breaker by sending tiny budgets.
+"""
+
+import asyncio
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from src.utils import metrics
+from src.utils.tracing import tracer
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+# Budget for routes without an explicit @deadline
+DEFAULT_ROUTE_TIMEOUT = float(os.getenv("ROUTE_TIMEOUT_SECONDS", "10"))
+# Smallest budget a caller may ask for
+MIN_CLIENT_TIMEOUT = float(os.getenv("MIN_CLIENT_TIMEOUT_MS", "50")) / 1000
+
+
+def deadline(seconds: float) -> Callable:
+    """Declare the timeout budget of an endpoint (place below the route)."""
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.__deadline__ = seconds
+        return endpoint
+
+    return decorator
+
+
+def remaining(request: Request) -> Optional[float]:
+    """Seconds left before the request's deadline, or None if unbounded."""
+    expires_at = getattr(request.state, "deadline", None)
+    if expires_at is None:
+        return None
+    return max(0.0, expires_at - time.monotonic())
+
+
+def deadline_headers(request: Request) -> Dict[str, str]:
+    """Headers propagating the remaining deadline to an upstream call."""
+    left = remaining(request)
+    if left is None:
+        return {}
+    return {DEADLINE_HEADER: str(int(left * 1000))}
+
+
+class DeadlineStats:
+    """Timeout counts per route, keyed by endpoint name."""
+
+    def __init__(self):
+        self.timeouts: Dict[str, int] = {}
+        self.client_timeouts: Dict[str, int] = {}
+
+    def record(self, route: str, client_deadline: bool = False):
+        counts = self.client_timeouts if client_deadline else self.timeouts
+        counts[route] = counts.get(route, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "default_timeout_seconds": DEFAULT_ROUTE_TIMEOUT,
+            "min_client_timeout_ms": MIN_CLIENT_TIMEOUT * 1000,
+            "timeouts": dict(self.timeouts),
+            "client_timeouts": dict(self.client_timeouts),
+        }
+
+
+deadline_stats = DeadlineStats()
+metrics.register("deadlines", deadline_stats.stats)
+
+
+def _client_budget(request: Request) -> Optional[float]:
+    value = request.headers.get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    try:
+        return max(MIN_CLIENT_TIMEOUT, int(value) / 1000)
+    except ValueError:
+        return None
+
+
+class DeadlineRoute(APIRoute):
+    """APIRoute that cancels its handler once the route budget is spent."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        budget = getattr(self.endpoint, "__deadline__", DEFAULT_ROUTE_TIMEOUT)
+
+        async def run_with_deadline(request: Request):
+            now = time.monotonic()
+            expires_at = now + budget
+            client_budget = _client_budget(request)
+            client_deadline = client_budget is not None and client_budget < budget
+            if client_deadline:
+                expires_at = now + client_budget
+            request.state.deadline = expires_at
+
+            timeout = asyncio.timeout(expires_at - now)
+            try:
+                async with timeout:
+                    with tracer.span("handler", route=self.path):
+                        return await handler(request)
+            except TimeoutError:
+                if not timeout.expired():
+                    raise
+                deadline_stats.record(self.name, client_deadline)
+                timeout_ms = int((expires_at - now) * 1000)
+                if client_deadline:
+                    return JSONResponse(
+                        status_code=status.HTTP_408_REQUEST_TIMEOUT,
+                        content={
+                            "detail": {
+                                "error": "Request Timeout",
+                                "message": f"Request exceeded the {DEADLINE_HEADER} budget",
+                                "timeout_ms": timeout_ms,
+                            }
+                        },
+                    )
+                return JSONResponse(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    content={
+                        "detail": {
+                            "error": "Gateway Timeout",
+                            "message": "Request exceeded its deadline",
+                            "timeout_ms": timeout_ms,
+                        }
+                    },
+                )
+
+        return run_with_deadline
@@ -0,0 +1,63 @@
+"""
+IP Prefix Trie
+Author: Gabriel Demetrios Lafis
+
+Binary radix trie over IPv4/IPv6 CIDR prefixes. A lookup walks at most
+one node per prefix bit and returns the value of the longest matching
+prefix, so more specific entries override broader ones.
+"""
+
+import ipaddress
+from typing import Any, Iterable, Optional, Tuple
+
+# Node layout: [child for bit 0, child for bit 1, value, has_value]
+_ZERO, _ONE, _VALUE, _SET = 0, 1, 2, 3
+
+
+def _new_node() -> list:
+    return [None, None, None, False]
+
+
+class PrefixTrie:
+    """Longest-prefix-match table for IPv4 and IPv6 networks."""
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]] = ()):
+        self._roots = {4: _new_node(), 6: _new_node()}
+        self.size = 0
+        for cidr, value in entries:
+            self.insert(cidr, value)
+
+    def insert(self, cidr: str, value: Any):
+        network = ipaddress.ip_network(cidr, strict=False)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+        node = self._roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (address >> (bits - 1 - i)) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = _new_node()
+            node = child
+        if not node[_SET]:
+            self.size += 1
+        node[_VALUE], node[_SET] = value, True
+
+    def lookup_int(self, address: int, version: int) -> Optional[Any]:
+        """Longest-prefix match for an address given as an integer."""
+        bits = 32 if version == 4 else 128
+        node = self._roots[version]
+        best = node[_VALUE] if node[_SET] else None
+        for shift in range(bits - 1, -1, -1):
+            node = node[(address >> shift) & 1]
+            if node is None:
+                break
+            if node[_SET]:
+                best = node[_VALUE]
+        return best
+
+    def lookup(self, host: str) -> Optional[Any]:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return None
+        return self.lookup_int(int(address), address.version)
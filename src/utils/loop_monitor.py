@@ -0,0 +1,236 @@
+"""
+Event Loop Monitor
+Author: Gabriel Demetrios Lafis
+
+Measures how late the event loop runs its callbacks and catches the
+code responsible when it stalls.
+
+Lag: a background task sleeps for `interval` in a loop and records how
+much later than asked it woke up, into a fixed-bucket histogram. Any
+synchronous work (bcrypt, file I/O, a slow log handler) delays every
+other request by the same amount, and shows up here.
+
+Blocking: the same task bumps a heartbeat on every wake-up. A watchdog
+thread checks it; once the heartbeat is older than `threshold`, the
+loop is stuck inside one callback, and the watchdog captures the loop
+thread's current stack. Reports are grouped by stack: repeats only bump
+the group's count and worst duration, and a warning is logged at most
+once per `report_interval` per stack.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds (milliseconds); the last bucket is open
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+MAX_STACK_DEPTH = 30
+
+
+class LagHistogram:
+    """Fixed-bucket histogram of loop lag samples."""
+
+    def __init__(self, bounds=LAG_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, lag_ms: float):
+        i = 0
+        while i < len(self.bounds) and lag_ms > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += 1
+        self.sum_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.total:
+            return None
+        rank, seen = q * self.total, 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return float(self.bounds[i]) if i < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        labels = [f"le_{b}ms" for b in self.bounds] + ["inf"]
+        return {
+            "samples": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 3) if self.total else None,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class BlockingReport:
+    """Loop stalls that share one stack."""
+
+    def __init__(self, signature: str, stack: List[str], now: float):
+        self.signature = signature
+        self.stack = stack
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.last_logged = 0.0
+        self.max_blocked_ms = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "signature": self.signature,
+            "count": self.count,
+            "max_blocked_ms": round(self.max_blocked_ms, 1),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+def _loop_stack(thread_id: int) -> List[str]:
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    frames = traceback.extract_stack(frame)[-MAX_STACK_DEPTH:]
+    return [f"{f.filename}:{f.lineno} in {f.name}" for f in frames]
+
+
+class LoopMonitor:
+    """Lag histogram plus a watchdog thread that reports blocking calls."""
+
+    def __init__(
+        self,
+        interval: float = 0.05,
+        threshold: float = 0.1,
+        report_interval: float = 60.0,
+        max_reports: int = 50,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self.max_reports = max_reports
+        self.lag = LagHistogram()
+        self.reports: "OrderedDict[str, BlockingReport]" = OrderedDict()
+        # The watchdog thread writes reports while the loop reads them
+        self._lock = threading.Lock()
+        self.stalls = 0
+        self.suppressed = 0
+        self._heartbeat = time.monotonic()
+        self._stall_seen: Optional[float] = None
+        self._stall_report: Optional[BlockingReport] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start sampling lag and watching for stalls (call on the loop)."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        self._stop.set()
+        await asyncio.to_thread(self._watchdog.join)
+        self._watchdog = None
+
+    async def _sample(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.lag.record(max(0.0, now - start - self.interval) * 1000)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            self.check()
+
+    def check(self, now: Optional[float] = None):
+        """One watchdog pass: report the loop if it is stuck."""
+        now = time.monotonic() if now is None else now
+        heartbeat = self._heartbeat
+        blocked = now - heartbeat - self.interval
+        if blocked < self.threshold:
+            return
+        if self._stall_seen != heartbeat:
+            # A new stall: capture whatever the loop is running now
+            self._stall_seen = heartbeat
+            self._stall_report = self._record(_loop_stack(self._loop_thread))
+        report = self._stall_report
+        report.max_blocked_ms = max(report.max_blocked_ms, blocked * 1000)
+
+    def _record(self, stack: List[str]) -> BlockingReport:
+        self.stalls += 1
+        signature = hashlib.blake2b("\n".join(stack).encode(), digest_size=8).hexdigest()
+        wall = time.time()
+        with self._lock:
+            report = self.reports.get(signature)
+            if report is None:
+                report = BlockingReport(signature, stack, wall)
+                self.reports[signature] = report
+                if len(self.reports) > self.max_reports:
+                    self.reports.popitem(last=False)
+            self.reports.move_to_end(signature)
+        report.count += 1
+        report.last_seen = wall
+        if wall - report.last_logged >= self.report_interval:
+            report.last_logged = wall
+            logger.warning(
+                "Event loop blocked for over %.0f ms in:\n%s",
+                self.threshold * 1000,
+                "\n".join(stack[-5:]),
+            )
+        else:
+            self.suppressed += 1
+        return report
+
+    def blocking(self, limit: int = 20) -> List[Dict]:
+        """Stall reports, most recently seen first."""
+        with self._lock:
+            reports = list(self.reports.values())
+        return [r.to_dict() for r in reversed(reports)][:limit]
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag": self.lag.to_dict(),
+            "stalls": self.stalls,
+            "distinct_stacks": len(self.reports),
+            "suppressed_logs": self.suppressed,
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000,
+    threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000,
+    report_interval=float(os.getenv("LOOP_BLOCK_REPORT_INTERVAL", "60")),
+)
+metrics.register("event_loop", loop_monitor.stats)
@@ -0,0 +1,22 @@
+"""
+Metrics Registry
+Author: Gabriel Demetrios Lafis
+
+A minimal registry of named metric sources. Each component registers a
+callable returning a dict of its current counters; the admin metrics
+endpoint collects them on demand, so nothing is computed per request.
+"""
+
+from typing import Callable, Dict
+
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, source: Callable[[], dict]):
+    """Register (or replace) a named metric source."""
+    _sources[name] = source
+
+
+def collect() -> Dict[str, dict]:
+    """Return a snapshot of every registered metric source."""
+    return {name: source() for name, source in _sources.items()}
@@ -0,0 +1,147 @@
+"""
+RESP Client
+Author: Gabriel Demetrios Lafis
+
+Minimal asyncio client for the Redis serialization protocol (RESP2),
+enough for scripted key-value updates: single commands, pipelines
+(many commands written at once, replies read back in order) and
+server-side scripts. Works against Redis or any server speaking the
+same protocol.
+"""
+
+import asyncio
+from typing import Any, List, Optional, Sequence
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from the server."""
+
+
+def encode_command(args: Sequence[Any]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, float):
+            data = repr(arg).encode()
+        else:
+            data = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RespClient:
+    """One lazily opened connection; commands are serialized on it."""
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        timeout: float = 1.0,
+    ):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        self.round_trips = 0
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RespClient":
+        """Build a client from redis://[:password@]host[:port][/db]."""
+        parsed = urlparse(url)
+        db = parsed.path.lstrip("/")
+        return cls(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=parsed.password,
+            **kwargs,
+        )
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for reply in await self._send(setup):
+            if isinstance(reply, RespError):
+                raise reply
+
+    async def _read(self) -> Any:
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [await self._read() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply type: {kind!r}")
+
+    async def _send(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        self._writer.write(b"".join(encode_command(cmd) for cmd in commands))
+        await self._writer.drain()
+        self.round_trips += 1
+        return [await self._read() for _ in commands]
+
+    async def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Send commands in one write and return their replies in order.
+
+        Error replies are returned as RespError instances rather than
+        raised, so one failing command does not hide the others.
+        """
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await asyncio.wait_for(self._send(commands), self.timeout)
+            except Exception:
+                # The stream may hold half a reply, or the connection
+                # failed AUTH/SELECT; start over next time.
+                await self._close()
+                raise
+
+    async def execute(self, *args: Any) -> Any:
+        (reply,) = await self.pipeline([args])
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def _close(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def close(self):
+        async with self._lock:
+            await self._close()
@@ -0,0 +1,199 @@
+"""
+Probabilistic Sketches
+Author: Gabriel Demetrios Lafis
+
+Fixed-memory approximate counters keyed by arbitrary strings. Memory is
+set by width x depth regardless of how many distinct keys are seen, and
+hash collisions can only over-estimate, never under-estimate.
+
+- CountMinSketch: approximate per-key counts
+- WindowedCountMinSketch: counts over a sliding time window, built from
+  two rotating sketches with the previous window linearly weighted
+- MaxSketch: approximate per-key maximum (e.g. "blocked until" times)
+- SpaceSaving: the heaviest keys of a stream with their approximate
+  counts, in memory proportional to k
+- WindowedTopK: SpaceSaving over a sliding time window
+"""
+
+import hashlib
+import heapq
+import time
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _indices(key: str, depth: int, width: int) -> np.ndarray:
+    digest = hashlib.blake2b(key.encode(), digest_size=8 * depth).digest()
+    return np.frombuffer(digest, dtype=np.uint64) % np.uint64(width)
+
+
+class CountMinSketch:
+    """Count-min sketch over string keys."""
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self._rows = np.arange(depth)
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Add to a key's count and return its new estimate."""
+        cols = _indices(key, self.depth, self.width)
+        self.table[self._rows, cols] += np.uint32(count)
+        return int(self.table[self._rows, cols].min())
+
+    def estimate(self, key: str) -> int:
+        cols = _indices(key, self.depth, self.width)
+        return int(self.table[self._rows, cols].min())
+
+    def clear(self):
+        self.table.fill(0)
+
+
+class WindowedCountMinSketch:
+    """Count-min sketch counting only events in the last `window` seconds."""
+
+    def __init__(self, window: float, width: int = 4096, depth: int = 4):
+        self.window = window
+        self._current = CountMinSketch(width, depth)
+        self._previous = CountMinSketch(width, depth)
+        self._window_start = time.monotonic()
+
+    def _rotate(self, now: float):
+        elapsed = now - self._window_start
+        if elapsed < self.window:
+            return
+        if elapsed < 2 * self.window:
+            self._current, self._previous = self._previous, self._current
+            self._window_start += self.window
+        else:
+            self._previous.clear()
+            self._window_start = now
+        self._current.clear()
+
+    def _weighted(self, key: str, current: int, now: float) -> int:
+        # The previous window counts in proportion to its overlap with
+        # the sliding window ending now.
+        overlap = 1.0 - (now - self._window_start) / self.window
+        return current + int(self._previous.estimate(key) * overlap)
+
+    def add(self, key: str, count: int = 1, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        self._rotate(now)
+        return self._weighted(key, self._current.add(key, count), now)
+
+    def estimate(self, key: str, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        self._rotate(now)
+        return self._weighted(key, self._current.estimate(key), now)
+
+
+class MaxSketch:
+    """Per-key running maximum in fixed memory (over-estimates on collision)."""
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self._rows = np.arange(depth)
+        self.table = np.zeros((depth, width), dtype=np.float64)
+
+    def update(self, key: str, value: float):
+        cols = _indices(key, self.depth, self.width)
+        cells = self.table[self._rows, cols]
+        self.table[self._rows, cols] = np.maximum(cells, value)
+
+    def estimate(self, key: str) -> float:
+        cols = _indices(key, self.depth, self.width)
+        return float(self.table[self._rows, cols].min())
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k counter.
+
+    Tracks at most `capacity` keys (2k by default). When full, it keeps
+    the k heaviest and drops the rest in one batch, so an add costs O(1)
+    amortized. A newly seen key starts from the largest count dropped so
+    far. That count is its maximum over-estimate, reported as `error`.
+    """
+
+    def __init__(self, k: int = 100, capacity: Optional[int] = None):
+        self.k = k
+        self.capacity = max(capacity or 2 * k, k + 1)
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.floor = 0
+
+    def add(self, key: str, count: int = 1):
+        current = self.counts.get(key)
+        if current is not None:
+            self.counts[key] = current + count
+            return
+        if len(self.counts) >= self.capacity:
+            self._prune()
+        self.counts[key] = self.floor + count
+        self.errors[key] = self.floor
+
+    def _prune(self):
+        ranked = heapq.nlargest(self.k + 1, self.counts.items(), key=itemgetter(1))
+        self.floor = max(self.floor, ranked[-1][1])
+        self.counts = dict(ranked[: self.k])
+        self.errors = {key: self.errors[key] for key in self.counts}
+
+    def top(self, n: int = 10) -> List[Tuple[str, int, int]]:
+        """The n heaviest keys as (key, count, error)."""
+        ranked = heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+    def clear(self):
+        self.counts.clear()
+        self.errors.clear()
+        self.floor = 0
+
+
+class WindowedTopK:
+    """Top-k keys over the last `window` seconds (two rotating counters)."""
+
+    def __init__(self, window: float, k: int = 100):
+        self.window = window
+        self._current = SpaceSaving(k)
+        self._previous = SpaceSaving(k)
+        self._window_start = time.monotonic()
+
+    def _rotate(self, now: float):
+        elapsed = now - self._window_start
+        if elapsed < self.window:
+            return
+        if elapsed < 2 * self.window:
+            self._current, self._previous = self._previous, self._current
+            self._window_start += self.window
+        else:
+            self._previous.clear()
+            self._window_start = now
+        self._current.clear()
+
+    def add(self, key: str, count: int = 1, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._rotate(now)
+        self._current.add(key, count)
+
+    def top(self, n: int = 10, now: Optional[float] = None) -> List[dict]:
+        now = time.monotonic() if now is None else now
+        self._rotate(now)
+        # The previous window counts in proportion to its overlap with
+        # the sliding window ending now.
+        overlap = 1.0 - (now - self._window_start) / self.window
+        merged: Dict[str, List[float]] = {}
+        for counter, weight in ((self._current, 1.0), (self._previous, overlap)):
+            for key, count in counter.counts.items():
+                entry = merged.setdefault(key, [0.0, 0.0])
+                entry[0] += count * weight
+                entry[1] += counter.errors[key] * weight
+        ranked = heapq.nlargest(n, merged.items(), key=lambda item: item[1][0])
+        return [
+            {"key": key, "count": int(count), "error": int(error)}
+            for key, (count, error) in ranked
+            if count >= 1
+        ]
@@ -0,0 +1,426 @@
+"""
+Request Tracing
+Author: Gabriel Demetrios Lafis
+
+In-process spans showing where a request's time goes: each middleware
+stage, JWT verification, bcrypt, the route handler, rate-limit backend
+round trips and audit fsyncs.
+
+Trace context follows W3C Trace Context: an incoming `traceparent`
+continues the caller's trace (and its sampling decision), and
+`trace_headers()` produces the header to forward to upstream calls.
+
+Every request records its spans (a slotted object per span, kept in a
+list on the request's trace), and the decision to keep them is made when
+the request finishes:
+- head: the caller's `traceparent` was sampled, or a `sample_rate` coin
+  flip at the start of the request came up
+- tail: the request took at least `slow_ms` or answered 5xx
+
+Kept traces go to a fixed-size ring buffer for the admin endpoint and,
+if configured, are exported in the background as OTLP/JSON, either
+appended to a file (one export request per line, like the OpenTelemetry
+collector's file exporter) or POSTed to a collector's `/v1/traces`. The
+collector URL must be http or https; anything else fails at startup.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import urllib.parse
+import urllib.request
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = "traceparent"
+# Trace Context Level 2 response header, same format as traceparent
+TRACERESPONSE = "traceresponse"
+
+_NO_SPAN = nullcontext()
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace id, parent span id, sampled) from a traceparent header."""
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4:
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if (
+        len(version) != 2
+        or version == "ff"
+        or (version == "00" and len(parts) != 4)
+        or len(trace_id) != 32
+        or len(parent_id) != 16
+        or len(flags) != 2
+    ):
+        return None
+    try:
+        sampled = bool(int(flags, 16) & 1)
+        int(version + trace_id + parent_id, 16)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, sampled
+
+
+def _new_id(bits: int) -> str:
+    # Ids need to be unique, not unpredictable: getrandbits avoids a
+    # urandom syscall per span. Never all zeros, which W3C reserves.
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+class Trace:
+    """All spans recorded for one request."""
+
+    __slots__ = ("trace_id", "remote_parent", "sampled", "wall_ns", "spans", "done")
+
+    def __init__(self, trace_id: str, remote_parent: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.remote_parent = remote_parent
+        self.sampled = sampled
+        self.wall_ns = time.time_ns() - time.perf_counter_ns()
+        self.spans: List["Span"] = []
+        self.done = False
+
+
+class Span:
+    """
+    One timed operation within a trace, used as a context manager.
+
+    Span ids are generated on first use, so spans of traces that are
+    dropped never pay for one.
+    """
+
+    __slots__ = (
+        "trace",
+        "parent",
+        "name",
+        "attributes",
+        "start",
+        "end",
+        "_id",
+        "_token",
+    )
+
+    def __init__(self, trace: Trace, name: str, parent: Optional["Span"], attributes):
+        self.trace = trace
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter_ns()
+        self.end = 0
+        self._id = None
+
+    @property
+    def span_id(self) -> str:
+        if self._id is None:
+            self._id = _new_id(64)
+        return self._id
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        if self.parent is None:
+            return self.trace.remote_parent
+        return self.parent.span_id
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end - self.start) / 1e6
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+
+
+class Tracer:
+    """Creates spans, decides which traces to keep and exports them."""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.01,
+        slow_ms: float = 500.0,
+        buffer_size: int = 1000,
+        max_spans: int = 256,
+        export_file: Optional[str] = None,
+        export_url: Optional[str] = None,
+        export_interval: float = 5.0,
+    ):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.max_spans = max_spans
+        self.export_file = export_file
+        self.export_url = _check_export_url(export_url) if export_url else None
+        self.export_interval = export_interval
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self._pending: List[Trace] = []
+        self._task: Optional[asyncio.Task] = None
+        self.started = 0
+        self.kept = 0
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    @property
+    def exporting(self) -> bool:
+        return bool(self.export_file or self.export_url)
+
+    # --- recording ------------------------------------------------------
+
+    def start_trace(self, traceparent: Optional[str], name: str, **attributes):
+        """Start a request's root span, continuing an incoming trace if any."""
+        self.started += 1
+        parent = parse_traceparent(traceparent)
+        if parent is None:
+            trace = Trace(_new_id(128), None, random.random() < self.sample_rate)
+        else:
+            trace = Trace(*parent)
+        root = Span(trace, name, None, attributes)
+        trace.spans.append(root)
+        return root, _current.set(root)
+
+    def finish_trace(self, root: Span, token, status_code: int):
+        """End the root span and keep the trace if head or tail sampled."""
+        _current.reset(token)
+        root.end = time.perf_counter_ns()
+        root.attributes["http.status_code"] = status_code
+        trace = root.trace
+        trace.done = True
+        if not (trace.sampled or status_code >= 500 or root.duration_ms >= self.slow_ms):
+            return
+        self.kept += 1
+        self.buffer.append(trace)
+        if self.exporting:
+            if len(self._pending) < self.buffer.maxlen:
+                self._pending.append(trace)
+            else:
+                self.dropped += 1
+
+    def span(self, name: str, **attributes):
+        """Time a block as a child of the current span (no-op outside a trace)."""
+        parent = _current.get()
+        if parent is None or parent.trace.done:
+            return _NO_SPAN
+        trace = parent.trace
+        span = Span(trace, name, parent, attributes)
+        if len(trace.spans) < self.max_spans:
+            trace.spans.append(span)
+        return span
+
+    def current_traceparent(self) -> Optional[str]:
+        span = _current.get()
+        if span is None:
+            return None
+        return format_traceparent(span.trace.trace_id, span.span_id, span.trace.sampled)
+
+    # --- reading --------------------------------------------------------
+
+    @staticmethod
+    def to_dict(trace: Trace) -> Dict:
+        """A trace as a flat span list with offsets and self time."""
+        root = trace.spans[0]
+        spans = [span for span in trace.spans if span.end]
+        child_ns: Dict[int, int] = {}
+        for span in spans[1:]:
+            key = id(span.parent)
+            child_ns[key] = child_ns.get(key, 0) + span.end - span.start
+        return {
+            "trace_id": trace.trace_id,
+            "name": root.name,
+            "duration_ms": round(root.duration_ms, 3),
+            "sampled": trace.sampled,
+            "start_unix_ms": (trace.wall_ns + root.start) // 1_000_000,
+            "attributes": root.attributes,
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "offset_ms": round((span.start - root.start) / 1e6, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    # Concurrent children (batch sub-requests) can overlap
+                    "self_ms": round(
+                        max(0, span.end - span.start - child_ns.get(id(span), 0)) / 1e6,
+                        3,
+                    ),
+                    "attributes": span.attributes,
+                }
+                for span in spans
+            ],
+        }
+
+    def recent(self, min_ms: float = 0.0, limit: int = 20) -> List[Dict]:
+        """Kept traces of at least `min_ms`, newest first."""
+        traces = []
+        for trace in reversed(self.buffer):
+            if trace.spans[0].duration_ms >= min_ms:
+                traces.append(self.to_dict(trace))
+                if len(traces) >= limit:
+                    break
+        return traces
+
+    # --- export ---------------------------------------------------------
+
+    @staticmethod
+    def to_otlp(traces: List[Trace]) -> Dict:
+        """OTLP/JSON ExportTraceServiceRequest for a batch of traces."""
+        spans = []
+        for trace in traces:
+            for span in trace.spans:
+                if not span.end:
+                    continue
+                otlp = {
+                    "traceId": trace.trace_id,
+                    "spanId": span.span_id,
+                    "name": span.name,
+                    "kind": 2 if span is trace.spans[0] else 1,
+                    "startTimeUnixNano": str(trace.wall_ns + span.start),
+                    "endTimeUnixNano": str(trace.wall_ns + span.end),
+                    "attributes": [
+                        {"key": key, "value": {"stringValue": str(value)}}
+                        for key, value in span.attributes.items()
+                    ],
+                }
+                if span.parent_id:
+                    otlp["parentSpanId"] = span.parent_id
+                if "error" in span.attributes:
+                    otlp["status"] = {"code": 2}
+                spans.append(otlp)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "api-gateway"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+
+    def _export(self, traces: List[Trace]):
+        payload = json.dumps(self.to_otlp(traces), separators=(",", ":")).encode()
+        if self.export_file:
+            with open(self.export_file, "ab") as f:
+                f.write(payload + b"\n")
+        if self.export_url:
+            request = urllib.request.Request(
+                self.export_url,
+                data=payload,
+                headers={"Content-Type": "application/json"},
+            )
+            # Scheme limited to http(s) by _check_export_url
+            with urllib.request.urlopen(request, timeout=5):  # nosec B310
+                pass
+
+    async def flush(self):
+        """Export every kept trace not exported yet."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._export, batch)
+        except (OSError, ValueError) as exc:
+            # A failure must not end the export task
+            self.export_errors += 1
+            logger.warning("Trace export failed: %s", exc)
+            return
+        self.exported += len(batch)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.export_interval)
+            await self.flush()
+
+    def start(self):
+        if self.exporting and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.exporting:
+            await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "started": self.started,
+            "kept": self.kept,
+            "buffered": len(self.buffer),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+        }
+
+
+def _check_export_url(url: str) -> str:
+    """Return url if it is an http(s) URL with a host, else raise ValueError."""
+    parts = urllib.parse.urlsplit(url)
+    parts.port  # raises ValueError for a malformed port
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"TRACE_EXPORT_URL must be an http(s) URL, got {url!r}")
+    return url
+
+
+tracer = Tracer(
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.01")),
+    slow_ms=float(os.getenv("TRACE_SLOW_MS", "500")),
+    buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", "1000")),
+    export_file=os.getenv("TRACE_EXPORT_FILE") or None,
+    export_url=os.getenv("TRACE_EXPORT_URL") or None,
+    export_interval=float(os.getenv("TRACE_EXPORT_INTERVAL", "5")),
+)
+metrics.register("tracing", tracer.stats)
+
+
+def trace_headers() -> Dict[str, str]:
+    """Headers propagating the current trace to an upstream call."""
+    traceparent = tracer.current_traceparent()
+    return {TRACEPARENT: traceparent} if traceparent else {}
+
+
+def traced_middleware(name: str):
+    """Class decorator timing a BaseHTTPMiddleware (and everything inside it)."""
+
+    def decorator(cls):
+        call = cls.__call__
+
+        async def __call__(self, scope, receive, send):
+            if scope["type"] != "http":
+                return await call(self, scope, receive, send)
+            with tracer.span(name):
+                await call(self, scope, receive, send)
+
+        cls.__call__ = __call__
+        return cls
+
+    return decorator
@@ -0,0 +1,47 @@
+"""
+Traffic Analytics
+Author: Gabriel Demetrios Lafis
+
+Rolling heavy-hitter tables for "who is hammering us right now": the
+busiest clients (by rate-limit cost spent), routes, and clients being
+rate-limited. Each table is a windowed Space-Saving counter, so memory
+is bounded by k whatever the traffic, and recording a request is a dict
+update.
+
+The rate limiter feeds clients and 429s. The request logger feeds
+routes.
+"""
+
+import os
+
+from src.utils.sketches import WindowedTopK
+
+
+class TrafficAnalytics:
+    """Windowed top-k clients, routes and rate-limited clients."""
+
+    def __init__(self, window: float = 60.0, k: int = 100):
+        self.window = window
+        self.clients = WindowedTopK(window, k)
+        self.routes = WindowedTopK(window, k)
+        self.throttled = WindowedTopK(window, k)
+
+    def record_client(self, client: str, cost: int = 1):
+        self.clients.add(client, cost)
+
+    def record_route(self, method: str, path: str):
+        self.routes.add(f"{method} {path}")
+
+    def record_throttled(self, client: str):
+        self.throttled.add(client)
+
+    def top(self, n: int = 10) -> dict:
+        return {
+            "window_seconds": self.window,
+            "clients": self.clients.top(n),
+            "routes": self.routes.top(n),
+            "throttled": self.throttled.top(n),
+        }
+
+
+traffic_analytics = TrafficAnalytics(window=float(os.getenv("TRAFFIC_WINDOW_SECONDS", "60")))
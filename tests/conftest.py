@@ -0,0 +1,29 @@
+"""Shared test fixtures"""
+
+import pytest
+
+from src.main import app
+from src.middleware.rate_limiter import RateLimiterMiddleware
+
+
+def _iter_middleware(app_):
+    """Walk the built middleware stack from the outermost layer inward."""
+    layer = app_.middleware_stack
+    while layer is not None:
+        yield layer
+        layer = getattr(layer, "app", None)
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """
+    Give every test a fresh rate-limit budget.
+
+    All test modules share one app (and one client address), so without
+    this the suite as a whole would exhaust the per-client bucket.
+    """
+    if app.middleware_stack is not None:
+        for layer in _iter_middleware(app):
+            if isinstance(layer, RateLimiterMiddleware):
+                layer.backend.reset()
+    yield
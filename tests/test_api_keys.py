@@ -0,0 +1,138 @@
+"""Test API-key authentication"""
+
+from fastapi.testclient import TestClient
+
+from src.auth.api_keys import ApiKeyStore
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+
+client = TestClient(app)
+
+USER = {"user_id": 2, "username": "user", "email": "user@example.com"}
+
+
+def _admin_headers() -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": 981,
+            "username": "u981",
+            "email": "u981@example.com",
+            "is_admin": True,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _create_key(scopes, tier="standard") -> dict:
+    response = client.post(
+        "/api/v1/admin/api-keys",
+        json={"user_id": 2, "name": "algo", "scopes": scopes, "tier": tier},
+        headers=_admin_headers(),
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestApiKeyStore:
+    """Test the HMAC-indexed key table"""
+
+    def test_resolve(self):
+        store = ApiKeyStore(b"pepper")
+        raw_key, record = store.create(USER, "bot", ["trading:read"])
+        assert store.resolve(raw_key) is record
+        assert store.resolve(raw_key) is record
+        assert store.resolve(raw_key + "x") is None
+        assert store.stats()["lookups"] == 3
+
+    def test_plaintext_not_stored(self):
+        store = ApiKeyStore(b"pepper")
+        raw_key, _ = store.create(USER, "bot", ["trading:read"])
+        store.resolve(raw_key)
+        assert raw_key not in repr(vars(store))
+        assert raw_key not in str(store.list())
+
+    def test_revocation_applies_to_the_next_call(self):
+        store = ApiKeyStore(b"pepper")
+        raw_key, record = store.create(USER, "bot", ["trading:read"])
+        store.resolve(raw_key)
+        store.revoke(record.key_id)
+        assert store.resolve(raw_key) is None
+
+    def test_shared_file_across_workers(self, tmp_path):
+        path = str(tmp_path / "api-keys")
+        worker_a = ApiKeyStore(b"pepper", path=path, sync_interval=0)
+        worker_b = ApiKeyStore(b"pepper", path=path, sync_interval=0)
+        raw_key, record = worker_a.create(USER, "bot", ["trading:read"])
+
+        assert worker_b.resolve(raw_key).principal == record.principal
+        worker_a.revoke(record.key_id)
+        assert worker_b.resolve(raw_key) is None
+        assert raw_key not in open(path).read()
+
+    def test_keys_survive_restart(self, tmp_path):
+        path = str(tmp_path / "api-keys")
+        raw_key, record = ApiKeyStore(b"pepper", path=path).create(USER, "bot", ["users:read"])
+        restarted = ApiKeyStore(b"pepper", path=path)
+        assert restarted.resolve(raw_key).key_id == record.key_id
+        assert restarted.list() == [record.to_dict()]
+
+
+class TestApiKeyRoutes:
+    """Test API keys on the request path and admin management"""
+
+    def test_scoped_access(self):
+        created = _create_key(["trading:read"])
+        headers = {"X-API-Key": created["api_key"]}
+
+        orders = client.get("/api/v1/trading/orders", headers=headers)
+        assert orders.status_code == 200
+        assert orders.json()["user_id"] == 2
+
+        submit = client.post(
+            "/api/v1/trading/orders",
+            json={"symbol": "KEY", "side": "buy", "quantity": 1, "price": 1},
+            headers=headers,
+        )
+        assert submit.status_code == 403
+
+        # API keys never grant admin access
+        assert client.get("/api/v1/admin/users", headers=headers).status_code == 403
+
+    def test_tier_sets_rate_limit(self):
+        created = _create_key(["users:read"], tier="professional")
+        response = client.get("/api/v1/users/profile", headers={"X-API-Key": created["api_key"]})
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit"] == "3000"
+
+    def test_list_and_revoke(self):
+        created = _create_key(["users:read"])
+        headers = {"X-API-Key": created["api_key"]}
+        assert client.get("/api/v1/users/profile", headers=headers).status_code == 200
+
+        listed = client.get("/api/v1/admin/api-keys", headers=_admin_headers()).json()
+        entry = next(k for k in listed["api_keys"] if k["key_id"] == created["key_id"])
+        assert "api_key" not in entry
+
+        revoked = client.delete(
+            f"/api/v1/admin/api-keys/{created['key_id']}", headers=_admin_headers()
+        )
+        assert revoked.status_code == 200
+        assert client.get("/api/v1/users/profile", headers=headers).status_code == 401
+
+    def test_logout_with_api_key_rejected(self):
+        created = _create_key(["auth:read"])
+        response = client.post("/api/v1/auth/logout", headers={"X-API-Key": created["api_key"]})
+        assert response.status_code == 400
+        assert "api-keys" in response.json()["detail"]
+
+    def test_invalid_key_rejected(self):
+        response = client.get("/api/v1/users/profile", headers={"X-API-Key": "sfg_bogus"})
+        assert response.status_code == 401
+
+    def test_unknown_scope_rejected(self):
+        response = client.post(
+            "/api/v1/admin/api-keys",
+            json={"user_id": 2, "name": "x", "scopes": ["admin:all"]},
+            headers=_admin_headers(),
+        )
+        assert response.status_code == 422
@@ -0,0 +1,169 @@
+"""Test the hash-chained audit log"""
+
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.utils.audit import AuditLog, audit_log
+
+client = TestClient(app)
+
+
+def _headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def log(tmp_path):
+    audit = AuditLog(str(tmp_path), segment_bytes=4096)
+    yield audit
+    audit.close()
+
+
+@pytest.fixture
+def app_audit(tmp_path):
+    audit_log.open(str(tmp_path))
+    yield audit_log
+    audit_log.close()
+
+
+class TestAuditLog:
+    """Test writing, chaining and querying"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writes_share_fsyncs(self, log):
+        await asyncio.gather(*(log.write("login", user_id=i % 10) for i in range(500)))
+        assert log.records == 500
+        assert log.fsyncs < 500
+        assert log.verify() == {"valid": True, "records": 500, "head": log.last_hash}
+        # 4 KB segments force rotation
+        assert len(log.segments) > 1
+
+    @pytest.mark.asyncio
+    async def test_query_by_user_and_time(self, log):
+        for i in range(300):
+            await log.write("login", user_id=i % 3, n=i)
+        records = log.query(user_id=1, limit=1000)
+        assert [r["detail"]["n"] for r in records] == list(range(298, 0, -3))
+
+        middle = log.query(limit=1000)[150]["ts"]
+        since = log.query(since=middle, limit=1000)
+        assert all(r["ts"] >= middle for r in since)
+        assert len(log.query(user_id=2, limit=5)) == 5
+
+    @pytest.mark.asyncio
+    async def test_tampering_detected(self, log, tmp_path):
+        for i in range(20):
+            await log.write("login", user_id=i)
+        log.close()
+        path = log.segments[0].log_path
+        with open(path, "rb") as f:
+            lines = f.readlines()
+        lines[3] = lines[3].replace(b'"outcome":"success"', b'"outcome":"failure"')
+        with open(path, "wb") as f:
+            f.writelines(lines)
+
+        result = AuditLog(str(tmp_path)).verify()
+        assert result["valid"] is False
+        assert result["broken_at_seq"] == 4
+
+    @pytest.mark.asyncio
+    async def test_deleted_record_detected(self, log, tmp_path):
+        for i in range(5):
+            await log.write("login", user_id=i)
+        log.close()
+        path = log.segments[0].log_path
+        with open(path, "rb") as f:
+            lines = f.readlines()
+        with open(path, "wb") as f:
+            f.writelines(lines[:2] + lines[3:])
+        assert AuditLog(str(tmp_path)).verify()["valid"] is False
+
+    @pytest.mark.asyncio
+    async def test_reopen_continues_chain_after_torn_write(self, log, tmp_path):
+        for i in range(5):
+            await log.write("login", user_id=i)
+        log.close()
+        with open(log.segments[-1].log_path, "ab") as f:
+            f.write(b'{"seq":6,"ts":1')
+
+        reopened = AuditLog(str(tmp_path))
+        await reopened.write("logout", user_id=1)
+        reopened.close()
+        result = AuditLog(str(tmp_path)).verify()
+        assert result == {"valid": True, "records": 6, "head": reopened.last_hash}
+        assert [r["event"] for r in reopened.query(user_id=1)] == ["logout", "login"]
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_leaves_chain_intact(self, log, monkeypatch):
+        await log.write("login", user_id=1)
+        head, size = log.last_hash, os.path.getsize(log.segments[-1].log_path)
+
+        def failing_sync():
+            raise OSError("disk full")
+
+        monkeypatch.setattr(log, "_sync", failing_sync)
+        with pytest.raises(OSError):
+            await log.write("login", user_id=2)
+        assert (log.seq, log.last_hash) == (1, head)
+        assert os.path.getsize(log.segments[-1].log_path) == size
+        assert len(log.segments[-1].index()) == 1
+
+        monkeypatch.undo()
+        await log.write("logout", user_id=1)
+        assert log.verify() == {"valid": True, "records": 2, "head": log.last_hash}
+        assert [r["seq"] for r in log.query()] == [2, 1]
+
+
+class TestAuditedRoutes:
+    """Test that auth and admin routes leave audit records"""
+
+    def test_login_success_and_failure(self, app_audit):
+        client.post(
+            "/api/v1/auth/login",
+            json={"email": "user@example.com", "password": "wrong-password"},
+        )
+        client.post(
+            "/api/v1/auth/login",
+            json={"email": "user@example.com", "password": "user123"},
+        )
+        records = app_audit.query(user_id=2)
+        assert [(r["event"], r["outcome"]) for r in records] == [
+            ("login", "success"),
+            ("login", "failure"),
+        ]
+        assert records[0]["request_id"]
+
+    def test_admin_access_and_denial(self, app_audit):
+        client.get("/api/v1/admin/users", headers=_headers(981))
+        response = client.get("/api/v1/admin/audit?user_id=981", headers=_headers(982, True))
+        assert response.status_code == 200
+        [record] = response.json()["records"]
+        assert record["outcome"] == "denied"
+        assert record["detail"] == {"method": "GET", "path": "/api/v1/admin/users"}
+
+        response = client.get("/api/v1/admin/audit/verify", headers=_headers(982, True))
+        assert response.json()["valid"] is True
+        # Both queries were themselves audited
+        assert response.json()["records"] == 3
+
+    def test_records_are_json_lines(self, app_audit, tmp_path):
+        client.get("/api/v1/admin/users", headers=_headers(983, True))
+        [name] = [n for n in os.listdir(tmp_path) if n.endswith(".log")]
+        with open(tmp_path / name) as f:
+            record = json.loads(f.readline())
+        assert record["event"] == "admin_access"
+        assert record["prev"] == "0" * 64
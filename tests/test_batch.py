@@ -0,0 +1,149 @@
+"""Test batch API endpoint"""
+
+from unittest.mock import patch
+
+import jwt
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+
+client = TestClient(app)
+
+
+def _headers(user_id: int = 941) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": False,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestBatchRoutes:
+    """Test batched sub-request execution"""
+
+    def test_batch_executes_sub_requests(self):
+        response = client.post(
+            "/api/v1/batch",
+            json={
+                "requests": [
+                    {"id": "profile", "path": "/api/v1/users/profile"},
+                    {"id": "me", "path": "/api/v1/auth/me"},
+                    {
+                        "id": "order",
+                        "method": "POST",
+                        "path": "/api/v1/trading/orders",
+                        "body": {
+                            "symbol": "BAT",
+                            "side": "buy",
+                            "quantity": 1,
+                            "price": 5,
+                        },
+                    },
+                    {"id": "missing", "path": "/api/v1/nope"},
+                ]
+            },
+            headers=_headers(),
+        )
+        assert response.status_code == 200
+        results = {r["id"]: r for r in response.json()["responses"]}
+        assert results["profile"]["status"] == 200
+        assert results["profile"]["body"]["username"] == "u941"
+        assert results["me"]["status"] == 200
+        assert results["order"]["status"] == 201
+        assert results["order"]["body"]["symbol"] == "BAT"
+        assert results["missing"]["status"] == 404
+
+    def test_token_verified_once(self):
+        headers = _headers(942)
+        with patch("src.auth.jwt_handler.jwt.decode", wraps=jwt.decode) as decode:
+            client.post(
+                "/api/v1/batch",
+                json={"requests": [{"path": "/api/v1/users/profile"}] * 5},
+                headers=headers,
+            )
+        assert decode.call_count == 1
+
+    def test_sub_request_errors_are_isolated(self):
+        response = client.post(
+            "/api/v1/batch",
+            json={
+                "requests": [
+                    {"path": "/api/v1/admin/users"},
+                    {"path": "/api/v1/batch"},
+                    {"path": "/health"},
+                ]
+            },
+            headers=_headers(),
+        )
+        statuses = [r["status"] for r in response.json()["responses"]]
+        assert statuses == [403, 400, 400]
+
+    def test_fan_out_is_capped(self):
+        response = client.post(
+            "/api/v1/batch",
+            json={"requests": [{"path": "/api/v1/users/profile"}] * 11},
+            headers=_headers(),
+        )
+        assert response.status_code == 422
+
+    def test_sub_requests_charge_rate_limit(self):
+        headers = _headers(943)
+        first = client.get("/api/v1/users/profile", headers=headers)
+        client.post(
+            "/api/v1/batch",
+            json={"requests": [{"path": "/api/v1/users/profile"}] * 10},
+            headers=headers,
+        )
+        after = client.get("/api/v1/users/profile", headers=headers)
+        spent = int(first.headers["X-RateLimit-Remaining"]) - int(
+            after.headers["X-RateLimit-Remaining"]
+        )
+        assert spent >= 11
+
+    def test_sub_requests_pay_their_route_cost(self):
+        headers = _headers(944)
+        legs = {"legs": [{"symbol": "IBM", "side": "buy", "quantity": 1, "price": 1}]}
+        sub = {"method": "POST", "path": "/api/v1/trading/orders/batch", "body": legs}
+        # Four baskets cost 40 tokens, more than the per-second burst
+        response = client.post("/api/v1/batch", json={"requests": [sub] * 4}, headers=headers)
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+    def test_sub_requests_pass_through_idempotency(self):
+        order = {
+            "id": "order",
+            "method": "POST",
+            "path": "/api/v1/trading/orders",
+            "body": {"symbol": "IDB", "side": "buy", "quantity": 1, "price": 5},
+            "idempotency_key": "batch-order-1",
+        }
+        headers = _headers(946)
+        first = client.post("/api/v1/batch", json={"requests": [order]}, headers=headers)
+        retry = client.post("/api/v1/batch", json={"requests": [order]}, headers=headers)
+
+        [placed] = first.json()["responses"]
+        [replayed] = retry.json()["responses"]
+        assert placed["status"] == replayed["status"] == 201
+        assert placed["body"]["order_id"] == replayed["body"]["order_id"]
+        orders = client.get("/api/v1/trading/orders", headers=headers).json()
+        assert orders["total"] == 1
+
+    def test_refresh_token_is_not_a_user_for_rate_limits(self):
+        user = {"user_id": 945, "username": "u945", "email": "u945@example.com"}
+        refresh = JWTHandler.create_refresh_token(user)
+        access = JWTHandler.create_access_token(user)
+        anonymous = client.get("/api/v1/users/profile")
+        as_refresh = client.get(
+            "/api/v1/users/profile", headers={"Authorization": f"Bearer {refresh}"}
+        )
+        as_access = client.get(
+            "/api/v1/users/profile", headers={"Authorization": f"Bearer {access}"}
+        )
+        limit = as_refresh.headers["X-RateLimit-Limit"]
+        assert limit == anonymous.headers["X-RateLimit-Limit"]
+        assert limit != as_access.headers["X-RateLimit-Limit"]
@@ -0,0 +1,141 @@
+"""Test adaptive concurrency limiting"""
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from src.auth.jwt_handler import JWTHandler
+from src.middleware.concurrency_limiter import (
+    AdaptiveConcurrencyLimit,
+    AdaptiveConcurrencyMiddleware,
+    tenant_of,
+)
+
+
+def _app(limiter: AdaptiveConcurrencyLimit) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(AdaptiveConcurrencyMiddleware, limiter=limiter)
+
+    @app.get("/work")
+    async def work():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"a", b"b"]))
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+
+class TestAdaptiveConcurrencyLimit:
+    """Test the AIMD limit"""
+
+    def test_rejects_above_limit(self):
+        limit = AdaptiveConcurrencyLimit(initial_limit=2)
+        assert limit.try_acquire()
+        assert limit.try_acquire()
+        assert not limit.try_acquire()
+        assert limit.stats()["rejected"] == 1
+
+    def test_latency_spike_shrinks_limit(self):
+        limit = AdaptiveConcurrencyLimit(initial_limit=50, min_limit=5)
+        for _ in range(20):
+            limit.try_acquire()
+            limit.release(0.010)
+        before = limit.limit
+
+        for _ in range(20):
+            limit.try_acquire()
+            limit.release(0.200)
+        assert limit.limit < before
+        assert limit.limit >= 5
+
+    def test_healthy_latency_grows_busy_limit(self):
+        limit = AdaptiveConcurrencyLimit(initial_limit=4, max_limit=10)
+        for _ in range(200):
+            while limit.try_acquire():
+                pass
+            limit.release(0.010)
+        assert 4 < limit.limit <= 10
+
+    def test_slow_route_mix_is_not_congestion(self):
+        limit = AdaptiveConcurrencyLimit(initial_limit=100)
+        for i in range(2000):
+            limit.try_acquire()
+            if i % 33 == 0:
+                limit.release(0.250, "POST /api/v1/auth/login")
+            else:
+                limit.release(0.005, "GET /api/v1/trading/orders")
+        assert limit.limit >= 100
+        assert limit.stats()["decreases"] == 0
+
+    def test_decreases_once_per_window(self):
+        limit = AdaptiveConcurrencyLimit(initial_limit=100)
+        limit.try_acquire()
+        limit.release(0.010)
+        for _ in range(80):
+            limit.try_acquire()
+            limit.release(0.100)
+        # One cut; the next waits for a limit's worth of completions
+        assert limit.limit == 90
+        for _ in range(20):
+            limit.try_acquire()
+            limit.release(0.100)
+        assert limit.limit == 81
+
+
+class TestAdaptiveConcurrencyMiddleware:
+    """Test load shedding in the middleware"""
+
+    def test_sheds_with_retry_after(self):
+        limiter = AdaptiveConcurrencyLimit(initial_limit=1, min_limit=1)
+        client = TestClient(_app(limiter))
+        assert client.get("/work").status_code == 200
+
+        limiter.try_acquire()  # occupy the only slot
+        response = client.get("/work")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+        # Health checks are never shed
+        assert client.get("/health").status_code == 200
+
+    def test_streaming_response_gives_no_latency_sample(self):
+        limiter = AdaptiveConcurrencyLimit()
+        client = TestClient(_app(limiter))
+        assert client.get("/stream").content == b"ab"
+        assert limiter.baselines == {}
+        assert limiter.in_flight == 0
+
+        client.get("/work")
+        assert list(limiter.baselines) == ["GET /work"]
+
+    def test_tenant_is_the_authenticated_caller(self):
+        def request(headers):
+            return Request(
+                {
+                    "type": "http",
+                    "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+                    "client": ("203.0.113.9", 1000),
+                }
+            )
+
+        user = {"user_id": 7, "username": "u7", "email": "u7@example.com"}
+        access = JWTHandler.create_access_token(user)
+        refresh = JWTHandler.create_refresh_token(user)
+        assert tenant_of(request({"Authorization": f"Bearer {access}"})) == "user:7"
+        assert tenant_of(request({"Authorization": f"Bearer {refresh}"})) == "ip:203.0.113.9"
+        assert tenant_of(request({"Authorization": "Bearer junk"})) == "ip:203.0.113.9"
+
+    def test_metrics_registered(self):
+        from src.main import app
+        from src.utils import metrics
+
+        TestClient(app).get("/")
+        stats = metrics.collect()["concurrency"]
+        assert {"limit", "in_flight"} <= set(stats)
@@ -0,0 +1,210 @@
+"""Test the hot-reloadable gateway config"""
+
+import asyncio
+import json
+import os
+import signal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.middleware.cors import CORSMiddleware
+from src.middleware.rate_limit_backend import LocalBackend
+from src.middleware.rate_limiter import RateLimiterMiddleware
+from src.middleware.security_headers import SecurityHeadersMiddleware
+from src.utils.config import ConfigStore, GatewayConfig, gateway_config
+
+client = TestClient(app)
+
+
+def _headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _app(store: ConfigStore) -> FastAPI:
+    test_app = FastAPI()
+
+    @test_app.get("/ping")
+    async def ping():
+        return {"version": store.current.version}
+
+    @test_app.get("/reload")
+    async def reload_mid_request():
+        store.load({"security_headers": {"X-Frame-Options": "SAMEORIGIN"}})
+        return {"version": store.current.version}
+
+    test_app.add_middleware(SecurityHeadersMiddleware, config=store)
+    test_app.add_middleware(RateLimiterMiddleware, config=store, backend=LocalBackend())
+    test_app.add_middleware(CORSMiddleware, config=store)
+    return test_app
+
+
+class TestCompile:
+    """Test validation and compilation"""
+
+    def test_defaults_and_overrides(self):
+        config = GatewayConfig(
+            {
+                "rate_limit": {
+                    "requests_per_minute": 10,
+                    "tiers": {"user": [{"requests": 99, "period": 60}]},
+                    "routes": {"GET /x/{id}": {"name": "x", "cost": 3}},
+                },
+                "security_headers": {"X-XSS-Protection": None},
+            }
+        )
+        assert config.rate_limit.tier_limits["anonymous"][0].requests == 10
+        assert config.rate_limit.tier_limits["user"][0].requests == 99
+        assert config.rate_limit.policies.lookup("GET", "/x/7").cost == 3
+        assert config.rate_limit.policies.lookup("POST", "/api/v1/auth/login").cost == 5
+        assert "X-XSS-Protection" not in dict(config.security_headers)
+        with pytest.raises(AttributeError):
+            config.cors = None
+        with pytest.raises(TypeError):
+            config.rate_limit.tier_limits["user"] = ()
+
+    def test_header_values_are_sendable(self):
+        config = GatewayConfig({"security_headers": {"X-Note": "caf\u00e9\tok"}})
+        assert ("X-Note", "caf\u00e9\tok") in config.security_headers
+
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            {"ratelimit": {}},
+            {"rate_limit": {"requests_per_minute": 0}},
+            {"rate_limit": {"tiers": {"guest": [{"requests": 1, "period": 1}]}}},
+            {"circuit_breaker": {"failure_threshold": "5"}},
+            {"cors": {"allow_origins": "https://a.example"}},
+            {"security_headers": {"X-Frame-Options": "DENY\r\nX-Evil: 1"}},
+            {"security_headers": {"X-Price": "\u20ac"}},
+            {"security_headers": {"X-Bell": "a\x07b"}},
+            {"security_headers": {"X-A\r\nSet-Cookie": "x"}},
+            {"security_headers": {"Bad Name:": "x"}},
+            {"security_headers": {"": "x"}},
+        ],
+    )
+    def test_invalid_config_keeps_current(self, raw):
+        store = ConfigStore()
+        current = store.current
+        with pytest.raises(ValueError):
+            store.load(raw)
+        assert store.current is current
+
+
+class TestHotReload:
+    """Test swapping configs under a running app"""
+
+    def test_in_flight_request_keeps_its_snapshot(self):
+        store = ConfigStore()
+        test_client = TestClient(_app(store))
+        response = test_client.get("/reload")
+        assert response.json()["version"] == 2
+        assert response.headers["X-Frame-Options"] == "DENY"
+        assert test_client.get("/ping").headers["X-Frame-Options"] == "SAMEORIGIN"
+
+    def test_windows_keep_their_buckets_across_reloads(self):
+        minute = {"requests": 10, "period": 60}
+        hour = {"requests": 100, "period": 3600}
+        store = ConfigStore()
+        store.load({"rate_limit": {"tiers": {"anonymous": [minute, hour]}}})
+        test_client = TestClient(_app(store))
+        for _ in range(5):
+            assert test_client.get("/ping").status_code == 200
+
+        # Reordered windows: each keeps its own bucket
+        store.load({"rate_limit": {"tiers": {"anonymous": [hour, minute]}}})
+        response = test_client.get("/ping")
+        assert response.headers["X-RateLimit-Limit"] == "100"
+        assert response.headers["X-RateLimit-Remaining"] == "94"
+
+        # Dropping a window leaves the other one as it was
+        store.load({"rate_limit": {"tiers": {"anonymous": [minute]}}})
+        response = test_client.get("/ping")
+        assert response.headers["X-RateLimit-Remaining"] == "3"
+
+        # A changed window is a new bucket
+        store.load({"rate_limit": {"tiers": {"anonymous": [{"requests": 4, "period": 60}]}}})
+        assert test_client.get("/ping").headers["X-RateLimit-Remaining"] == "3"
+
+    def test_pinned_policies_keep_configured_tiers(self):
+        store = ConfigStore()
+        store.load({"rate_limit": {"tiers": {"anonymous": [{"requests": 2, "period": 60}]}}})
+        test_app = FastAPI()
+
+        @test_app.get("/ping")
+        async def ping():
+            return {}
+
+        test_app.add_middleware(
+            RateLimiterMiddleware,
+            config=store,
+            policies=store.current.rate_limit.policies,
+            backend=LocalBackend(),
+        )
+        response = TestClient(test_app).get("/ping")
+        assert response.headers["X-RateLimit-Limit"] == "2"
+
+    def test_cors_origins_reload(self):
+        store = ConfigStore()
+        store.load({"cors": {"allow_origins": ["https://a.example"]}})
+        test_client = TestClient(_app(store))
+        origin = {"Origin": "https://b.example"}
+        response = test_client.get("/ping", headers=origin)
+        assert "access-control-allow-origin" not in response.headers
+
+        store.load({"cors": {"allow_origins": ["https://b.example"]}})
+        response = test_client.get("/ping", headers=origin)
+        assert response.headers["access-control-allow-origin"] == "https://b.example"
+
+    @pytest.mark.asyncio
+    async def test_sighup_reloads_file(self, tmp_path):
+        path = tmp_path / "gateway.json"
+        path.write_text(json.dumps({"circuit_breaker": {"failure_threshold": 9}}))
+        store = ConfigStore(str(path))
+        loop = asyncio.get_running_loop()
+        assert store.install_signal_handler(loop)
+        try:
+            os.kill(os.getpid(), signal.SIGHUP)
+            await asyncio.sleep(0.05)
+        finally:
+            loop.remove_signal_handler(signal.SIGHUP)
+        assert store.current.circuit_breaker.failure_threshold == 9
+        assert store.current.source == str(path)
+
+
+class TestConfigEndpoints:
+    """Test the admin config endpoints"""
+
+    def test_reload_and_reject(self, tmp_path, monkeypatch):
+        path = tmp_path / "gateway.json"
+        monkeypatch.setattr(gateway_config, "path", str(path))
+        monkeypatch.setattr(gateway_config, "current", gateway_config.current)
+        version = gateway_config.current.version
+
+        path.write_text(json.dumps({"circuit_breaker": {"timeout": 30}}))
+        response = client.post("/api/v1/admin/config/reload", headers=_headers(1, True))
+        assert response.status_code == 200
+        assert response.json()["version"] == version + 1
+
+        path.write_text("{not json")
+        response = client.post("/api/v1/admin/config/reload", headers=_headers(1, True))
+        assert response.status_code == 422
+        body = client.get("/api/v1/admin/config", headers=_headers(1, True)).json()
+        assert body["version"] == version + 1
+        assert body["circuit_breaker"]["timeout"] == 30
+        assert body["store"]["last_error"]
+
+    def test_admin_only(self):
+        response = client.post("/api/v1/admin/config/reload", headers=_headers(2))
+        assert response.status_code == 403
@@ -0,0 +1,124 @@
+"""Test precompiled CORS and the preflight short-circuit"""
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src.main import app
+from src.middleware.cors import CORSMiddleware
+from src.utils.config import ConfigStore
+
+client = TestClient(app)
+
+
+def _preflight(origin: str, method: str = "POST", headers: str = "") -> dict:
+    request = {"Origin": origin, "Access-Control-Request-Method": method}
+    if headers:
+        request["Access-Control-Request-Headers"] = headers
+    return request
+
+
+def _app(cors: dict):
+    store = ConfigStore()
+    store.load({"cors": cors})
+    test_app = FastAPI()
+    reached = []
+
+    @test_app.api_route("/ping", methods=["GET", "OPTIONS"])
+    async def ping():
+        return JSONResponse({"ok": True}, headers={"Vary": "Accept-Encoding"})
+
+    class Inner(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            reached.append(request.method)
+            return await call_next(request)
+
+    test_app.add_middleware(Inner)
+    test_app.add_middleware(CORSMiddleware, config=store)
+    return TestClient(test_app), reached
+
+
+class TestPreflight:
+    """Test preflights answered at the outermost layer"""
+
+    def test_answered_without_reaching_inner_layers(self):
+        test_client, reached = _app({"allow_origins": ["https://app.example"], "max_age": 3600})
+        response = test_client.options(
+            "/ping", headers=_preflight("https://app.example", headers="X-Trace")
+        )
+        assert response.status_code == 204
+        assert response.headers["access-control-allow-origin"] == "https://app.example"
+        assert response.headers["access-control-max-age"] == "3600"
+        assert response.headers["access-control-allow-headers"] == "X-Trace"
+        assert response.headers["access-control-allow-credentials"] == "true"
+        assert response.headers["vary"] == "Origin"
+        assert reached == []
+
+        # A plain OPTIONS request is not a preflight
+        test_client.options("/ping", headers={"Origin": "https://app.example"})
+        assert reached == ["OPTIONS"]
+
+    def test_rejections(self):
+        test_client, reached = _app(
+            {
+                "allow_origins": ["https://app.example"],
+                "allow_methods": ["GET", "POST"],
+                "allow_headers": ["Authorization"],
+            }
+        )
+        for headers in (
+            _preflight("https://evil.example"),
+            _preflight("https://app.example", method="DELETE"),
+            _preflight("https://app.example", headers="authorization, x-other"),
+        ):
+            assert test_client.options("/ping", headers=headers).status_code == 400
+        ok = _preflight("https://app.example", headers="Authorization, Content-Type")
+        assert test_client.options("/ping", headers=ok).status_code == 204
+        assert reached == []
+
+    def test_origin_patterns(self):
+        test_client, _ = _app({"allow_origins": ["https://*.example.com"]})
+        for origin, allowed in (
+            ("https://a.example.com", True),
+            ("https://a.b.example.com", True),
+            ("https://example.com", False),
+            ("https://a.example.com.evil.net", False),
+            ("http://a.example.com", False),
+        ):
+            response = test_client.options("/ping", headers=_preflight(origin))
+            assert (response.status_code == 204) is allowed, origin
+
+
+class TestActualRequests:
+    """Test headers added to cross-origin responses"""
+
+    def test_allowed_origin_echoed_and_vary_merged(self):
+        test_client, _ = _app({"allow_origins": ["https://app.example"]})
+        response = test_client.get("/ping", headers={"Origin": "https://app.example"})
+        assert response.headers["access-control-allow-origin"] == "https://app.example"
+        assert response.headers["vary"] == "Accept-Encoding, Origin"
+        assert "X-Request-ID" in response.headers["access-control-expose-headers"]
+
+        response = test_client.get("/ping", headers={"Origin": "https://other.example"})
+        assert "access-control-allow-origin" not in response.headers
+
+    def test_wildcard_without_credentials(self):
+        test_client, _ = _app({"allow_origins": ["*"], "allow_credentials": False})
+        response = test_client.get("/ping", headers={"Origin": "https://any.example"})
+        assert response.headers["access-control-allow-origin"] == "*"
+        assert "access-control-allow-credentials" not in response.headers
+
+
+class TestGatewayPreflight:
+    """Test preflights against the full middleware stack"""
+
+    def test_preflight_skips_the_stack(self):
+        response = client.options(
+            "/api/v1/trading/orders",
+            headers=_preflight("http://localhost:3000", headers="Authorization"),
+        )
+        assert response.status_code == 204
+        assert response.headers["access-control-max-age"] == "600"
+        assert "X-RateLimit-Limit" not in response.headers
+        assert "traceresponse" not in response.headers
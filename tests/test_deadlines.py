@@ -0,0 +1,87 @@
+"""Test per-route deadlines"""
+
+import asyncio
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.middleware.circuit_breaker import CircuitBreakerMiddleware
+from src.utils.deadlines import (
+    DEADLINE_HEADER,
+    DeadlineRoute,
+    deadline,
+    deadline_headers,
+    deadline_stats,
+)
+
+router = APIRouter(route_class=DeadlineRoute)
+
+
+@router.get("/slow")
+@deadline(0.05)
+async def slow():
+    await asyncio.sleep(5)
+    return {"ok": True}
+
+
+@router.get("/fast")
+@deadline(5.0)
+async def fast(request: Request):
+    return deadline_headers(request)
+
+
+@router.get("/wait")
+async def wait(seconds: float):
+    await asyncio.sleep(seconds)
+    return {"ok": True}
+
+
+app = FastAPI()
+app.add_middleware(CircuitBreakerMiddleware, failure_threshold=1)
+app.include_router(router, prefix="/deadline-test")
+client = TestClient(app)
+
+
+class TestDeadlines:
+    """Test deadline enforcement and propagation"""
+
+    def test_slow_handler_cancelled_with_504(self):
+        before = deadline_stats.timeouts.get("slow", 0)
+        response = client.get("/deadline-test/slow")
+        assert response.status_code == 504
+        assert response.json()["detail"]["error"] == "Gateway Timeout"
+        # The timeout counts as a circuit-breaker failure
+        assert response.headers["X-Circuit-Breaker-State"] == "open"
+        assert deadline_stats.timeouts["slow"] == before + 1
+
+    def test_remaining_deadline_forwarded(self):
+        response = client.get("/deadline-test/fast")
+        assert 4000 < int(response.json()[DEADLINE_HEADER]) <= 5000
+
+    def test_incoming_header_shortens_budget(self):
+        response = client.get(
+            "/deadline-test/wait",
+            params={"seconds": 1},
+            headers={DEADLINE_HEADER: "50"},
+        )
+        assert response.status_code == 408
+
+        response = client.get("/deadline-test/fast", headers={DEADLINE_HEADER: "1000"})
+        assert int(response.json()[DEADLINE_HEADER]) <= 1000
+
+    def test_within_budget_succeeds(self):
+        response = client.get("/deadline-test/fast")
+        assert response.status_code == 200
+
+    def test_client_short_deadlines_leave_breaker_closed(self):
+        for _ in range(5):
+            response = client.get(
+                "/deadline-test/wait",
+                params={"seconds": 1},
+                headers={DEADLINE_HEADER: "0"},
+            )
+            assert response.status_code == 408
+            # Clamped to the minimum budget rather than failing instantly
+            assert response.json()["detail"]["timeout_ms"] >= 50
+            assert response.headers["X-Circuit-Breaker-State"] == "closed"
+        assert client.get("/deadline-test/wait", params={"seconds": 0}).status_code == 200
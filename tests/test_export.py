@@ -0,0 +1,100 @@
+"""Test order history export"""
+
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.trading.export import read_columnar
+from src.trading.orders import OrderStore
+
+client = TestClient(app)
+
+
+def _headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {"user_id": user_id, "username": f"u{user_id}", "is_admin": is_admin}
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _submit(user_id: int, symbol: str):
+    client.post(
+        "/api/v1/trading/orders",
+        json={"symbol": symbol, "side": "buy", "quantity": 1, "price": 10},
+        headers=_headers(user_id),
+    )
+
+
+class TestOrderStoreRange:
+    """Test time-range iteration over the order index"""
+
+    def test_iter_range_chunks_and_bounds(self):
+        store = OrderStore()
+        for i in range(5):
+            store.add(1, f"S{i}", "buy", 1, 1)
+        timestamps = store._ts_by_user[1]
+
+        chunks = list(store.iter_range(1, chunk_size=2))
+        assert [len(c) for c in chunks] == [2, 2, 1]
+
+        ranged = list(store.iter_range(1, start=timestamps[1], end=timestamps[3]))
+        assert [o["symbol"] for c in ranged for o in c] == ["S1", "S2"]
+        assert list(store.iter_range(2)) == []
+
+
+class TestExportRoute:
+    """Test the streaming export endpoint"""
+
+    def test_csv_export(self):
+        for symbol in ("EXA", "EXB"):
+            _submit(931, symbol)
+
+        response = client.get("/api/v1/trading/orders/export", headers=_headers(931))
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [r["symbol"] for r in rows] == ["EXA", "EXB"]
+
+    def test_columnar_export_round_trip(self):
+        for symbol in ("EXC", "EXD", "EXE"):
+            _submit(932, symbol)
+
+        response = client.get(
+            "/api/v1/trading/orders/export?format=columnar", headers=_headers(932)
+        )
+        rows = read_columnar(response.content)
+        assert [r["symbol"] for r in rows] == ["EXC", "EXD", "EXE"]
+        assert all(r["user_id"] == 932 and r["side"] == "buy" for r in rows)
+
+    def test_date_range_filter(self):
+        _submit(933, "EXF")
+        future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+
+        response = client.get(
+            "/api/v1/trading/orders/export",
+            params={"start": future},
+            headers=_headers(933),
+        )
+        assert (
+            response.text.strip() == "order_id,user_id,created_at,symbol,side,quantity,price,status"
+        )
+
+    def test_other_account_requires_admin(self):
+        response = client.get("/api/v1/trading/orders/export?user_id=931", headers=_headers(934))
+        assert response.status_code == 403
+
+        response = client.get(
+            "/api/v1/trading/orders/export?user_id=931",
+            headers=_headers(1, is_admin=True),
+        )
+        assert response.status_code == 200
+
+    def test_export_metrics_reported(self):
+        client.get("/api/v1/trading/orders/export", headers=_headers(935))
+        response = client.get("/api/v1/admin/metrics", headers=_headers(1, is_admin=True))
+        assert response.status_code == 200
+        assert response.json()["order_export"]["exports"] >= 1
@@ -0,0 +1,105 @@
+"""Test Idempotency-Key handling"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.middleware.idempotency import IdempotencyStore
+
+client = TestClient(app)
+
+
+def _headers(user_id: int, key: str) -> dict:
+    token = JWTHandler.create_access_token(
+        {"user_id": user_id, "username": f"u{user_id}", "is_admin": False}
+    )
+    return {"Authorization": f"Bearer {token}", "Idempotency-Key": key}
+
+
+ORDER = {"symbol": "IDM", "side": "buy", "quantity": 1, "price": 10}
+
+
+class TestIdempotencyMiddleware:
+    """Test replay of idempotent POST requests"""
+
+    def test_retry_replays_without_duplicate_order(self):
+        headers = _headers(951, "order-1")
+        first = client.post("/api/v1/trading/orders", json=ORDER, headers=headers)
+        second = client.post("/api/v1/trading/orders", json=ORDER, headers=headers)
+
+        assert first.status_code == second.status_code == 201
+        assert first.json() == second.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first.headers
+
+        orders = client.get("/api/v1/trading/orders", headers=headers).json()
+        assert orders["total"] == 1
+
+    def test_key_reuse_with_different_body_rejected(self):
+        headers = _headers(952, "order-2")
+        client.post("/api/v1/trading/orders", json=ORDER, headers=headers)
+        response = client.post(
+            "/api/v1/trading/orders", json={**ORDER, "quantity": 2}, headers=headers
+        )
+        assert response.status_code == 422
+
+    def test_keys_are_scoped_per_caller(self):
+        a = client.post("/api/v1/trading/orders", json=ORDER, headers=_headers(953, "shared"))
+        b = client.post("/api/v1/trading/orders", json=ORDER, headers=_headers(954, "shared"))
+        assert a.json()["order_id"] != b.json()["order_id"]
+
+    def test_retry_with_refreshed_token_replays(self):
+        first = client.post("/api/v1/trading/orders", json=ORDER, headers=_headers(955, "o-5"))
+        retry = _headers(955, "o-5")
+        assert retry["Authorization"] != first.request.headers["Authorization"]
+        second = client.post("/api/v1/trading/orders", json=ORDER, headers=retry)
+
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.json()["order_id"] == first.json()["order_id"]
+
+
+class TestIdempotencyStore:
+    """Test the bounded idempotency store"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicate_waits_for_owner(self):
+        store = IdempotencyStore()
+        entry, owner = store.begin("k", "fp")
+        duplicate, dup_owner = store.begin("k", "fp")
+        assert owner and not dup_owner and duplicate is entry
+
+        waiter = asyncio.ensure_future(asyncio.shield(entry.future))
+        store.complete("k", entry, 201, [], b"done")
+        assert await waiter is True
+        assert entry.body == b"done"
+
+    @pytest.mark.asyncio
+    async def test_abort_allows_retry(self):
+        store = IdempotencyStore()
+        entry, _ = store.begin("k", "fp")
+        store.abort("k", entry)
+        _, owner = store.begin("k", "fp")
+        assert owner
+
+    @pytest.mark.asyncio
+    async def test_memory_cap_evicts_oldest(self):
+        store = IdempotencyStore(max_bytes=3000)
+        for i in range(5):
+            entry, _ = store.begin(f"k{i}", "fp")
+            store.complete(f"k{i}", entry, 200, [], b"x" * 500)
+
+        assert store.bytes_used <= 3000
+        assert store.evictions > 0
+        _, owner = store.begin("k0", "fp")
+        assert owner
+
+    @pytest.mark.asyncio
+    async def test_oversized_response_not_stored(self):
+        store = IdempotencyStore(max_entry_bytes=10)
+        entry, _ = store.begin("k", "fp")
+        store.complete("k", entry, 200, [], b"x" * 11)
+        assert store.stats()["uncacheable"] == 1
+        assert store.stats()["entries"] == 0
@@ -0,0 +1,69 @@
+"""Test bulk token introspection"""
+
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.auth.service_auth import service_credentials
+from src.main import app
+
+client = TestClient(app)
+
+service_credentials.add("test-service", "test-service-secret")
+SERVICE_AUTH = ("test-service", "test-service-secret")
+
+
+def _token(user_id: int = 971) -> str:
+    return JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": False,
+        }
+    )
+
+
+class TestIntrospect:
+    """Test the service-only introspection endpoint"""
+
+    def test_returns_claims_and_errors_in_order(self):
+        revoked = _token(972)
+        JWTHandler.revoke_token(JWTHandler.verify_token(revoked))
+
+        response = client.post(
+            "/api/v1/auth/introspect",
+            json={"tokens": [_token(), "not-a-token", revoked]},
+            auth=SERVICE_AUTH,
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0]["active"] is True
+        assert results[0]["claims"]["user_id"] == 971
+        assert results[1] == {
+            "active": False,
+            "error": "Could not validate credentials",
+        }
+        assert results[2] == {"active": False, "error": "Token has been revoked"}
+
+    def test_requires_service_credentials(self):
+        body = {"tokens": [_token()]}
+        assert client.post("/api/v1/auth/introspect", json=body).status_code == 401
+
+        wrong = client.post("/api/v1/auth/introspect", json=body, auth=("test-service", "wrong"))
+        assert wrong.status_code == 401
+
+        # A user bearer token is not a service credential
+        user = client.post(
+            "/api/v1/auth/introspect",
+            json=body,
+            headers={"Authorization": f"Bearer {_token()}"},
+        )
+        assert user.status_code == 401
+
+    def test_batch_size_capped(self):
+        response = client.post(
+            "/api/v1/auth/introspect",
+            json={"tokens": ["x"] * 1001},
+            auth=SERVICE_AUTH,
+        )
+        assert response.status_code == 422
@@ -0,0 +1,134 @@
+"""Test IP allow/deny lists and subnet rate limits"""
+
+import json
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.middleware import rate_limiter
+from src.middleware.ip_filter import ClientInfo, IpFilterMiddleware, IpRules
+from src.middleware.rate_limiter import RateLimiterMiddleware
+from src.utils.ip_trie import PrefixTrie
+
+
+def _app(rules: IpRules = None, **limiter) -> FastAPI:
+    test_app = FastAPI()
+
+    @test_app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    if limiter:
+        test_app.add_middleware(RateLimiterMiddleware, **limiter)
+    test_app.add_middleware(IpFilterMiddleware, rules=rules or IpRules())
+    return test_app
+
+
+class TestPrefixTrie:
+    """Test longest-prefix matching"""
+
+    def test_most_specific_prefix_wins(self):
+        trie = PrefixTrie([("10.0.0.0/8", "a"), ("10.1.0.0/16", "b"), ("10.1.2.0/24", "c")])
+        assert trie.lookup("10.1.2.3") == "c"
+        assert trie.lookup("10.1.9.9") == "b"
+        assert trie.lookup("10.9.9.9") == "a"
+        assert trie.lookup("11.0.0.1") is None
+        assert trie.lookup("testclient") is None
+
+    def test_ipv6(self):
+        trie = PrefixTrie([("2001:db8::/32", "doc")])
+        assert trie.lookup("2001:db8::1") == "doc"
+        assert trie.lookup("2001:db9::1") is None
+
+
+class TestIpFilter:
+    """Test access decisions and hot reload"""
+
+    def test_deny_inside_allow(self):
+        rules = IpRules()
+        rules.load({"allow": ["10.0.0.0/8"], "deny": ["10.6.0.0/16"]})
+        test_app = _app(rules)
+
+        allowed = TestClient(test_app, client=("10.1.2.3", 1000))
+        assert allowed.get("/ping").status_code == 200
+        denied = TestClient(test_app, client=("10.6.0.1", 1000))
+        assert denied.get("/ping").status_code == 403
+        # An allow list denies everything it does not cover
+        outside = TestClient(test_app, client=("192.0.2.1", 1000))
+        assert outside.get("/ping").status_code == 403
+        assert rules.stats()["denied"] == 2
+
+    def test_ipv4_mapped_clients_match_ipv4_rules(self):
+        rules = IpRules()
+        rules.load({"deny": ["10.6.0.0/16"]})
+        denied = TestClient(_app(rules), client=("::ffff:10.6.0.1", 1000))
+        assert denied.get("/ping").status_code == 403
+
+        mapped, plain = ClientInfo("::ffff:10.6.0.1"), ClientInfo("10.6.0.1")
+        assert (mapped.host, mapped.client_id) == (plain.host, plain.client_id)
+
+    def test_hot_reload(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({"deny": []}))
+        rules = IpRules(str(path), reload_interval=0)
+        client = TestClient(_app(rules), client=("203.0.113.7", 1000))
+        assert client.get("/ping").status_code == 200
+
+        path.write_text(json.dumps({"deny": ["203.0.113.0/24"]}))
+        os.utime(path, (1, 1))
+        assert client.get("/ping").status_code == 403
+
+        # A broken file keeps the last good rules
+        path.write_text("{not json")
+        os.utime(path, (2, 2))
+        assert client.get("/ping").status_code == 403
+
+    def test_wrong_shape_is_rejected(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({"deny": ["203.0.113.0/24"]}))
+        rules = IpRules(str(path))
+        assert rules.reload()
+        for mtime, bad in enumerate(
+            [
+                ["203.0.113.0/24"],
+                {"deny": "203.0.113.0/24"},
+                {"deny": [24]},
+                {"subnet_limits": ["203.0.113.0/24"]},
+                {"subnet_limits": {"203.0.113.0/24": "600"}},
+                {"denny": []},
+            ],
+            start=1,
+        ):
+            path.write_text(json.dumps(bad))
+            os.utime(path, (mtime, mtime))
+            assert rules.reload() is False
+        assert rules.version == 1
+
+    def test_admin_reload_endpoint(self):
+        response = TestClient(app).post("/api/v1/admin/ip-rules/reload")
+        assert response.status_code == 401
+
+
+class TestSubnetRateLimit:
+    """Test that rotating addresses within a subnet share a budget"""
+
+    def test_default_subnet_budget(self):
+        test_app = _app(requests_per_minute=2, subnet_multiplier=2)
+        codes = [
+            TestClient(test_app, client=(f"198.51.100.{i}", 1000)).get("/ping") for i in range(1, 6)
+        ]
+        assert [c.status_code for c in codes[:4]] == [200] * 4
+        assert codes[4].status_code == 429
+
+    def test_configured_subnet_tier(self, monkeypatch):
+        rules = IpRules()
+        rules.load({"subnet_limits": {"192.0.2.0/24": 1}})
+        monkeypatch.setattr(rate_limiter, "ip_rules", rules)
+        test_app = _app(requests_per_minute=50)
+
+        first = TestClient(test_app, client=("192.0.2.1", 1)).get("/ping")
+        assert first.headers["X-RateLimit-Limit"] == "50"
+        second = TestClient(test_app, client=("192.0.2.2", 1)).get("/ping")
+        assert second.status_code == 429
@@ -0,0 +1,204 @@
+"""Test JWT signing keys, rotation and JWKS"""
+
+import base64
+import hashlib
+import hmac
+import json
+from collections import OrderedDict
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from fastapi.testclient import TestClient
+
+from src.auth import jwt_handler
+from src.auth.jwt_handler import JWTHandler, key_ring
+from src.auth.keys import DEFAULT_KID, KeyRing, SigningKey
+from src.main import app
+
+client = TestClient(app)
+
+
+def _token(user_id: int = 961, is_admin: bool = False) -> str:
+    return JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+
+
+@pytest.fixture
+def restore_key_ring():
+    keys, active = OrderedDict(key_ring._keys), key_ring.active_kid
+    yield
+    key_ring._keys, key_ring.active_kid, key_ring._jwks = keys, active, None
+
+
+class TestKeyRing:
+    """Test key selection and rotation"""
+
+    @pytest.mark.parametrize("algorithm", ["HS256", "RS256", "EdDSA"])
+    def test_sign_and_verify_by_kid(self, algorithm):
+        ring = KeyRing()
+        key = ring.rotate(algorithm)
+        token = jwt.encode(
+            {"sub": "x"}, key.signing, algorithm=key.algorithm, headers={"kid": key.kid}
+        )
+        found = ring.verification_key(jwt.get_unverified_header(token)["kid"])
+        assert jwt.decode(token, found.verifying, algorithms=[found.algorithm]) == {"sub": "x"}
+
+    def test_jwks_publishes_only_public_keys(self):
+        ring = KeyRing()
+        ring.rotate("HS256")
+        rsa_key = ring.rotate("RS256")
+        ed_key = ring.rotate("EdDSA")
+        jwks = ring.jwks()
+        assert [k["kid"] for k in jwks["keys"]] == [rsa_key.kid, ed_key.kid]
+        assert all("d" not in k for k in jwks["keys"])
+        assert ring.jwks() is jwks  # cached until the ring changes
+
+    def test_rotation_prunes_oldest(self):
+        ring = KeyRing(max_keys=2)
+        first = ring.rotate("EdDSA")
+        ring.rotate("EdDSA")
+        third = ring.rotate("EdDSA")
+        assert ring.verification_key(first.kid) is None
+        assert ring.signing_key() is third
+
+    def test_directory_shared_between_workers(self, tmp_path):
+        worker_a = KeyRing(directory=str(tmp_path))
+        worker_b = KeyRing(directory=str(tmp_path))
+        key = worker_a.rotate("EdDSA")
+
+        loaded = worker_b.verification_key(key.kid)
+        assert loaded is not None and loaded.algorithm == "EdDSA"
+        assert worker_b.active_kid == key.kid
+
+    def test_hs256_rotation_is_shared_through_directory(self, tmp_path):
+        worker_a = KeyRing(directory=str(tmp_path))
+        worker_b = KeyRing(directory=str(tmp_path))
+        key = worker_a.rotate("HS256")
+        assert (tmp_path / f"{key.kid}.pem").stat().st_mode & 0o077 == 0
+
+        loaded = worker_b.verification_key(key.kid)
+        assert loaded.algorithm == "HS256"
+        assert loaded.verifying == key.verifying
+
+    def test_default_key_survives_pruning_while_tokens_live(self):
+        ring = KeyRing(max_keys=2, token_lifetime=3600)
+        ring.add(SigningKey.hmac(DEFAULT_KID, "secret"))
+        for _ in range(3):
+            ring.rotate("HS256")
+        assert ring.verification_key(DEFAULT_KID) is not None
+        assert len(ring.stats()["keys"]) == 2
+
+        ring._retired_at[DEFAULT_KID] -= 7200
+        ring.rotate("HS256")
+        assert ring.verification_key(DEFAULT_KID) is None
+
+    @pytest.mark.parametrize("algorithm", ["RS256", "EdDSA"])
+    def test_asymmetric_ring_without_directory(self, algorithm, monkeypatch):
+        monkeypatch.delenv("JWT_KEYS_DIR", raising=False)
+        ring = KeyRing.from_env(algorithm, "your-secret-key-change-in-production")
+        assert ring.signing_key().algorithm == algorithm
+        assert [k["kid"] for k in ring.jwks()["keys"]] == [ring.active_kid]
+        assert ring.verification_key(None) is None
+        assert ring.verification_key(DEFAULT_KID) is None
+        with pytest.raises(ValueError):
+            ring.rotate("HS256")
+
+    def test_asymmetric_ring_skips_hs256_files(self, tmp_path, monkeypatch):
+        secret = KeyRing(directory=str(tmp_path)).rotate("HS256")
+        monkeypatch.setenv("JWT_KEYS_DIR", str(tmp_path))
+        ring = KeyRing.from_env("EdDSA", "secret")
+        assert ring.signing_key().algorithm == "EdDSA"
+        assert ring.verification_key(secret.kid) is None
+
+    def test_pem_round_trip(self):
+        key = SigningKey.generate("RS256")
+        loaded = SigningKey.from_pem(key.kid, key.to_pem())
+        assert loaded.algorithm == "RS256"
+        assert loaded.jwk()["n"] == key.jwk()["n"]
+
+
+class TestTokenSigning:
+    """Test tokens issued by the gateway across rotation"""
+
+    def test_tokens_carry_kid(self):
+        header = jwt.get_unverified_header(_token())
+        assert header["kid"] == key_ring.active_kid
+
+    def test_rotation_keeps_old_tokens_valid(self, restore_key_ring):
+        old = _token()
+        response = client.post(
+            "/api/v1/admin/keys/rotate",
+            json={"algorithm": "EdDSA"},
+            headers={"Authorization": f"Bearer {_token(962, is_admin=True)}"},
+        )
+        assert response.status_code == 200
+        kid = response.json()["kid"]
+
+        new = _token()
+        assert jwt.get_unverified_header(new) == {
+            "alg": "EdDSA",
+            "kid": kid,
+            "typ": "JWT",
+        }
+        for token in (old, new):
+            me = client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+            assert me.status_code == 200
+
+        jwks = client.get("/.well-known/jwks.json").json()
+        assert kid in [k["kid"] for k in jwks["keys"]]
+
+    def test_removed_key_drops_cached_tokens(self, restore_key_ring):
+        key_ring.rotate("EdDSA")
+        token = _token()
+        JWTHandler.verify_token(token)
+        assert token in jwt_handler._verified_tokens
+
+        key_ring.rotate("EdDSA")
+        key_ring.remove(jwt.get_unverified_header(token)["kid"])
+        assert token not in jwt_handler._verified_tokens
+        with pytest.raises(Exception):
+            JWTHandler.verify_token(token)
+
+    def test_algorithm_confusion_rejected(self, restore_key_ring):
+        key = key_ring.rotate("RS256")
+        public_pem = key.verifying.public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+
+        def b64(data: bytes) -> bytes:
+            return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+        # An HS256 token "signed" with the public key must not verify.
+        signing_input = b".".join(
+            [
+                b64(json.dumps({"alg": "HS256", "kid": key.kid}).encode()),
+                b64(json.dumps({"user_id": 1, "type": "access"}).encode()),
+            ]
+        )
+        signature = hmac.new(public_pem, signing_input, hashlib.sha256).digest()
+        forged = (signing_input + b"." + b64(signature)).decode()
+
+        response = client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {forged}"})
+        assert response.status_code == 401
+
+    def test_hs256_forgery_rejected_in_asymmetric_mode(self, monkeypatch):
+        monkeypatch.delenv("JWT_KEYS_DIR", raising=False)
+        monkeypatch.setattr(jwt_handler, "key_ring", KeyRing.from_env("RS256", "unused"))
+        admin = {"Authorization": f"Bearer {_token(963, is_admin=True)}"}
+        assert client.get("/api/v1/admin/users", headers=admin).status_code == 200
+
+        forged = jwt.encode(
+            {"user_id": 1, "username": "admin", "is_admin": True, "type": "access"},
+            "your-secret-key-change-in-production",
+            algorithm="HS256",
+        )
+        response = client.get("/api/v1/admin/users", headers={"Authorization": f"Bearer {forged}"})
+        assert response.status_code == 401
@@ -0,0 +1,124 @@
+"""Test the multi-worker launcher"""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from src.launcher import (
+    Launcher,
+    bind_socket,
+    http_impl,
+    loop_impl,
+    missing_shared_settings,
+    worker_env,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _children(pid: int):
+    result = subprocess.run(["pgrep", "-P", str(pid)], capture_output=True, text=True)
+    return set(result.stdout.split())
+
+
+def _status(port: int):
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        return urllib.request.urlopen(url, timeout=5).status
+    except OSError as exc:
+        return repr(exc)
+
+
+class TestWorkerSetup:
+    """Test socket and per-worker configuration"""
+
+    def test_reuse_port_sockets_share_a_port(self):
+        first = bind_socket("127.0.0.1", 0, reuse_port=True)
+        port = first.getsockname()[1]
+        second = bind_socket("127.0.0.1", port, reuse_port=True)
+        assert second.getsockname()[1] == port
+        first.close()
+        second.close()
+
+    def test_per_worker_files(self):
+        env = worker_env(
+            3,
+            4,
+            {"RATE_LIMIT_SNAPSHOT_FILE": "/var/lib/rl.snap", "AUDIT_LOG_DIR": "/a"},
+        )
+        assert env == {
+            "WORKER_ID": "3",
+            "WORKER_COUNT": "4",
+            "RATE_LIMIT_SNAPSHOT_FILE": "/var/lib/rl.snap.3",
+            "AUDIT_LOG_DIR": os.path.join("/a", "worker-3"),
+        }
+        assert "AUDIT_LOG_DIR" not in worker_env(0, 1, {})
+
+    def test_workers_need_shared_secrets(self, monkeypatch):
+        assert missing_shared_settings({"JWT_KEYS_DIR": "/k"}) == ["API_KEY_HMAC_SECRET"]
+        monkeypatch.delenv("API_KEY_HMAC_SECRET", raising=False)
+        monkeypatch.setenv("JWT_KEYS_DIR", "/k")
+        with pytest.raises(RuntimeError, match="API_KEY_HMAC_SECRET"):
+            Launcher(workers=2).run()
+
+    def test_fast_implementations_preferred(self):
+        pytest.importorskip("uvloop")
+        pytest.importorskip("httptools")
+        assert (loop_impl(), http_impl()) == ("uvloop", "httptools")
+
+
+class TestRotation:
+    """Test rotating workers under traffic"""
+
+    def test_rotation_without_refused_requests(self, tmp_path):
+        port = _free_port()
+        env = dict(
+            os.environ,
+            RATE_LIMIT_REQUESTS_PER_MINUTE="100000",
+            API_KEY_HMAC_SECRET="test-pepper",
+            JWT_KEYS_DIR=str(tmp_path),
+        )
+        launcher = subprocess.Popen(
+            [sys.executable, "-m", "src.launcher", "--workers", "2"]
+            + ["--host", "127.0.0.1", "--port", str(port)],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.monotonic() + 60
+            while len(_children(launcher.pid)) < 2 or _status(port) != 200:
+                assert time.monotonic() < deadline, "workers did not start"
+                time.sleep(0.2)
+            time.sleep(2)
+            before = _children(launcher.pid)
+
+            launcher.send_signal(signal.SIGUSR2)
+            statuses = []
+            deadline = time.monotonic() + 60
+            while True:
+                current = _children(launcher.pid)
+                if len(current) == 2 and not current & before:
+                    break
+                assert time.monotonic() < deadline, "rotation did not finish"
+                statuses.append(_status(port))
+                time.sleep(0.02)
+
+            assert set(statuses) == {200}
+            assert _status(port) == 200
+        finally:
+            launcher.send_signal(signal.SIGTERM)
+            assert launcher.wait(timeout=60) == 0
@@ -0,0 +1,75 @@
+"""Test login brute-force throttling"""
+
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.auth.login_throttle import LoginThrottle, subnet_of
+from src.main import app
+from src.utils.sketches import CountMinSketch, WindowedCountMinSketch
+
+client = TestClient(app)
+
+
+class TestSketches:
+    """Test the count-min sketches"""
+
+    def test_count_min_never_underestimates(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        for i in range(500):
+            sketch.add(f"k{i % 50}")
+        assert all(sketch.estimate(f"k{i}") >= 10 for i in range(50))
+
+    def test_window_expires_counts(self):
+        sketch = WindowedCountMinSketch(window=10)
+        sketch.add("a", 8, now=sketch._window_start)
+        assert sketch.estimate("a", now=sketch._window_start + 5) == 8
+        # Half of the previous window still overlaps the sliding window.
+        assert sketch.estimate("a", now=sketch._window_start + 15) == 4
+        assert sketch.estimate("a", now=sketch._window_start + 30) == 0
+
+
+class TestLoginThrottle:
+    """Test account and subnet backoff"""
+
+    def test_subnet_grouping(self):
+        assert subnet_of("203.0.113.7") == subnet_of("203.0.113.200")
+        assert subnet_of("203.0.113.7") != subnet_of("203.0.114.7")
+        assert subnet_of("2001:db8::1") == "2001:db8::/64"
+
+    def test_account_backoff_grows(self):
+        throttle = LoginThrottle(account_threshold=3, subnet_threshold=1000)
+        for _ in range(2):
+            throttle.record_failure("a@example.com", "10.0.0.1")
+        assert throttle.retry_after("a@example.com", "10.0.0.1") == 0
+
+        throttle.record_failure("a@example.com", "10.0.0.1")
+        first = throttle.retry_after("a@example.com", "10.0.0.1")
+        throttle.record_failure("a@example.com", "10.0.0.1")
+        assert throttle.retry_after("A@example.com", "10.9.9.9") > first > 0
+        assert throttle.retry_after("b@example.com", "10.0.0.1") == 0
+
+    def test_subnet_blocked_across_accounts(self):
+        throttle = LoginThrottle(account_threshold=1000, subnet_threshold=10)
+        for i in range(10):
+            throttle.record_failure(f"user{i}@example.com", f"198.51.100.{i}")
+        assert throttle.retry_after("new@example.com", "198.51.100.77") > 0
+        assert throttle.retry_after("new@example.com", "192.0.2.1") == 0
+
+
+class TestLoginRoute:
+    """Test that throttled logins never reach bcrypt"""
+
+    def test_throttled_login_skips_password_hashing(self):
+        body = {"email": "victim@example.com", "password": "wrong-password"}
+        for _ in range(5):
+            assert client.post("/api/v1/auth/login", json=body).status_code == 401
+
+        with patch.object(
+            JWTHandler, "verify_password", wraps=JWTHandler.verify_password
+        ) as verify:
+            response = client.post("/api/v1/auth/login", json=body)
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert verify.call_count == 0
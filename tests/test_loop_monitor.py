@@ -0,0 +1,101 @@
+"""Test the event-loop lag monitor and blocking detector"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.utils.loop_monitor import LagHistogram, LoopMonitor
+
+client = TestClient(app)
+
+
+def _block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+def _headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestLagHistogram:
+    """Test the lag histogram"""
+
+    def test_buckets_and_percentiles(self):
+        histogram = LagHistogram()
+        for lag in [0.5] * 98 + [30, 3000]:
+            histogram.record(lag)
+        stats = histogram.to_dict()
+        assert stats["buckets"]["le_1ms"] == 98
+        assert stats["buckets"]["le_50ms"] == 1
+        assert stats["buckets"]["inf"] == 1
+        assert stats["p50_ms"] == 1.0
+        assert stats["p99_ms"] == 50.0
+        assert stats["max_ms"] == 3000
+
+
+class TestBlockingDetector:
+    """Test stall capture against a real event loop"""
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_reported_with_stack(self):
+        monitor = LoopMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        _block_the_loop(0.3)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        [report] = monitor.blocking()
+        assert any("_block_the_loop" in line for line in report["stack"])
+        assert report["max_blocked_ms"] >= 150
+        assert monitor.lag.max_ms >= 250
+
+    @pytest.mark.asyncio
+    async def test_repeats_grouped_and_logs_rate_limited(self):
+        monitor = LoopMonitor(interval=0.01, threshold=0.05, report_interval=60)
+        monitor.start()
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            _block_the_loop(0.15)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        [report] = monitor.blocking()
+        assert report["count"] == 3
+        assert monitor.stalls == 3
+        assert monitor.suppressed == 2
+
+    @pytest.mark.asyncio
+    async def test_healthy_loop_reports_nothing(self):
+        monitor = LoopMonitor(interval=0.01, threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+        assert monitor.blocking() == []
+        assert monitor.lag.total > 5
+
+
+class TestEventLoopEndpoint:
+    """Test the admin event-loop endpoint"""
+
+    def test_admin_endpoint(self):
+        response = client.get("/api/v1/admin/event-loop", headers=_headers(995, True))
+        assert response.status_code == 200
+        body = response.json()
+        assert "lag" in body and "blocking" in body
+
+    def test_admin_only(self):
+        response = client.get("/api/v1/admin/event-loop", headers=_headers(996))
+        assert response.status_code == 403
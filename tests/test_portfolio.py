@@ -0,0 +1,118 @@
+"""Test portfolio valuation"""
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.trading.portfolio import PortfolioValuator
+from src.trading.positions import PositionBook, SymbolIndex
+from src.trading.prices import PriceSnapshotStore
+
+client = TestClient(app)
+
+
+def _valuator():
+    symbols = SymbolIndex()
+    book = PositionBook(symbols)
+    return book, PriceSnapshotStore(symbols), symbols
+
+
+class TestPortfolioValuator:
+    """Test vectorized valuation and memoization"""
+
+    def test_values_positions_at_latest_price(self):
+        book, prices, symbols = _valuator()
+        valuator = PortfolioValuator(book, prices)
+        idx = symbols.indices(["A", "B"])
+        book.apply_fills(1, idx, np.array([10.0, -5.0]), np.array([100.0, 20.0]))
+        prices.update_many({"A": 110.0, "B": 10.0})
+
+        result = valuator.value(1)
+        assert result["market_value"] == 10 * 110 - 5 * 10
+        assert result["pnl"] == (10 * 110 - 5 * 10) - (1000 - 100)
+        assert {p["symbol"] for p in result["positions"]} == {"A", "B"}
+
+    def test_unpriced_symbol_marked_at_cost(self):
+        book, prices, symbols = _valuator()
+        valuator = PortfolioValuator(book, prices)
+        book.apply_fills(1, symbols.indices(["A"]), np.array([4.0]), np.array([25.0]))
+
+        result = valuator.value(1)
+        assert result["market_value"] == 100.0
+        assert result["pnl"] == 0.0
+
+    def test_partial_close_realizes_pnl(self):
+        book, prices, symbols = _valuator()
+        valuator = PortfolioValuator(book, prices)
+        idx = symbols.indices(["A", "A"])
+        book.apply_fills(1, idx, np.array([10.0, -9.0]), np.array([100.0, 200.0]))
+
+        result = valuator.value(1)
+        assert result["positions"][0]["avg_price"] == 100.0
+        assert result["market_value"] == 100.0
+        assert result["realized_pnl"] == 900.0
+        assert result["pnl"] == 900.0
+
+        prices.update("A", 150.0)
+        result = valuator.value(1)
+        assert result["unrealized_pnl"] == 50.0
+        assert result["pnl"] == 950.0
+
+    def test_crossing_zero_opens_at_fill_price(self):
+        book, prices, symbols = _valuator()
+        valuator = PortfolioValuator(book, prices)
+        book.apply_fills(1, symbols.indices(["A"]), np.array([5.0]), np.array([10.0]))
+        book.apply_fills(1, symbols.indices(["A"]), np.array([-8.0]), np.array([12.0]))
+
+        position = valuator.value(1)["positions"][0]
+        assert position["quantity"] == -3.0
+        assert position["avg_price"] == 12.0
+        assert position["realized_pnl"] == 10.0
+
+    def test_memoized_until_next_tick(self):
+        book, prices, symbols = _valuator()
+        valuator = PortfolioValuator(book, prices)
+        book.apply_fills(1, symbols.indices(["A"]), np.array([1.0]), np.array([10.0]))
+        prices.update("A", 11.0)
+
+        first = valuator.value(1)
+        assert valuator.value(1) is first
+        assert valuator.hits == 1
+
+        prices.update("A", 12.0)
+        assert valuator.value(1)["market_value"] == 12.0
+
+        book.apply_fills(1, symbols.indices(["A"]), np.array([1.0]), np.array([12.0]))
+        assert valuator.value(1)["market_value"] == 24.0
+        assert valuator.misses == 3
+
+
+class TestPortfolioRoute:
+    """Test the portfolio endpoint"""
+
+    def test_portfolio_reflects_orders_and_ticks(self):
+        user = JWTHandler.create_access_token(
+            {"user_id": 921, "username": "u921", "is_admin": False}
+        )
+        admin = JWTHandler.create_access_token(
+            {"user_id": 1, "username": "admin", "is_admin": True}
+        )
+        client.post(
+            "/api/v1/trading/orders",
+            json={"symbol": "PFV", "side": "buy", "quantity": 2, "price": 50},
+            headers={"Authorization": f"Bearer {user}"},
+        )
+        client.post(
+            "/api/v1/trading/market-data",
+            json={"symbol": "PFV", "price": 60},
+            headers={"Authorization": f"Bearer {admin}"},
+        )
+
+        response = client.get(
+            "/api/v1/trading/portfolio", headers={"Authorization": f"Bearer {user}"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["market_value"] == 120.0
+        assert data["pnl"] == 20.0
@@ -0,0 +1,218 @@
+"""Test the shared rate-limit backend against a local RESP stand-in"""
+
+import asyncio
+import hashlib
+import time
+
+import pytest
+import pytest_asyncio
+
+from src.middleware.rate_limit_backend import (
+    CHARGE_SCRIPT,
+    LeasingBackend,
+    LocalBackend,
+    RespBackend,
+)
+from src.middleware.rate_limit_policy import Limit
+from src.utils.resp import RespClient, RespError, encode_command
+
+
+class StandInServer:
+    """
+    Speaks enough RESP for the limiter: PING, SCRIPT LOAD, EVALSHA.
+
+    The charge script is emulated in Python with the same semantics.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.scripts = set()
+        self.commands = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _read_command(self, reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        return args
+
+    def _encode(self, reply) -> bytes:
+        if isinstance(reply, RespError):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(map(self._encode, reply))
+        return b"$%d\r\n%s\r\n" % (len(reply), reply.encode())
+
+    async def _handle(self, reader, writer):
+        while (command := await self._read_command(reader)) is not None:
+            self.commands += 1
+            writer.write(self._encode(self._dispatch(command)))
+            await writer.drain()
+        writer.close()
+
+    def _dispatch(self, command):
+        name = command[0].upper()
+        if name == "PING":
+            return "PONG"
+        if name == "SCRIPT" and command[1].upper() == "LOAD":
+            sha = hashlib.sha1(command[2].encode()).hexdigest()
+            self.scripts.add(sha)
+            return sha
+        if name == "EVALSHA":
+            if command[1] not in self.scripts:
+                return RespError("NOSCRIPT No matching script")
+            nkeys = int(command[2])
+            return self._charge(command[3 : 3 + nkeys], command[3 + nkeys :])
+        return RespError(f"ERR unknown command '{name}'")
+
+    def _charge(self, keys, args):
+        now = time.time()
+        cost = float(args[0])
+        levels, allowed, wait = [], 1, 0.0
+        for i, key in enumerate(keys):
+            capacity, rate = float(args[1 + 2 * i]), float(args[2 + 2 * i])
+            level, ts = self.data.get(key, (capacity, now))
+            level = min(capacity, level + max(0.0, now - ts) * rate)
+            levels.append(level)
+            if level < cost:
+                allowed, wait = 0, max(wait, (cost - level) / rate)
+        if allowed:
+            levels = [level - cost for level in levels]
+        for key, level in zip(keys, levels):
+            self.data[key] = (level, now)
+        return [allowed, repr(wait)] + [repr(level) for level in levels]
+
+
+@pytest_asyncio.fixture
+async def stand_in():
+    server = StandInServer()
+    port = await server.start()
+    yield server, port
+    await server.stop()
+
+
+BUCKETS = [("client:0", Limit(3, 60)), ("client:1", Limit(100, 86_400))]
+
+
+class TestRespClient:
+    """Test the protocol client"""
+
+    def test_encode_command(self):
+        assert encode_command(["GET", "k"]) == b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n"
+
+    @pytest.mark.asyncio
+    async def test_pipeline_replies_in_order(self, stand_in):
+        server, port = stand_in
+        client = RespClient(port=port)
+        replies = await client.pipeline([("PING",), ("BOGUS",), ("PING",)])
+        assert replies[0] == replies[2] == b"PONG"
+        assert isinstance(replies[1], RespError)
+        assert client.round_trips == 1
+        await client.close()
+
+
+class TestRespBackend:
+    """Test the shared bucket store"""
+
+    @pytest.mark.asyncio
+    async def test_limit_is_global_across_hosts(self, stand_in):
+        server, port = stand_in
+        host_a = RespBackend(RespClient(port=port))
+        host_b = RespBackend(RespClient(port=port))
+
+        results = [await backend.charge(BUCKETS, 1) for backend in (host_a, host_b, host_a, host_b)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert results[2].remaining == (0, 97)
+        assert 0 < results[3].retry_after <= 60
+        # The script was loaded on first use
+        assert hashlib.sha1(CHARGE_SCRIPT.encode()).hexdigest() in server.scripts
+        await host_a.close()
+        await host_b.close()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_charges_are_pipelined(self, stand_in):
+        server, port = stand_in
+        backend = RespBackend(RespClient(port=port))
+        await backend.charge(BUCKETS, 0)
+        trips = backend.client.round_trips
+
+        buckets = [(f"c{i}", Limit(10, 60)) for i in range(50)]
+        results = await asyncio.gather(*(backend.charge([bucket], 1) for bucket in buckets))
+        assert all(r.allowed for r in results)
+        assert backend.client.round_trips - trips <= 2
+        await backend.close()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_when_unreachable(self, stand_in):
+        server, port = stand_in
+        await server.stop()
+        backend = RespBackend(RespClient(port=port, timeout=0.2))
+        result = await backend.charge(BUCKETS, 1)
+        assert result.allowed
+        assert backend.stats()["errors"] == 1
+        assert backend.fallback.buckets
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_auth_is_rejected(self, stand_in):
+        _, port = stand_in
+        backend = RespBackend(RespClient(port=port, password="wrong"))
+        for _ in range(2):
+            result = await asyncio.wait_for(backend.charge(BUCKETS, 1), 2)
+            assert result.allowed
+        assert backend.stats()["errors"] == 2
+        assert backend.client._writer is None
+
+    @pytest.mark.asyncio
+    async def test_cancelled_charge_does_not_break_the_batch(self, stand_in):
+        _, port = stand_in
+        backend = RespBackend(RespClient(port=port))
+        cancelled = asyncio.ensure_future(backend.charge(BUCKETS, 1))
+        kept = asyncio.ensure_future(backend.charge(BUCKETS, 1))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        assert (await kept).allowed
+        await backend.close()
+
+
+class TestLeasingBackend:
+    """Test local token leases for hot clients"""
+
+    @pytest.mark.asyncio
+    async def test_hot_client_skips_round_trips(self, stand_in):
+        server, port = stand_in
+        backend = LeasingBackend(RespBackend(RespClient(port=port)), lease_size=10, hot_threshold=2)
+
+        results = [await backend.charge([("hot:0", Limit(100, 60))], 1) for _ in range(45)]
+        assert all(r.allowed for r in results)
+        assert backend.stats()["lease_hits"] >= 35
+        assert backend.inner.client.round_trips < 10
+        # Leases never admit more than the global budget
+        results = [await backend.charge([("hot:1", Limit(40, 60))], 1) for _ in range(45)]
+        assert sum(r.allowed for r in results) == 40
+        await backend.close()
+
+
+class TestLocalBackend:
+    """Test the in-process backend"""
+
+    @pytest.mark.asyncio
+    async def test_charges_all_windows(self):
+        backend = LocalBackend()
+        assert (await backend.charge(BUCKETS, 3)).allowed
+        assert not (await backend.charge(BUCKETS, 1)).allowed
+        backend.reset()
+        assert (await backend.charge(BUCKETS, 1)).remaining == (2, 99)
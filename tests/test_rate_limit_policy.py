@@ -0,0 +1,111 @@
+"""Test tiered, per-route rate-limit policies"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.middleware.rate_limit_policy import Limit, RatePolicy, RatePolicyTable
+from src.middleware.rate_limiter import RateLimiterMiddleware
+
+client = TestClient(app)
+
+
+def _app(**limiter) -> FastAPI:
+    test_app = FastAPI()
+
+    @test_app.get("/cheap")
+    async def cheap():
+        return {"ok": True}
+
+    @test_app.post("/costly/{item_id}")
+    async def costly(item_id: int):
+        return {"ok": True}
+
+    test_app.add_middleware(RateLimiterMiddleware, **limiter)
+    return test_app
+
+
+def _user_headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestRatePolicyTable:
+    """Test route template lookup"""
+
+    def test_static_templated_and_default(self):
+        table = RatePolicyTable(
+            {
+                "POST /login": RatePolicy("auth", cost=5),
+                "/items/{item_id}": RatePolicy("items", cost=3),
+            }
+        )
+        assert table.lookup("POST", "/login").cost == 5
+        assert table.lookup("GET", "/login") is table.default
+        assert table.lookup("DELETE", "/items/42").name == "items"
+        assert table.lookup("GET", "/items/42/extra") is table.default
+
+
+class TestRateLimitPolicies:
+    """Test weighted, multi-window decisions"""
+
+    def test_route_cost_weight(self):
+        test_app = _app(
+            requests_per_minute=20,
+            policies=RatePolicyTable({"POST /costly/{item_id}": RatePolicy(cost=5)}),
+        )
+        test_client = TestClient(test_app)
+        cheap = test_client.get("/cheap")
+        assert cheap.headers["X-RateLimit-Remaining"] == "19"
+        costly = test_client.post("/costly/1")
+        assert costly.headers["X-RateLimit-Remaining"] == "14"
+
+    def test_every_window_enforced(self):
+        tiers = {"anonymous": (Limit(100, 60), Limit(3, 86_400))}
+        test_client = TestClient(_app(tier_limits=tiers))
+        codes = [test_client.get("/cheap").status_code for _ in range(4)]
+        assert codes == [200, 200, 200, 429]
+
+        response = test_client.get("/cheap")
+        assert response.json()["detail"]["error"] == "Rate limit exceeded"
+        assert int(response.headers["Retry-After"]) > 60
+        assert response.headers["X-RateLimit-Policy"] == "100;w=60, 3;w=86400"
+
+    def test_burst_size(self):
+        tiers = {"anonymous": (Limit(1, 1, burst=3),)}
+        test_client = TestClient(_app(tier_limits=tiers))
+        codes = [test_client.get("/cheap").status_code for _ in range(4)]
+        assert codes == [200, 200, 200, 429]
+
+    def test_route_with_own_budget(self):
+        own = {"anonymous": (Limit(1, 60),)}
+        test_app = _app(
+            policies=RatePolicyTable({"POST /costly/{item_id}": RatePolicy("costly", limits=own)})
+        )
+        test_client = TestClient(test_app)
+        assert test_client.post("/costly/1").status_code == 200
+        assert test_client.post("/costly/2").status_code == 429
+        # The shared budget is untouched
+        assert test_client.get("/cheap").headers["X-RateLimit-Remaining"] == "59"
+
+
+class TestCallerTiers:
+    """Test tier selection on the gateway"""
+
+    def test_user_and_admin_tiers(self):
+        user = client.get("/api/v1/users/profile", headers=_user_headers(961))
+        assert user.headers["X-RateLimit-Limit"] == "120"
+        admin = client.get("/api/v1/admin/users", headers=_user_headers(962, True))
+        assert admin.headers["X-RateLimit-Limit"] == "300"
+
+    def test_login_costs_more(self):
+        response = client.post("/api/v1/auth/login", json={"username": "nobody", "password": "x"})
+        assert response.headers["X-RateLimit-Remaining"] == "55"
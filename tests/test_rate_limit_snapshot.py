@@ -0,0 +1,130 @@
+"""Test rate-limiter snapshot and warm restore"""
+
+import logging
+import time
+
+import numpy as np
+import pytest
+
+from src.middleware import ip_filter
+from src.middleware.ip_filter import ClientInfo
+from src.middleware.rate_limit_backend import LocalBackend
+from src.middleware.rate_limit_policy import Limit
+from src.middleware.rate_limit_snapshot import (
+    SNAPSHOT_DTYPE,
+    BucketSnapshot,
+    LimiterSnapshots,
+    key_hash,
+    write_snapshot,
+)
+
+LIMIT = [("client:0", Limit(10, 60))]
+
+
+def _restored_backend(path) -> LocalBackend:
+    backend = LocalBackend()
+    LimiterSnapshots(str(path)).attach(backend)
+    return backend
+
+
+class TestSnapshotRestore:
+    """Test that bucket state survives a restart"""
+
+    @pytest.mark.asyncio
+    async def test_drained_bucket_stays_drained(self, tmp_path):
+        path = tmp_path / "limits.snap"
+        backend = LocalBackend()
+        snapshots = LimiterSnapshots(str(path))
+        snapshots.attach(backend)
+        assert (await backend.charge(LIMIT, 10)).allowed
+        await snapshots.save()
+
+        restarted = _restored_backend(path)
+        assert not (await restarted.charge(LIMIT, 1)).allowed
+        assert restarted.restored == 1
+
+    @pytest.mark.asyncio
+    async def test_refill_for_elapsed_time(self, tmp_path):
+        path = tmp_path / "limits.snap"
+        records = np.array([(key_hash("client:0"), 0.0, time.time() - 30)], dtype=SNAPSHOT_DTYPE)
+        write_snapshot(str(path), records, time.time())
+
+        result = await _restored_backend(path).charge(LIMIT, 1)
+        # 30 s at 10/min refilled 5 tokens
+        assert result.allowed
+        assert result.remaining == (4,)
+
+    @pytest.mark.asyncio
+    async def test_unseen_clients_carried_over(self, tmp_path):
+        path = tmp_path / "limits.snap"
+        first = LocalBackend()
+        snapshots = LimiterSnapshots(str(path))
+        snapshots.attach(first)
+        await first.charge([("a", Limit(10, 60))], 1)
+        await snapshots.save()
+
+        second = LocalBackend()
+        snapshots = LimiterSnapshots(str(path))
+        snapshots.attach(second)
+        await second.charge([("b", Limit(10, 60))], 1)
+        await snapshots.save()
+
+        snapshot = BucketSnapshot(str(path))
+        assert snapshot.lookup(key_hash("a")) is not None
+        assert snapshot.lookup(key_hash("b")) is not None
+
+    @pytest.mark.asyncio
+    async def test_anonymous_buckets_need_a_stable_hash_key(self, tmp_path, monkeypatch):
+        path = tmp_path / "limits.snap"
+        monkeypatch.setattr(ip_filter, "_HASH_KEY", b"key-1")
+        anonymous = [(ClientInfo("203.0.113.9").client_id, Limit(10, 60))]
+        backend = LocalBackend()
+        snapshots = LimiterSnapshots(str(path))
+        snapshots.attach(backend)
+        assert (await backend.charge(anonymous, 10)).allowed
+        await snapshots.save()
+
+        # Same key: the drained bucket is restored
+        restarted = [(ClientInfo("203.0.113.9").client_id, Limit(10, 60))]
+        assert not (await _restored_backend(path).charge(restarted, 1)).allowed
+
+        # New key (a restart without CLIENT_ID_HASH_KEY): the client starts fresh
+        monkeypatch.setattr(ip_filter, "_HASH_KEY", b"key-2")
+        restarted = [(ClientInfo("203.0.113.9").client_id, Limit(10, 60))]
+        assert (await _restored_backend(path).charge(restarted, 1)).allowed
+
+    def test_unstable_client_ids_warned(self, tmp_path, caplog):
+        with caplog.at_level(logging.WARNING):
+            LimiterSnapshots(str(tmp_path / "limits.snap"), stable_client_ids=False).attach(
+                LocalBackend()
+            )
+        assert "CLIENT_ID_HASH_KEY" in caplog.text
+
+    def test_invalid_file_ignored(self, tmp_path):
+        path = tmp_path / "limits.snap"
+        path.write_bytes(b"garbage" * 10)
+        assert BucketSnapshot.open(str(path)) is None
+        assert BucketSnapshot.open(str(tmp_path / "missing")) is None
+
+
+class TestSnapshotLoad:
+    """Test that restore cost does not grow with snapshot size"""
+
+    def test_million_keys_open_quickly(self, tmp_path):
+        path = tmp_path / "limits.snap"
+        count = 1_000_000
+        records = np.zeros(count, dtype=SNAPSHOT_DTYPE)
+        records["key"] = np.arange(count, dtype=np.uint64) * 7919
+        records["tokens"] = 3.0
+        records["updated"] = time.time()
+        write_snapshot(str(path), records, time.time())
+
+        start = time.perf_counter()
+        snapshot = BucketSnapshot(str(path))
+        found = snapshot.lookup(7919 * 123_456)
+        elapsed = time.perf_counter() - start
+
+        assert len(snapshot) == count
+        assert found[0] == 3.0
+        assert snapshot.lookup(1) is None
+        assert elapsed < 0.1
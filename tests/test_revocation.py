@@ -0,0 +1,97 @@
+"""Test token revocation"""
+
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.auth.revocation import BloomFilter, RevocationList
+from src.main import app
+
+client = TestClient(app)
+
+
+def _headers(user_id: int = 951) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": False,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestBloomFilter:
+    """Test the Bloom filter"""
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000)
+        items = [uuid.uuid4().hex for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+        assert all(item in bloom for item in items)
+
+    def test_false_positive_rate_near_target(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(uuid.uuid4().hex)
+        positives = sum(uuid.uuid4().hex in bloom for _ in range(10_000))
+        assert positives < 300
+
+
+class TestRevocationList:
+    """Test revocation, expiry and sharing across workers"""
+
+    def test_revoked_until_expiry(self):
+        revocations = RevocationList()
+        revocations.revoke("live", time.time() + 60)
+        revocations.revoke("stale", time.time() - 1)
+        assert revocations.is_revoked("live")
+        assert not revocations.is_revoked("stale")
+        assert not revocations.is_revoked("other")
+        assert not revocations.is_revoked(None)
+
+    def test_shared_file_between_workers(self, tmp_path):
+        path = str(tmp_path / "revoked")
+        worker_a = RevocationList(path=path, sync_interval=0)
+        worker_b = RevocationList(path=path, sync_interval=0)
+        assert not worker_b.is_revoked("jti-1")
+
+        worker_a.revoke("jti-1", time.time() + 60)
+        assert worker_b.is_revoked("jti-1")
+
+    def test_compaction_keeps_live_entries(self, tmp_path):
+        path = str(tmp_path / "revoked")
+        writer = RevocationList(path=path, sync_interval=0)
+        writer.revoke("live", time.time() + 60)
+        for i in range(5):
+            writer.revoke(f"soon-{i}", time.time() + 0.05)
+        time.sleep(0.1)
+        writer._purge()
+
+        with open(path) as f:
+            assert [line.split()[0] for line in f] == ["live"]
+        reader = RevocationList(path=path, sync_interval=0)
+        assert reader.is_revoked("live")
+        assert not reader.is_revoked("soon-0")
+
+
+class TestLogout:
+    """Test logout invalidating the token"""
+
+    def test_logout_revokes_token(self):
+        headers = _headers()
+        assert client.get("/api/v1/auth/me", headers=headers).status_code == 200
+
+        response = client.post("/api/v1/auth/logout", headers=headers)
+        assert response.status_code == 200
+
+        # The token is still in the verified cache but must be rejected.
+        response = client.get("/api/v1/auth/me", headers=headers)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
+
+        assert client.get("/api/v1/auth/me", headers=_headers()).status_code == 200
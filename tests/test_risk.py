@@ -0,0 +1,145 @@
+"""Test pre-trade risk checks"""
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.trading.positions import PositionBook, SymbolIndex
+from src.trading.risk import REASONS, PreTradeRiskEngine, RiskLimits
+
+client = TestClient(app)
+
+
+def _engine(**limits):
+    symbols = SymbolIndex()
+    return symbols, PreTradeRiskEngine(PositionBook(symbols), RiskLimits(**limits))
+
+
+def _reasons(engine, symbols, user_id, legs):
+    idx = symbols.indices(s for s, _, _ in legs)
+    qty = np.array([q for _, q, _ in legs], dtype=float)
+    prices = np.array([p for _, _, p in legs], dtype=float)
+    codes = engine.check_batch(user_id, idx, qty, prices)
+    engine.apply(user_id, idx, qty, prices, codes)
+    return [REASONS[c] for c in codes]
+
+
+class TestRiskEngine:
+    """Test the vectorized risk engine"""
+
+    def test_order_notional_limit(self):
+        symbols, engine = _engine(max_order_notional=1_000)
+        assert _reasons(engine, symbols, 1, [("A", 5, 100), ("A", 20, 100)]) == [
+            "accepted",
+            "order_notional_limit",
+        ]
+
+    def test_position_limit_counts_earlier_legs(self):
+        symbols, engine = _engine(max_position=10)
+        legs = [("A", 6, 1), ("B", 6, 1), ("A", 6, 1), ("A", -6, 1)]
+        assert _reasons(engine, symbols, 1, legs) == [
+            "accepted",
+            "accepted",
+            "position_limit",
+            "accepted",
+        ]
+
+    def test_rejected_notional_leg_does_not_block_later_legs(self):
+        symbols, engine = _engine(max_order_notional=100, max_position=10)
+        legs = [("A", 1_000, 1), ("A", 5, 1)]
+        assert _reasons(engine, symbols, 1, legs) == [
+            "order_notional_limit",
+            "accepted",
+        ]
+
+    def test_existing_positions_count(self):
+        symbols, engine = _engine(max_symbol_exposure=1_000)
+        assert _reasons(engine, symbols, 1, [("A", 8, 100)]) == ["accepted"]
+        assert _reasons(engine, symbols, 1, [("A", 3, 100)]) == ["symbol_exposure_limit"]
+        # Other users are unaffected
+        assert _reasons(engine, symbols, 2, [("A", 3, 100)]) == ["accepted"]
+
+    def test_gross_exposure_limit(self):
+        symbols, engine = _engine(max_gross_exposure=1_000)
+        legs = [("A", 4, 100), ("B", 4, 100), ("C", 4, 100)]
+        assert _reasons(engine, symbols, 1, legs) == [
+            "accepted",
+            "accepted",
+            "gross_exposure_limit",
+        ]
+
+    def test_rejected_position_leg_does_not_count(self):
+        symbols, engine = _engine(max_position=100)
+        legs = [("A", 200, 1), ("A", -150, 1)]
+        assert _reasons(engine, symbols, 1, legs) == [
+            "position_limit",
+            "position_limit",
+        ]
+        qty, _ = engine.book.get(1)
+        assert qty[symbols.lookup("A")] == 0
+
+    def test_flat_position_has_no_exposure(self):
+        symbols, engine = _engine(max_gross_exposure=1_000)
+        # A round trip leaves qty 0 (and 1500 realized)
+        legs = [("A", 10, 100), ("A", -10, 250)]
+        assert _reasons(engine, symbols, 1, legs) == ["accepted", "accepted"]
+        assert _reasons(engine, symbols, 1, [("B", 9, 100)]) == ["accepted"]
+
+    def test_partial_close_marked_at_entry_price(self):
+        symbols, engine = _engine(max_gross_exposure=1_000)
+        legs = [("A", 10, 100), ("A", -9, 200)]
+        assert _reasons(engine, symbols, 1, legs) == ["accepted", "accepted"]
+        # 1 A at its 100 entry plus 800 of B
+        assert _reasons(engine, symbols, 1, [("B", 8, 100)]) == ["accepted"]
+        assert _reasons(engine, symbols, 1, [("B", 2, 100)]) == ["gross_exposure_limit"]
+
+    def test_sequential_fallback_matches_passes(self):
+        rng = np.random.default_rng(7)
+        symbols, engine = _engine(
+            max_order_notional=5_000, max_position=60, max_gross_exposure=20_000
+        )
+        for _ in range(20):
+            idx = rng.integers(0, 5, 50)
+            qty = rng.integers(-80, 80, 50).astype(float)
+            prices = rng.uniform(10, 100, 50)
+            held, _ = engine.book.get(1)
+            expected = engine._check_sequential(held, 0.0, idx, qty, prices)
+            np.testing.assert_array_equal(engine.check_batch(1, idx, qty, prices), expected)
+
+
+class TestBasketRoute:
+    """Test basket order submission"""
+
+    def _headers(self, user_id: int) -> dict:
+        token = JWTHandler.create_access_token(
+            {"user_id": user_id, "username": f"u{user_id}", "is_admin": False}
+        )
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_basket_returns_per_leg_results(self):
+        response = client.post(
+            "/api/v1/trading/orders/batch",
+            json={
+                "legs": [
+                    {"symbol": "IBM", "side": "buy", "quantity": 10, "price": 100},
+                    {"symbol": "IBM", "side": "buy", "quantity": 1e6, "price": 100},
+                ]
+            },
+            headers=self._headers(911),
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 1
+        assert data["rejected"] == 1
+        assert data["legs"][0]["status"] == "accepted"
+        assert data["legs"][1]["reason"] == "order_notional_limit"
+
+    def test_rejected_single_order(self):
+        response = client.post(
+            "/api/v1/trading/orders",
+            json={"symbol": "IBM", "side": "sell", "quantity": 1e6, "price": 100},
+            headers=self._headers(912),
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"]["reason"] == "order_notional_limit"
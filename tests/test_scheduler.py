@@ -0,0 +1,119 @@
+"""Test priority-aware request scheduling"""
+
+import asyncio
+
+import pytest
+
+from src.middleware.concurrency_limiter import AdaptiveConcurrencyLimit
+from src.middleware.scheduler import PriorityScheduler
+
+CRITICAL, STANDARD, BACKGROUND = 0, 1, 2
+
+
+def _scheduler(**kwargs) -> PriorityScheduler:
+    return PriorityScheduler(AdaptiveConcurrencyLimit(initial_limit=1), **kwargs)
+
+
+class TestPriorityScheduler:
+    """Test class ordering, tenant fairness and dropping"""
+
+    def test_classify_routes(self):
+        scheduler = _scheduler()
+        assert scheduler.classify("/api/v1/trading/orders") == CRITICAL
+        assert scheduler.classify("/api/v1/users/profile") == STANDARD
+        assert scheduler.classify("/api/v1/auth/login") == BACKGROUND
+        assert scheduler.classify("/api/v1/admin/users") == BACKGROUND
+        assert scheduler.classify("/other") == STANDARD
+
+    @pytest.mark.asyncio
+    async def test_higher_class_admitted_first(self):
+        scheduler = _scheduler()
+        assert await scheduler.acquire(CRITICAL, "holder")
+
+        order = []
+
+        async def request(class_idx, name):
+            if await scheduler.acquire(class_idx, name):
+                order.append(name)
+                scheduler.release(0.001)
+
+        tasks = [
+            asyncio.create_task(request(BACKGROUND, "admin")),
+            asyncio.create_task(request(STANDARD, "users")),
+            asyncio.create_task(request(CRITICAL, "trading")),
+        ]
+        await asyncio.sleep(0)
+        scheduler.release(0.001)
+        await asyncio.gather(*tasks)
+        assert order == ["trading", "users", "admin"]
+
+    @pytest.mark.asyncio
+    async def test_tenants_round_robin_within_class(self):
+        scheduler = _scheduler(tenant_weights={"heavy": 2})
+        assert await scheduler.acquire(CRITICAL, "holder")
+
+        order = []
+
+        async def request(tenant):
+            if await scheduler.acquire(CRITICAL, tenant):
+                order.append(tenant)
+                scheduler.release(0.001)
+
+        tenants = ["noisy"] * 3 + ["heavy"] * 3 + ["quiet"]
+        tasks = [asyncio.create_task(request(t)) for t in tenants]
+        await asyncio.sleep(0)
+        scheduler.release(0.001)
+        await asyncio.gather(*tasks)
+        assert order == ["noisy", "heavy", "heavy", "quiet", "noisy", "heavy", "noisy"]
+
+    @pytest.mark.asyncio
+    async def test_full_queue_and_deadline_drop(self):
+        scheduler = _scheduler(
+            classes=(
+                ("critical", 10, 1.0),
+                ("standard", 10, 1.0),
+                ("background", 1, 0.05),
+            )
+        )
+        assert await scheduler.acquire(CRITICAL, "holder")
+
+        waiting = asyncio.create_task(scheduler.acquire(BACKGROUND, "a"))
+        await asyncio.sleep(0)
+        assert not await scheduler.acquire(BACKGROUND, "b")  # queue full
+        assert not await waiting  # deadline passed
+
+        stats = scheduler.stats()["background"]
+        assert stats["dropped_full"] == 1
+        assert stats["dropped_deadline"] == 1
+        assert stats["queued"] == 0
+        assert scheduler.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = _scheduler()
+        assert await scheduler.acquire(CRITICAL, "holder")
+
+        waiting = asyncio.create_task(scheduler.acquire(CRITICAL, "gone"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.waiting == 0
+        assert scheduler.stats()["critical"]["queued"] == 0
+
+        # The slot frees cleanly and the next caller gets it
+        scheduler.release(0.001)
+        assert scheduler.limit.in_flight == 0
+        assert await scheduler.acquire(CRITICAL, "next")
+
+    @pytest.mark.asyncio
+    async def test_slot_returned_when_cancelled_on_admission(self):
+        scheduler = _scheduler()
+        assert await scheduler.acquire(CRITICAL, "holder")
+
+        waiting = asyncio.create_task(scheduler.acquire(CRITICAL, "gone"))
+        await asyncio.sleep(0)
+        # The slot is handed over and the request cancelled in one step
+        scheduler.release(0.001)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.limit.in_flight == 0
@@ -0,0 +1,158 @@
+"""Test order/market-data streaming"""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.auth.api_keys import api_key_store
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.routes.trading_routes import stream_sse
+from src.trading.streaming import CHANNEL_MARKET, CHANNEL_ORDERS, StreamHub, stream_hub
+
+client = TestClient(app)
+
+
+def _token(user_id: int, **kwargs) -> str:
+    return JWTHandler.create_access_token(
+        {"user_id": user_id, "username": f"u{user_id}", "is_admin": False}, **kwargs
+    )
+
+
+class TestStreamHub:
+    """Test fan-out and backpressure in the stream hub"""
+
+    @pytest.mark.asyncio
+    async def test_order_updates_routed_by_user(self):
+        hub = StreamHub()
+        mine = hub.subscribe(1, frozenset({CHANNEL_ORDERS}))
+        other = hub.subscribe(2, frozenset({CHANNEL_ORDERS}))
+
+        assert hub.publish_order(1, {"order_id": 7}) == 1
+        batch = await mine.next_batch(timeout=0.1)
+        assert [m["data"]["order_id"] for m in batch] == [7]
+        assert await other.next_batch(timeout=0.01) == []
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_is_dropped(self):
+        hub = StreamHub(queue_size=2)
+        sub = hub.subscribe(1, frozenset({CHANNEL_ORDERS}))
+
+        for i in range(3):
+            hub.publish_order(1, {"order_id": i})
+
+        assert sub.closed
+        assert sub.close_reason == "slow_consumer"
+        assert hub.subscriber_count == 0
+        assert hub.stats()["slow_consumers_dropped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_market_data_is_conflated(self):
+        hub = StreamHub()
+        sub = hub.subscribe(1, frozenset({CHANNEL_MARKET}))
+
+        for price in (100.0, 101.0, 102.0):
+            hub.publish_market("AAPL", {"price": price})
+        hub.publish_market("MSFT", {"price": 300.0})
+
+        batch = await sub.next_batch(timeout=0.1)
+        assert [(m["symbol"], m["data"]["price"]) for m in batch] == [
+            ("AAPL", 102.0),
+            ("MSFT", 300.0),
+        ]
+        assert sub.conflated == 2
+
+    def test_subscriber_cap(self):
+        hub = StreamHub(max_subscribers=1)
+        assert hub.subscribe(1, frozenset({CHANNEL_ORDERS})) is not None
+        assert hub.subscribe(2, frozenset({CHANNEL_ORDERS})) is None
+
+
+class TestStreamRoutes:
+    """Test order submission and the push endpoints"""
+
+    def test_submitted_order_is_listed(self):
+        headers = {"Authorization": f"Bearer {_token(901)}"}
+        response = client.post(
+            "/api/v1/trading/orders",
+            json={"symbol": "aapl", "side": "buy", "quantity": 10, "price": 150.0},
+            headers=headers,
+        )
+        assert response.status_code == 201
+        assert response.json()["symbol"] == "AAPL"
+
+        orders = client.get("/api/v1/trading/orders", headers=headers).json()
+        assert orders["total"] == 1
+        assert orders["orders"][0]["order_id"] == response.json()["order_id"]
+
+    def test_websocket_receives_order_updates(self):
+        token = _token(902)
+        with TestClient(app) as ws_client:
+            with ws_client.websocket_connect(
+                f"/api/v1/trading/stream/ws?channels=orders&token={token}"
+            ) as ws:
+                ws_client.post(
+                    "/api/v1/trading/orders",
+                    json={
+                        "symbol": "MSFT",
+                        "side": "sell",
+                        "quantity": 1,
+                        "price": 300,
+                    },
+                    headers={"Authorization": f"Bearer {token}"},
+                )
+                message = ws.receive_json()
+                assert message["channel"] == "orders"
+                assert message["data"]["symbol"] == "MSFT"
+
+    def test_websocket_rejects_invalid_token(self):
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/api/v1/trading/stream/ws?token=bad") as ws:
+                ws.receive_json()
+        assert exc.value.code == 1008
+
+    def test_websocket_closes_when_token_expires(self):
+        token = _token(903, expires_delta=timedelta(seconds=1))
+        with client.websocket_connect(f"/api/v1/trading/stream/ws?token={token}") as ws:
+            with pytest.raises(WebSocketDisconnect) as exc:
+                ws.receive_json()
+        assert exc.value.reason == "token_expired"
+
+    def test_stream_rejects_unknown_channel(self):
+        response = client.get(
+            "/api/v1/trading/stream?channels=news",
+            headers={"Authorization": f"Bearer {_token(904)}"},
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_unsent_stream_leaves_no_subscriber(self):
+        before = stream_hub.subscriber_count
+        user = JWTHandler.verify_token(_token(905))
+        response = await stream_sse(channels="orders", current_user=user)
+        assert stream_hub.subscriber_count == before
+
+        body = response.body_iterator
+        first = asyncio.ensure_future(body.__anext__())
+        await asyncio.sleep(0)
+        assert stream_hub.subscriber_count == before + 1
+        stream_hub.publish_order(905, {"order_id": 1})
+        assert "event: orders" in await first
+        await body.aclose()
+        assert stream_hub.subscriber_count == before
+
+    @pytest.mark.asyncio
+    async def test_api_key_stream_has_no_token_expiry(self):
+        user = {"user_id": 906, "username": "u906", "email": "u906@example.com"}
+        _, record = api_key_store.create(user, "feed", ["trading:read"])
+        response = await stream_sse(channels="orders", current_user=record.principal)
+
+        body = response.body_iterator
+        first = asyncio.ensure_future(body.__anext__())
+        await asyncio.sleep(0)
+        stream_hub.publish_order(906, {"order_id": 1})
+        assert "event: orders" in await first
+        await body.aclose()
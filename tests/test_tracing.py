@@ -0,0 +1,220 @@
+"""Test request tracing and trace export"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.middleware.tracing import TracingMiddleware
+from src.utils.tracing import Tracer, parse_traceparent, tracer
+
+client = TestClient(app)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+def _headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _trace_app(tracer_: Tracer) -> TestClient:
+    test_app = FastAPI()
+
+    @test_app.get("/ping")
+    async def ping():
+        with tracer_.span("work"):
+            pass
+        return {"ok": True}
+
+    @test_app.get("/fail")
+    async def fail():
+        raise RuntimeError("boom")
+
+    test_app.add_middleware(TracingMiddleware, tracer=tracer_)
+    return TestClient(test_app, raise_server_exceptions=False)
+
+
+class TestTraceparent:
+    """Test W3C traceparent parsing"""
+
+    def test_valid(self):
+        assert parse_traceparent(TRACEPARENT) == (TRACE_ID, "00f067aa0ba902b7", True)
+        assert parse_traceparent(TRACEPARENT[:-1] + "0")[2] is False
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            None,
+            "garbage",
+            f"ff-{TRACE_ID}-00f067aa0ba902b7-01",
+            f"00-{'0' * 32}-00f067aa0ba902b7-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+            f"00-{TRACE_ID}-00f067aa0ba902bz-01",
+            f"00-{TRACE_ID}-00f067aa0ba902b7-01-extra",
+        ],
+    )
+    def test_invalid(self, value):
+        assert parse_traceparent(value) is None
+
+
+class TestSampling:
+    """Test head and tail sampling"""
+
+    def test_unsampled_fast_requests_dropped(self):
+        local = Tracer(sample_rate=0.0, slow_ms=10_000)
+        test_client = _trace_app(local)
+        response = test_client.get("/ping")
+        assert response.headers["traceresponse"].endswith("-00")
+        assert local.started == 1
+        assert local.kept == 0
+
+    def test_head_sampled_by_caller(self):
+        local = Tracer(sample_rate=0.0, slow_ms=10_000)
+        response = _trace_app(local).get("/ping", headers={"traceparent": TRACEPARENT})
+        assert response.headers["traceresponse"].startswith(f"00-{TRACE_ID}-")
+        [trace] = local.recent()
+        assert trace["trace_id"] == TRACE_ID
+        root, work = trace["spans"]
+        assert root["parent_id"] == "00f067aa0ba902b7"
+        assert work["name"] == "work" and work["parent_id"] == root["span_id"]
+
+    def test_tail_keeps_slow_and_failed(self):
+        local = Tracer(sample_rate=0.0, slow_ms=0.0)
+        _trace_app(local).get("/ping")
+        assert local.kept == 1
+
+        local = Tracer(sample_rate=0.0, slow_ms=10_000)
+        assert _trace_app(local).get("/fail").status_code == 500
+        [trace] = local.recent()
+        assert trace["attributes"]["http.status_code"] == 500
+
+    def test_ring_buffer_bounded(self):
+        local = Tracer(sample_rate=1.0, buffer_size=5)
+        test_client = _trace_app(local)
+        for _ in range(12):
+            test_client.get("/ping")
+        assert local.kept == 12
+        assert len(local.recent(limit=100)) == 5
+
+
+class TestGatewayTraces:
+    """Test spans recorded across the real middleware stack"""
+
+    def test_login_breakdown(self):
+        client.post(
+            "/api/v1/auth/login",
+            json={"email": "user@example.com", "password": "user123"},
+            headers={"traceparent": TRACEPARENT},
+        )
+        trace = next(t for t in tracer.recent(limit=50) if t["trace_id"] == TRACE_ID)
+        names = [span["name"] for span in trace["spans"]]
+        for name in (
+            "middleware.ip_filter",
+            "middleware.rate_limiter",
+            "middleware.request_logger",
+            "handler",
+            "bcrypt.verify",
+        ):
+            assert name in names
+        handler = next(s for s in trace["spans"] if s["name"] == "handler")
+        bcrypt = next(s for s in trace["spans"] if s["name"] == "bcrypt.verify")
+        assert bcrypt["parent_id"] == handler["span_id"]
+        assert handler["attributes"]["route"] == "/login"
+
+    def test_admin_endpoint(self):
+        traceparent = f"00-{'ab' * 16}-00f067aa0ba902b7-01"
+        client.get("/api/v1/users/profile", headers={"traceparent": traceparent})
+        response = client.get("/api/v1/admin/traces?limit=200", headers=_headers(991, True))
+        assert response.status_code == 200
+        assert any(t["trace_id"] == "ab" * 16 for t in response.json()["traces"])
+
+
+class _Collector(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        _Collector.received.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestExport:
+    """Test OTLP/JSON export to a file and to a collector"""
+
+    def _spans(self, payload):
+        return payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+    @pytest.mark.asyncio
+    async def test_file_export(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        local = Tracer(sample_rate=1.0, export_file=str(path))
+        _trace_app(local).get("/ping")
+        await local.flush()
+
+        [line] = path.read_text().splitlines()
+        spans = self._spans(json.loads(line))
+        assert [s["name"] for s in spans] == ["GET /ping", "work"]
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert int(spans[0]["endTimeUnixNano"]) >= int(spans[1]["endTimeUnixNano"])
+        assert local.exported == 1
+
+    @pytest.mark.asyncio
+    async def test_collector_export(self):
+        server = HTTPServer(("127.0.0.1", 0), _Collector)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/v1/traces"
+            local = Tracer(sample_rate=1.0, export_url=url)
+            _trace_app(local).get("/ping", headers={"traceparent": TRACEPARENT})
+            await local.flush()
+        finally:
+            server.shutdown()
+
+        [(path, payload)] = _Collector.received
+        assert path == "/v1/traces"
+        assert {s["traceId"] for s in self._spans(payload)} == {TRACE_ID}
+
+    @pytest.mark.asyncio
+    async def test_collector_down_counted(self):
+        local = Tracer(sample_rate=1.0, export_url="http://127.0.0.1:9/v1/traces")
+        _trace_app(local).get("/ping")
+        await local.flush()
+        assert local.export_errors == 1
+
+    @pytest.mark.parametrize(
+        "url", ["file:///etc/passwd", "ftp://collector/v1/traces", "http://", "http://h:x/"]
+    )
+    def test_export_url_must_be_http(self, url):
+        with pytest.raises(ValueError):
+            Tracer(export_url=url)
+
+    @pytest.mark.asyncio
+    async def test_export_value_error_counted(self, tmp_path, monkeypatch):
+        local = Tracer(sample_rate=1.0, export_file=str(tmp_path / "traces.jsonl"))
+
+        def fail(traces):
+            raise ValueError("bad payload")
+
+        monkeypatch.setattr(local, "_export", fail)
+        _trace_app(local).get("/ping")
+        await local.flush()
+        assert local.export_errors == 1
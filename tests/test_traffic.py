@@ -0,0 +1,91 @@
+"""Test heavy-hitter traffic analytics"""
+
+import random
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.auth.jwt_handler import JWTHandler
+from src.main import app
+from src.middleware.rate_limit_policy import Limit
+from src.middleware.rate_limiter import RateLimiterMiddleware
+from src.utils.sketches import SpaceSaving, WindowedTopK
+from src.utils.traffic import traffic_analytics
+
+client = TestClient(app)
+
+
+def _headers(user_id: int, is_admin: bool = False) -> dict:
+    token = JWTHandler.create_access_token(
+        {
+            "user_id": user_id,
+            "username": f"u{user_id}",
+            "email": f"u{user_id}@example.com",
+            "is_admin": is_admin,
+        }
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestSpaceSaving:
+    """Test the top-k counters"""
+
+    def test_finds_heavy_hitters_in_bounded_memory(self):
+        rng = random.Random(7)
+        counter = SpaceSaving(k=50)
+        stream = [f"heavy{i}" for i in range(5) for _ in range(1000)]
+        stream += [f"tail{rng.randrange(100_000)}" for _ in range(20_000)]
+        rng.shuffle(stream)
+        for key in stream:
+            counter.add(key)
+            assert len(counter.counts) <= counter.capacity
+
+        top = counter.top(5)
+        assert {key for key, _, _ in top} == {f"heavy{i}" for i in range(5)}
+        # Estimates never under-count and stay within their error bound
+        assert all(count - error <= 1000 <= count for _, count, error in top)
+
+    def test_window_expires(self):
+        topk = WindowedTopK(window=10, k=5)
+        start = topk._window_start
+        topk.add("a", 8, now=start)
+        assert topk.top(now=start + 5)[0] == {"key": "a", "count": 8, "error": 0}
+        assert topk.top(now=start + 15)[0]["count"] == 4
+        assert topk.top(now=start + 30) == []
+
+
+class TestTrafficEndpoint:
+    """Test the admin top-traffic endpoint"""
+
+    def test_top_clients_and_routes(self):
+        headers = _headers(971)
+        for _ in range(30):
+            client.get("/api/v1/users/profile", headers=headers)
+
+        response = client.get("/api/v1/admin/traffic/top?n=100", headers=_headers(972, True))
+        assert response.status_code == 200
+        body = response.json()
+        counts = {c["key"]: c["count"] for c in body["clients"]}
+        assert counts["user:971"] >= 30
+        assert any(r["key"] == "GET /api/v1/users/profile" for r in body["routes"])
+
+    def test_admin_only(self):
+        response = client.get("/api/v1/admin/traffic/top", headers=_headers(973))
+        assert response.status_code == 403
+
+    def test_rate_limited_clients_recorded(self):
+        test_app = FastAPI()
+
+        @test_app.get("/ping")
+        async def ping():
+            return {"ok": True}
+
+        test_app.add_middleware(RateLimiterMiddleware, tier_limits={"anonymous": (Limit(1, 60),)})
+        test_client = TestClient(test_app, client=("198.51.100.77", 1))
+        assert [test_client.get("/ping").status_code for _ in range(3)] == [
+            200,
+            429,
+            429,
+        ]
+        throttled = traffic_analytics.throttled.top(100)
+        assert {"key": "ip:198.51.100.77", "count": 2, "error": 0} in throttled